@@ -0,0 +1,70 @@
+# benchmarks/draft_decode_benchmark.py
+# --------------------------------------------------------------------------
+# Compare full-resolution decoding against JPEG draft (DCT-scaled) decoding
+# for the analysis path. Each run happens in a fresh subprocess so peak RSS
+# is measured per mode.
+#
+# Usage (from the project root):
+#   python -m benchmarks.draft_decode_benchmark [images ...]
+# --------------------------------------------------------------------------
+import argparse
+import glob
+import json
+import subprocess
+import sys
+
+DEFAULT_IMAGES = sorted(glob.glob("assets/*.jpg"))
+
+WORKER = r"""
+import json, resource, sys, time
+from PIL import Image
+from src.utils.image_context import ImageContext
+from src.utils.palette import extract_palette_hex
+
+path, mode = sys.argv[1], sys.argv[2]
+with open(path, "rb") as f:
+    data = f.read()
+
+start = time.perf_counter()
+if mode == "draft":
+    ctx = ImageContext(data, path)
+    palette = extract_palette_hex(ctx.analysis_image)
+    size = ctx.analysis_image.size
+else:
+    img = Image.open(path)
+    img.load()
+    palette = extract_palette_hex(img)
+    size = img.size
+elapsed = time.perf_counter() - start
+
+print(json.dumps({
+    "seconds": elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "size": size,
+    "palette": palette,
+}))
+"""
+
+
+def run(path, mode):
+    """Run one decode in a subprocess and return its measurements"""
+    output = subprocess.run([sys.executable, "-c", WORKER, path, mode],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark draft-mode JPEG decoding")
+    parser.add_argument("images", nargs="*", default=DEFAULT_IMAGES)
+    args = parser.parse_args()
+
+    print(f"{'image':40} {'mode':6} {'decoded':>11} {'seconds':>8} {'peak RSS':>9}")
+    for path in args.images:
+        for mode in ("full", "draft"):
+            result = run(path, mode)
+            decoded = "x".join(str(v) for v in result["size"])
+            print(f"{path[-40:]:40} {mode:6} {decoded:>11} {result['seconds']:8.3f} {result['max_rss_mb']:7.0f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# benchmarks/large_image_benchmark.py
+# --------------------------------------------------------------------------
+# Peak memory of analyzing a very large (panorama-sized) PNG with a full
+# decode versus the tiled strip scan used above the pixel ceiling. Each
+# mode runs in a fresh subprocess so peak RSS is measured per mode; the
+# run fails if the tiled scan's peak grows past --max-delta-mb, so the
+# memory bound can be checked automatically.
+#
+# Usage (from the project root):
+#   python -m benchmarks.large_image_benchmark [--width 12000 --height 9000]
+# --------------------------------------------------------------------------
+import argparse
+import json
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+import zlib
+import numpy as np
+
+WORKER = r"""
+import json, resource, sys, time
+from PIL import Image
+from src.utils.image_context import ImageContext
+from src.utils.palette import extract_palette_hex, palette_to_hex
+
+path, mode = sys.argv[1], sys.argv[2]
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+start = time.perf_counter()
+if mode == "tiled":
+    ctx = ImageContext.from_path(path)
+    size = ctx.analysis_image.size
+    palette = palette_to_hex(ctx.color_histogram.palette())
+else:
+    Image.MAX_IMAGE_PIXELS = None
+    img = Image.open(path)
+    img.load()
+    palette = extract_palette_hex(img)
+    size = img.size
+elapsed = time.perf_counter() - start
+
+print(json.dumps({
+    "seconds": elapsed,
+    "baseline_mb": baseline,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "size": size,
+    "palette": palette,
+}))
+"""
+
+
+def _chunk(chunk_type, data):
+    return struct.pack(">L", len(data)) + chunk_type + data + struct.pack(">L", zlib.crc32(chunk_type + data))
+
+
+def write_test_png(path, width, height, band_rows=256):
+    """
+    Write an RGB PNG band by band (never holding the whole image), cycling
+    through all five row filters so the strip decoder's unfiltering is exercised.
+    """
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    compressor = zlib.compressobj(1)
+    previous = np.zeros((width, 3), dtype=np.int16)
+
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(_chunk(b"IHDR", struct.pack(">LLBBBBB", width, height, 8, 2, 0, 0, 0)))
+        for top in range(0, height, band_rows):
+            out = bytearray()
+            for y in range(top, min(height, top + band_rows)):
+                row = np.empty((width, 3), dtype=np.int16)
+                row[:, 0] = x
+                row[:, 1] = 255 * y / height
+                row[:, 2] = (x + 255 * y / height) / 2
+                row = np.clip(row + rng.integers(-12, 13, size=(width, 3)), 0, 255)
+
+                left = np.vstack([np.zeros((1, 3), np.int16), row[:-1]])
+                upper_left = np.vstack([np.zeros((1, 3), np.int16), previous[:-1]])
+                filter_type = y % 5
+                if filter_type == 0:
+                    filtered = row
+                elif filter_type == 1:
+                    filtered = row - left
+                elif filter_type == 2:
+                    filtered = row - previous
+                elif filter_type == 3:
+                    filtered = row - (left + previous) // 2
+                else:
+                    p = left + previous - upper_left
+                    pa, pb, pc = np.abs(p - left), np.abs(p - previous), np.abs(p - upper_left)
+                    predictor = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, previous, upper_left))
+                    filtered = row - predictor
+
+                out.append(filter_type)
+                out += (filtered % 256).astype(np.uint8).tobytes()
+                previous = row
+            f.write(_chunk(b"IDAT", compressor.compress(bytes(out))))
+        f.write(_chunk(b"IDAT", compressor.flush()))
+        f.write(_chunk(b"IEND", b""))
+
+
+def run(path, mode):
+    """Analyze the image in a subprocess and return its measurements"""
+    output = subprocess.run([sys.executable, "-c", WORKER, path, mode],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tiled analysis of very large images")
+    parser.add_argument("--width", type=int, default=12000)
+    parser.add_argument("--height", type=int, default=9000)
+    parser.add_argument("--max-delta-mb", type=float, default=96,
+                        help="Fail if the tiled scan's peak RSS grows more than this above its baseline")
+    parser.add_argument("--skip-full", action="store_true", help="Only run the tiled scan")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "panorama.png")
+        print(f"Writing {args.width}x{args.height} ({args.width * args.height / 1e6:.0f} MP) test PNG...")
+        write_test_png(path, args.width, args.height)
+
+        modes = ("tiled",) if args.skip_full else ("full", "tiled")
+        results = {mode: run(path, mode) for mode in modes}
+
+    print(f"{'mode':6} {'seconds':>8} {'peak RSS':>9} {'growth':>8}  palette")
+    for mode, result in results.items():
+        growth = result["max_rss_mb"] - result["baseline_mb"]
+        print(f"{mode:6} {result['seconds']:8.2f} {result['max_rss_mb']:7.0f}MB {growth:6.0f}MB  "
+              f"{' '.join(result['palette'])}")
+
+    tiled_growth = results["tiled"]["max_rss_mb"] - results["tiled"]["baseline_mb"]
+    if tiled_growth > args.max_delta_mb:
+        print(f"FAIL: tiled scan grew {tiled_growth:.0f} MB (limit {args.max_delta_mb:.0f} MB)")
+        sys.exit(1)
+    print(f"OK: tiled scan stayed within {args.max_delta_mb:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# benchmarks/palette_benchmark.py
+# --------------------------------------------------------------------------
+# Compare the NumPy palette engine against ColorThief for speed and agreement.
+#
+# Usage (from the project root):
+#   python -m benchmarks.palette_benchmark [images ...] [--count 5] [--sample-budget 65536]
+# --------------------------------------------------------------------------
+import argparse
+import glob
+import math
+import time
+
+from PIL import Image
+
+from src.utils.palette import DEFAULT_SAMPLE_BUDGET, extract_palette, palette_to_hex
+
+DEFAULT_IMAGES = sorted(glob.glob("assets/*.jpg")) + ["src/default_beepic.jpg"]
+
+
+def palette_distance(reference, candidate):
+    """Mean RGB distance from each reference color to its closest candidate color"""
+    if not reference or not candidate:
+        return float("nan")
+    distances = [min(math.dist(ref, cand) for cand in candidate) for ref in reference]
+    return sum(distances) / len(distances)
+
+
+def time_call(func, repeat):
+    """Run func `repeat` times and return (best wall time in seconds, last result)"""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run_numpy(path, count, sample_budget):
+    """Decode the file and extract a palette with the NumPy engine"""
+    with Image.open(path) as img:
+        return extract_palette(img, count, sample_budget)
+
+
+def run_colorthief(path, count, quality):
+    """Decode the file and extract a palette with ColorThief"""
+    from colorthief import ColorThief
+    return ColorThief(path).get_palette(color_count=count, quality=quality)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark palette extraction engines")
+    parser.add_argument("images", nargs="*", default=DEFAULT_IMAGES)
+    parser.add_argument("--count", type=int, default=5)
+    parser.add_argument("--sample-budget", type=int, default=DEFAULT_SAMPLE_BUDGET)
+    parser.add_argument("--quality", type=int, default=10, help="ColorThief quality setting")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    try:
+        import colorthief  # noqa: F401
+        have_colorthief = True
+    except ImportError:
+        have_colorthief = False
+        print("ColorThief is not installed; only timing the NumPy engine.")
+
+    print(f"{'image':40} {'pixels':>8} {'numpy s':>9} {'cthief s':>9} {'speedup':>8} {'dist':>6}")
+    for path in args.images:
+        with Image.open(path) as img:
+            megapixels = img.width * img.height / 1e6
+
+        np_time, np_palette = time_call(lambda: run_numpy(path, args.count, args.sample_budget), args.repeat)
+
+        if have_colorthief:
+            ct_time, ct_palette = time_call(lambda: run_colorthief(path, args.count, args.quality), args.repeat)
+            speedup = f"{ct_time / np_time:7.1f}x"
+            distance = f"{palette_distance(ct_palette, np_palette):6.1f}"
+            ct_display = f"{ct_time:9.3f}"
+        else:
+            ct_palette, speedup, distance, ct_display = [], "-", "-", "-"
+
+        print(f"{path[-40:]:40} {megapixels:7.1f}M {np_time:9.3f} {ct_display:>9} {speedup:>8} {distance:>6}")
+        print(f"    numpy:      {' '.join(palette_to_hex(np_palette))}")
+        if ct_palette:
+            print(f"    colorthief: {' '.join(palette_to_hex(ct_palette))}")
+
+
+if __name__ == "__main__":
+    main()
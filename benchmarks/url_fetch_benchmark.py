@@ -0,0 +1,137 @@
+# benchmarks/url_fetch_benchmark.py
+# --------------------------------------------------------------------------
+# Throughput of the URL batch fetcher against a local HTTP stand-in.
+#
+# A threaded http.server serves the sample photos under distinct URLs and
+# adds a fixed per-request latency to mimic a remote host. The baseline is
+# the old approach (a bare requests.get per URL, body buffered in memory,
+# one after another); the fetcher runs with pooled connections, streaming
+# to a temporary blob store, at several worker counts.
+#
+# Usage (from the project root):
+#   python -m benchmarks.url_fetch_benchmark [--urls 48] [--latency-ms 50]
+# --------------------------------------------------------------------------
+import argparse
+import glob
+import os
+import shutil
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from src.utils.blob_store import BlobStore
+from src.utils.url_cache import UrlCache
+from src.utils.url_fetcher import DownloadTooLarge, download_to_store, fetch_urls
+
+
+class SlowHandler(SimpleHTTPRequestHandler):
+    """Static file handler with an artificial per-request latency"""
+
+    latency = 0.05
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        # The query string only makes URLs distinct
+        self.path = self.path.split("?", 1)[0]
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(directory, latency):
+    SlowHandler.latency = latency
+    handler = partial(SlowHandler, directory=directory)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_baseline(urls):
+    """Old behaviour: sequential bare requests.get, whole body in memory"""
+    total = 0
+    start = time.perf_counter()
+    for url in urls:
+        response = requests.get(url)
+        total += len(response.content)
+    return time.perf_counter() - start, total
+
+
+def run_fetcher(urls, workers, work_dir):
+    """Pooled, streaming, concurrent fetch into a fresh blob store and URL cache"""
+    store = BlobStore(os.path.join(work_dir, f"blobs_{workers}"))
+    cache = UrlCache(os.path.join(work_dir, f"url_cache_{workers}"), store=store)
+
+    def fetch(url):
+        result = download_to_store(url, os.path.basename(url.split("?")[0]), store)
+        cache.put(url, result['digest'], result['path'], result['size'])
+        return result
+
+    total = 0
+    errors = 0
+    start = time.perf_counter()
+    for _, result, error in fetch_urls(urls, fetch, max_workers=workers):
+        if error:
+            errors += 1
+        else:
+            total += result['size']
+    return time.perf_counter() - start, total, errors
+
+
+def check_size_cap(base_url, name, work_dir):
+    """An oversized body must be aborted and leave nothing behind"""
+    store = BlobStore(os.path.join(work_dir, "blobs_cap"))
+    try:
+        download_to_store(f"{base_url}/{name}", name, store, max_bytes=64 * 1024)
+    except DownloadTooLarge as e:
+        leftovers = os.listdir(os.path.join(store.root, "tmp"))
+        return f"aborted ({e}); staging files left: {len(leftovers)}"
+    return "NOT aborted"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the concurrent URL fetcher")
+    parser.add_argument("--urls", type=int, default=48, help="Number of URLs to fetch")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Per-request server latency")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    images = sorted(glob.glob("assets/*.jpg"))
+    if not images:
+        raise SystemExit("No sample images found in assets/")
+
+    work_dir = tempfile.mkdtemp(prefix="url_fetch_bench_")
+    served = os.path.join(work_dir, "served")
+    os.makedirs(served)
+    for path in images:
+        shutil.copy(path, served)
+    names = [os.path.basename(p) for p in images]
+
+    server = start_server(served, args.latency_ms / 1000)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{base_url}/{names[i % len(names)]}?n={i}" for i in range(args.urls)]
+
+    try:
+        print(f"{len(urls)} URLs, {args.latency_ms:.0f} ms simulated latency")
+
+        seconds, total = run_baseline(urls)
+        print(f"  baseline (sequential requests.get): {seconds:6.2f}s  "
+              f"{len(urls) / seconds:6.1f} urls/s  {total / seconds / 1e6:6.1f} MB/s")
+
+        for workers in args.workers:
+            seconds, total, errors = run_fetcher(urls, workers, work_dir)
+            print(f"  fetcher, {workers:2d} workers:            {seconds:6.2f}s  "
+                  f"{len(urls) / seconds:6.1f} urls/s  {total / seconds / 1e6:6.1f} MB/s  errors={errors}")
+
+        print(f"  size cap: {check_size_cap(base_url, names[0], work_dir)}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,26 @@
 import requests
 from datetime import datetime
+from functools import lru_cache
+from src.utils.geo import weather_bucket
+
+# Distinct (weather cell, day) responses kept in memory
+WEATHER_CACHE_SIZE = 256
+
+@lru_cache(maxsize=WEATHER_CACHE_SIZE)
+def _fetch_hourly_weather(bucket_key, lat, lon, date_str):
+    """One archive request per weather cell and day; failures are not cached"""
+    endpoint = "https://archive-api.open-meteo.com/v1/archive"
+    params = {
+        "latitude": lat,
+        "longitude": lon,
+        "start_date": date_str,
+        "end_date": date_str,
+        "hourly": "temperature_2m,precipitation,cloudcover,windspeed_10m,weathercode",
+        "timezone": "auto"
+    }
+    response = requests.get(endpoint, params=params, timeout=(5, 30))
+    response.raise_for_status()  # This will raise an exception for HTTP errors
+    return response.json()["hourly"]
 
 def get_weather_open_meteo(lat, lon, dt):
     """
@@ -28,22 +49,12 @@ def get_weather_open_meteo(lat, lon, dt):
     date_str = dt.strftime("%Y-%m-%d")
     hour = dt.hour
 
-    # Build request parameters
-    endpoint = "https://archive-api.open-meteo.com/v1/archive"
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "start_date": date_str,
-        "end_date": date_str,
-        "hourly": "temperature_2m,precipitation,cloudcover,windspeed_10m,weathercode",
-        "timezone": "auto"
-    }
+    # Photos in the same ~5 km cell on the same day share one request
+    bucket_key, bucket_lat, bucket_lon = weather_bucket(lat, lon)
 
     # Send the request
     try:
-        response = requests.get(endpoint, params=params)
-        response.raise_for_status()  # This will raise an exception for HTTP errors
-        data = response.json()["hourly"]
+        data = _fetch_hourly_weather(bucket_key, bucket_lat, bucket_lon, date_str)
 
         # Parse timestamps and find closest hour
         times = [datetime.fromisoformat(t) for t in data["time"]]
@@ -7,7 +7,23 @@ from datetime import datetime
 import os
 import json
 from src.timeline_component import process_url_image
-from src.utils.data_handler import add_photo_to_inspection
+from src.utils.archive_import import ARCHIVE_TYPES
+from src.utils.data_handler import (
+    count_stale_photos,
+    find_photo_by_hash,
+    get_persistence_stats,
+    load_inspections_from_disk,
+    reprocess_stale_photos,
+)
+from src.utils.geo import apiary_key, build_photo_index, photo_coordinates
+from src.utils.ingest import cached_url_photo, url_to_filename
+from src.utils.job_manager import DONE, FAILED, JobManager
+from src.utils.thumbnail_cache import PREVIEW_SIZE, rendition_for_photo
+from src.utils.url_cache import get_url_cache
+from src.utils.url_fetcher import parse_url_list
+
+# How often the upload progress panel polls the background jobs
+JOB_POLL_SECONDS = 1.0
 
 
 
@@ -26,6 +42,13 @@ def display_image_and_photo_metadata():
             if isinstance(st.session_state.current_image, bytes):
                 img = Image.open(io.BytesIO(st.session_state.current_image))
                 st.image(img, caption=st.session_state.filename, use_container_width=True)
+            elif isinstance(st.session_state.current_image, str) and st.session_state.get('current_content_hash'):
+                # Stored photo: show the preview rendition instead of the original
+                preview = rendition_for_photo({
+                    'file_path': st.session_state.current_image,
+                    'content_hash': st.session_state.current_content_hash
+                }, PREVIEW_SIZE)
+                st.image(preview, caption=st.session_state.filename, use_container_width=True)
             else:
                 st.image(st.session_state.current_image, caption=st.session_state.filename, use_container_width=True)
     
@@ -41,6 +64,12 @@ def display_image_and_photo_metadata():
         st.markdown(f"**Camera Model:** {st.session_state.camera_model}")
         st.markdown(f"**Source:** {st.session_state.date_source}")
         
+        # Quality score; low scores skip the palette and Vision analysis
+        if st.session_state.get('photo_quality'):
+            quality = st.session_state.photo_quality
+            st.markdown(f"**Quality:** {quality['score']:.0f}/100 (sharpness {quality['sharpness']:.0f}, "
+                        f"brightness {quality['mean_brightness']:.0f}, range {quality['dynamic_range']})")
+        
         # Display Inspection association if available
         if hasattr(st.session_state, 'associated_inspection') and st.session_state.associated_inspection:
             inspection_id = st.session_state.associated_inspection
@@ -48,8 +77,28 @@ def display_image_and_photo_metadata():
         else:
             st.markdown("**Part of Inspection:** Not assigned")
         
+        # Per-stage breakdown of the time spent analyzing this upload
+        if st.session_state.get('stage_timings'):
+            display_stage_timings(st.session_state.stage_timings)
+        
         st.markdown('</div>', unsafe_allow_html=True)
 
+def display_stage_timings(timings):
+    """Wall time and bytes of each pipeline stage that processed the current photo"""
+    total = sum(t['seconds'] for t in timings.values())
+    with st.expander(f"⏱️ Processing time ({total * 1000:.0f} ms)"):
+        rows = [
+            {
+                "Stage": name,
+                "Time (ms)": round(t['seconds'] * 1000, 1),
+                "MB": round(t.get('bytes', 0) / (1024 * 1024), 2),
+                "Note": t.get('skipped', "")
+            }
+            for name, t in sorted(timings.items(), key=lambda item: -item[1]['seconds'])
+        ]
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+        st.caption("Independent stages run concurrently, so the upload's wall time can be below the sum.")
+
 # Function to display inspection metadata
 def display_inspection_metadata():
     # Add a more prominent header with an icon and color
@@ -85,14 +134,14 @@ def display_inspection_metadata():
         
         # Location with icon and better formatting
         st.markdown("<h4>📍 <span style='color:#3366cc;'>Location:</span></h4>", unsafe_allow_html=True)
-        if st.session_state.lat and st.session_state.lon:
-            try:
-                if isinstance(st.session_state.lat, (float, int)) and isinstance(st.session_state.lon, (float, int)):
-                    st.markdown(f"{st.session_state.lat:.6f}, {st.session_state.lon:.6f}")
-                else:
-                    st.markdown(f"{st.session_state.lat}, {st.session_state.lon}")
-            except:
-                st.markdown(f"{st.session_state.lat}, {st.session_state.lon}")
+        lat, lon = photo_coordinates({'lat': st.session_state.lat, 'lon': st.session_state.lon})
+        if lat is not None:
+            st.markdown(f"{lat:.6f}, {lon:.6f}")
+            
+            # Other photos taken around this hive, from the spatial index
+            radius_m = st.number_input("Nearby radius (m)", min_value=10, max_value=5000, value=100, step=10, key="nearby_radius")
+            nearby = get_photo_index().within(lat, lon, radius_m)
+            st.markdown(f"**Apiary:** {apiary_key(lat, lon)} ({len(nearby)} photos within {radius_m} m)")
         else:
             st.markdown("Not available")
             
@@ -129,6 +178,17 @@ def display_inspection_metadata():
         st.markdown('</div>', unsafe_allow_html=True)
 
 
+# Function to get the spatial index of all photos in this session
+def get_photo_index():
+    """Spatial index over the session's inspections, rebuilt only when photos change"""
+    inspections = st.session_state.get('inspections', [])
+    signature = tuple(len(inspection.get('photos', [])) for inspection in inspections)
+    cached = st.session_state.get('photo_index')
+    if cached is None or cached[0] != signature:
+        cached = (signature, build_photo_index(inspections))
+        st.session_state.photo_index = cached
+    return cached[1]
+
 # Function to display photo analysis details
 def display_photo_analysis():
     st.markdown("<h3>📊 Photo Analysis</h3>", unsafe_allow_html=True)
@@ -234,46 +294,194 @@ def display_image_upload_options(in_sidebar=True, expanded=True):
             if img_url:
                 # Only process if it's a new URL or previous processing failed
                 if 'last_processed_url' not in st.session_state or st.session_state.last_processed_url != img_url:
-                    with st.spinner("Processing image from URL..."):
-                        # Import the function from the right module
-                        from src.utils.image_processor import process_url_image
-                        photo_data = process_url_image(img_url)
-                        if photo_data:
-                            # Add photo to appropriate inspection
-                            from src.utils.data_handler import add_photo_to_inspection
-                            add_photo_to_inspection(photo_data)
-                            
-                            st.session_state.last_processed_url = img_url
-                            
-                            # Force rerun to update UI
-                            st.rerun()
+                    # Already downloaded and analyzed: render from cache (stale copies revalidate in the background)
+                    photo_data = cached_url_photo(img_url)
+                    if photo_data:
+                        st.session_state.last_processed_url = img_url
+                        from src.utils.image_processor import update_session_from_photo
+                        update_session_from_photo(photo_data, photo_data['file_path'])
+                        handle_image_processing(photo_data)
+                    # Download and analysis run in the background; the progress panel polls them
+                    elif submit_ingest_batch([("url", img_url, url_to_filename(img_url))], container):
+                        st.session_state.last_processed_url = img_url
                 else:
                     st.info("Image already processed")
             else:
                 st.warning("Please enter a valid image URL")
 
+        # Several URLs at once (e.g. a season's Drive links), downloaded concurrently in the background
+        url_list = container.text_area(
+            "Image URLs (one per line)",
+            placeholder="https://...\nhttps://...",
+            help="Paste a list of photo links to import them all at once",
+            key="img_url_list_input"
+        )
+        
+        if container.button("Process URL List", key="url_list_button"):
+            urls = parse_url_list(url_list)
+            if urls:
+                submit_ingest_batch([("url", url, url_to_filename(url)) for url in urls], container)
+            else:
+                st.warning("Please enter at least one valid image URL")
+        
         # Add some space between the two options
         container.markdown("<hr style='margin: 10px 0'>", unsafe_allow_html=True)
         
         # File upload option
-        container.markdown("### Upload an Image")
-        uploaded_file = container.file_uploader("Choose an image file", type=["jpg", "jpeg", "png"], key="file_uploader")
-        
-        if uploaded_file is not None:
-            # Check if this is a new file upload
-            file_key = f"{uploaded_file.name}_{uploaded_file.size}"
-            if 'last_uploaded_file' not in st.session_state or st.session_state.last_uploaded_file != file_key:
-                with st.spinner("Processing uploaded image..."):
-                    # Import the function from the right module
-                    from src.utils.image_processor import process_image_file
-                    file_name = uploaded_file.name
-                    success = process_image_file(uploaded_file, file_name)
-                    if success:
-                        st.session_state.last_uploaded_file = file_key
-                        # Handle successful processing
-                        handle_image_processing(success)
-            # else:
-            #     st.info("Image already processed")
+        container.markdown("### Upload Images")
+        uploaded_files = container.file_uploader(
+            "Choose image files",
+            type=["jpg", "jpeg", "png"],
+            accept_multiple_files=True,
+            key="file_uploader"
+        )
+        
+        if uploaded_files:
+            # Only process files that have not been processed in this session
+            if 'processed_uploads' not in st.session_state:
+                st.session_state.processed_uploads = set()
+            new_files = [f for f in uploaded_files if f"{f.name}_{f.size}" not in st.session_state.processed_uploads]
+            
+            if new_files:
+                items = [("file", f, f.name) for f in new_files]
+                if submit_ingest_batch(items, container):
+                    st.session_state.processed_uploads.update(f"{f.name}_{f.size}" for f in new_files)
+        
+        # Whole inspections shared as an archive, streamed member by member in the background
+        container.markdown("### Import an Archive")
+        archive = container.file_uploader(
+            "Choose a ZIP or TAR archive",
+            type=ARCHIVE_TYPES,
+            help="An inspection exported from a phone; every photo inside is imported",
+            key="archive_uploader"
+        )
+        
+        if archive is not None:
+            if 'processed_archives' not in st.session_state:
+                st.session_state.processed_archives = set()
+            archive_key = f"{archive.name}_{archive.size}"
+            if archive_key not in st.session_state.processed_archives:
+                if submit_archive_import(archive, container):
+                    st.session_state.processed_archives.add(archive_key)
+        
+        # Failures of finished ingest jobs, and progress of queued and running ones
+        display_ingest_errors()
+        display_ingest_progress()
+
+# Process-wide job manager shared by all sessions
+@st.cache_resource
+def get_job_manager():
+    """Create the background ingest job manager once per server process"""
+    return JobManager()
+
+# Function to queue ingest jobs for this session
+def submit_ingest_batch(items, container=st):
+    """Queue uploads/URLs on the background job manager and remember the batch for polling"""
+    batch_id = get_job_manager().submit_batch(items)
+    if batch_id is None:
+        container.warning("The processing queue is full. Please try again in a moment.")
+        return None
+    
+    if 'ingest_batches' not in st.session_state:
+        st.session_state.ingest_batches = []
+    st.session_state.ingest_batches.append(batch_id)
+    return batch_id
+
+# Function to queue an archive import for this session
+def submit_archive_import(archive, container=st):
+    """Queue an uploaded archive on the background job manager and remember the batch for polling"""
+    batch_id = get_job_manager().submit_archive(archive, archive.name)
+    if batch_id is None:
+        container.warning("The processing queue is full. Please try again in a moment.")
+        return None
+    
+    if 'ingest_batches' not in st.session_state:
+        st.session_state.ingest_batches = []
+    st.session_state.ingest_batches.append(batch_id)
+    return batch_id
+
+# Function to poll background ingest jobs
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def display_ingest_progress():
+    """Show progress of this session's ingest batches and pick up finished ones"""
+    batch_ids = st.session_state.get('ingest_batches', [])
+    if not batch_ids:
+        return
+    
+    manager = get_job_manager()
+    finished_photos = []
+    reports = []
+    
+    for batch_id in list(batch_ids):
+        status = manager.batch_status(batch_id)
+        if status is None:
+            batch_ids.remove(batch_id)
+            continue
+        
+        if status['done']:
+            # Report failures once, then forget the batch
+            if status['error']:
+                reports.append(("error", status['error']))
+            for job in status['jobs']:
+                if job['status'] == FAILED:
+                    reports.append(("error", f"Error processing {job['filename']}: {job['error']}"))
+                elif status['error']:
+                    # The batch was not saved, so there is nothing to pick up
+                    continue
+                elif job['photo']:
+                    finished_photos.append(job['photo'])
+                else:
+                    finished_photos.extend(job.get('photos', []))
+                    if job['error']:
+                        reports.append(("warning", f"{job['filename']}: {job['error']}"))
+            manager.forget_batch(batch_id)
+            batch_ids.remove(batch_id)
+            continue
+        
+        # An archive's photo count is only known once it has been read to the end
+        total = status['total']
+        if status['jobs'][0]['kind'] != "archive":
+            st.progress(status['finished'] / total, text=f"Processing {status['finished']}/{total} photos...")
+        st.markdown("\n".join(
+            f"- {job['filename']}: {format_job_status(job)}" for job in status['jobs']
+        ))
+    
+    # Keep the reports for the full-app rerun below; anything drawn in this
+    # fragment would be erased by it before the user could read it
+    if reports:
+        if 'ingest_errors' not in st.session_state:
+            st.session_state.ingest_errors = []
+        st.session_state.ingest_errors.extend(reports)
+    
+    if finished_photos:
+        handle_batch_processing(finished_photos)
+    elif reports:
+        st.rerun(scope="app")
+
+# Function to show the failures of finished ingest batches
+def display_ingest_errors():
+    """Show the reports saved by display_ingest_progress once, then clear them"""
+    for level, message in st.session_state.pop('ingest_errors', []):
+        getattr(st, level)(message)
+
+def format_job_status(job):
+    """Short status label for one ingest job"""
+    if job['status'] == DONE:
+        return "✅ already known" if job['cached'] else "✅ processed"
+    if job['status'] == FAILED:
+        return f"❌ {job['error']}"
+    if job['kind'] == "archive" and job['status'] == "running":
+        return f"⏳ {job['finished']}/{job['read']} photos processed"
+    return "⏳ running" if job['status'] == "running" else "⏳ queued"
+
+# Function to sync this session with photos published by background jobs
+def sync_inspections_from_store():
+    """Reload inspections from disk when background jobs have published new photos"""
+    version = get_job_manager().version
+    if st.session_state.get('store_version') != version:
+        if 'store_version' in st.session_state:
+            load_inspections_from_disk()
+        st.session_state.store_version = version
 
 # Function to handle successful image processing
 def handle_image_processing(photo_data):
@@ -289,6 +497,26 @@ def handle_image_processing(photo_data):
         # Force rerun to update UI immediately
         st.rerun()
 
+# Function to handle a successfully processed batch
+def handle_batch_processing(photos):
+    """Pick up a published batch (already saved by the job manager) and show the last photo"""
+    st.session_state.processing_complete = True
+    st.session_state.image_load_time = time.time()
+    
+    # The job manager already wrote the photos to disk; reload them into this session
+    load_inspections_from_disk()
+    st.session_state.store_version = get_job_manager().version
+    
+    location = find_photo_by_hash(photos[-1].get('content_hash'))
+    if location:
+        st.session_state.selected_inspection = location[0]
+    
+    from src.utils.image_processor import update_session_from_photo
+    update_session_from_photo(photos[-1], photos[-1]['file_path'])
+    
+    # Full-app rerun (not just the fragment) to update the UI
+    st.rerun(scope="app")
+
 # Function to update timeline after processing new images
 def update_timeline():
     """Update the timeline with new inspection data"""
@@ -298,6 +526,9 @@ def update_timeline():
 
 # Function to render the sidebar with inspection list
 def render_sidebar():
+    # Pick up photos other sessions' jobs have published
+    sync_inspections_from_store()
+    
     with st.sidebar:
         # First add the image upload section at the top
         display_image_upload_options(in_sidebar=True, expanded=True)
@@ -338,6 +569,26 @@ def render_sidebar():
         
         # Export data option
         st.subheader("Data Management")
+        
+        # Photos analyzed by an older version of a stage can be brought up to date in place
+        stale_count = count_stale_photos()
+        if stale_count:
+            st.write(f"{stale_count} photos have outdated analysis")
+            if st.button("Reprocess Photos", key="reprocess_button"):
+                progress = st.progress(0.0, text="Reprocessing photos...")
+                stats = reprocess_stale_photos(
+                    progress=lambda done, total: progress.progress(done / total, text=f"Reprocessing {done}/{total} photos...")
+                )
+                if stats:
+                    st.success(f"Updated {stats['updated']} photos ({stats['failed']} failed) in {stats['elapsed']:.1f}s")
+        
+        # Background saving (changes are written a moment after they are made)
+        write_stats = get_persistence_stats()
+        if write_stats['writes']:
+            st.write(f"Saved {write_stats['writes']} changes in {write_stats['flushes']} writes "
+                     f"({write_stats['coalesced']} coalesced), last write {write_stats['last_flush_seconds'] * 1000:.0f} ms")
+        if write_stats['last_error']:
+            st.warning(f"Saving failed, will retry: {write_stats['last_error']}")
         if st.button("Export Data (JSON)", key="export_button"):
             if st.session_state.inspections:
                 # In a real app, you would save to a file
@@ -345,13 +596,17 @@ def render_sidebar():
             else:
                 st.warning("No data to export")
         
-        # Display cache information
+        # Display cache information (shared by all sessions)
         st.subheader("Cache Status")
-        if 'url_image_cache' in st.session_state:
-            cache_count = len(st.session_state.url_image_cache)
-            st.write(f"URL Image Cache: {cache_count} images")
-            
-            if cache_count > 0 and st.button("Clear Cache", key="clear_cache"):
-                st.session_state.url_image_cache = {}
-                st.success("Cache cleared!")
-                st.rerun()
+        url_cache = get_url_cache()
+        stats = url_cache.stats()
+        st.write(f"URL Image Cache: {stats['entries']} images, "
+                 f"{stats['bytes'] / (1024 * 1024):.1f} / {stats['budget_bytes'] / (1024 * 1024):.0f} MB")
+        st.write(f"Hit rate: {stats['hit_rate']:.0%} ({stats['hits']} hits, {stats['misses']} misses)")
+        if stats['stale_hits']:
+            st.write(f"Revalidated: {stats['revalidated']} of {stats['stale_hits']} stale hits unchanged")
+        
+        if stats['entries'] > 0 and st.button("Clear Cache", key="clear_cache"):
+            url_cache.clear()
+            st.success("Cache cleared!")
+            st.rerun()
@@ -0,0 +1,138 @@
+# src/bulk_ingest.py
+# --------------------------------------------------------------------------
+# Bulk folder ingest: walk a directory tree, run every photo through the
+# ingest pipeline (EXIF, palette, resolution, GPS) on a process pool, and
+# group the results into inspections with batched writes.
+#
+# Re-running over the same folder is safe: files whose content hash is
+# already recorded are skipped.
+#
+# Usage (from the project root):
+#   python -m src.bulk_ingest /path/to/photos [--workers 8] [--batch-size 50]
+# --------------------------------------------------------------------------
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from src.utils.blob_store import get_blob_store, hash_file
+from src.utils.ingest import ingest_file, reuse_record
+from src.utils.inspection_store import INSPECTIONS_FILE, get_inspection_store
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+
+def find_images(root):
+    """Yield image paths under `root` in a stable order"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                yield os.path.join(dirpath, name)
+
+
+def ingest_path(path):
+    """
+    Worker: ingest one file.
+
+    Returns:
+        tuple: (path, photo record or None, cached, error message or None)
+    """
+    try:
+        # Hash first, so already ingested files are never copied again
+        store = get_blob_store()
+        content_hash = hash_file(path)
+        cached_photo = store.get_record(content_hash)
+        if cached_photo:
+            return path, reuse_record(cached_photo, os.path.basename(path), store.find(content_hash)), True, None
+
+        photo_data, cached = ingest_file(path, os.path.basename(path))
+        return path, photo_data, cached, None
+    except Exception as e:
+        return path, None, False, str(e)
+
+
+def bulk_ingest(root, workers=None, batch_size=50, data_file=INSPECTIONS_FILE, log=print):
+    """
+    Ingest every image under `root` into the inspection store.
+
+    Parameters:
+        root (str): Directory to walk
+        workers (int): Worker processes (defaults to the number of CPUs)
+        batch_size (int): Photos added per inspection store write
+        data_file (str): Inspection store file
+        log (callable): Progress output
+
+    Returns:
+        dict: Counts of added, skipped and failed files, elapsed seconds and files/sec
+    """
+    store = get_inspection_store(data_file)
+    inspections, _ = store.load()
+    inspections = inspections or []
+    known_hashes = {
+        photo['content_hash']
+        for inspection in inspections
+        for photo in inspection.get('photos', [])
+        if photo.get('content_hash')
+    }
+
+    paths = list(find_images(root))
+    stats = {"files": len(paths), "added": 0, "skipped": 0, "failed": 0}
+    pending = []
+
+    def flush():
+        """Add pending photos with one store write for the whole batch"""
+        if not pending:
+            return
+        store.add_photos(inspections, pending)
+        pending.clear()
+
+    log(f"Found {len(paths)} images under {root}")
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(ingest_path, path) for path in paths]
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            path, photo, cached, error = future.result()
+
+            if error:
+                stats["failed"] += 1
+                log(f"  failed: {path}: {error}")
+            elif photo['content_hash'] in known_hashes:
+                stats["skipped"] += 1
+            else:
+                known_hashes.add(photo['content_hash'])
+                pending.append(photo)
+                stats["added"] += 1
+
+            if len(pending) >= batch_size:
+                flush()
+
+            if done % 100 == 0:
+                elapsed = time.perf_counter() - start
+                log(f"  {done}/{len(paths)} files, {done / elapsed:.1f} files/sec")
+
+    flush()
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["files_per_sec"] = len(paths) / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest a folder of hive photos")
+    parser.add_argument("root", help="Directory to scan for .jpg/.jpeg/.png files")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--batch-size", type=int, default=50, help="Photos per inspection store write")
+    parser.add_argument("--data-file", default=INSPECTIONS_FILE, help="Inspection store file")
+    args = parser.parse_args()
+
+    stats = bulk_ingest(args.root, args.workers, args.batch_size, args.data_file)
+    print(f"Added {stats['added']}, skipped {stats['skipped']} already ingested, "
+          f"failed {stats['failed']} of {stats['files']} files "
+          f"in {stats['seconds']:.1f}s ({stats['files_per_sec']:.1f} files/sec)")
+
+
+if __name__ == "__main__":
+    main()
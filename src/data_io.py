@@ -1,18 +1,169 @@
 import os
+import csv
 import json
-import pandas as pd
-from datetime import datetime
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+# fcntl is POSIX-only; without it the log is only locked between the threads of one instance
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# pyarrow is optional; it is only needed for the Parquet backend
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = None
+
+# Columns of the CSV log, in order (entries may carry more keys; see _ensure_csv_header)
+CSV_COLUMNS = [
+    "date", "date_source", "filename", "image_resolution", "camera_model",
+    "dominant_color", "palette_1", "palette_2", "palette_3", "palette_4", "palette_5",
+    "weather_datetime", "weather_temperature_C", "weather_precipitation_mm",
+    "weather_cloud_cover_percent", "weather_wind_speed_kph", "weather_code",
+    "weather_source", "hive_state", "notes", "gps_lat", "gps_long", "last_updated"
+]
+
+# Compact once the log has at least this many rows and more than half of them are superseded
+COMPACT_MIN_ROWS = 256
+
+# Parquet backend: rows saved since the last compaction that trigger a new one
+COLUMNAR_BATCH_ROWS = 500
+
+PALETTE_COLUMNS = ["dominant_color", "palette_1", "palette_2", "palette_3", "palette_4", "palette_5"]
+FLOAT_COLUMNS = [
+    "weather_temperature_C", "weather_precipitation_mm", "weather_cloud_cover_percent",
+    "weather_wind_speed_kph", "gps_lat", "gps_long"
+]
+TIMESTAMP_COLUMNS = ["date", "weather_datetime", "last_updated"]
+STRING_COLUMNS = ["filename", "date_source", "image_resolution", "camera_model", "weather_source", "notes"]
+
+def parquet_schema():
+    """Typed schema of the Parquet backend (keys outside it are kept as JSON in `extra`)."""
+    fields = [(name, pa.string()) for name in STRING_COLUMNS]
+    fields += [(name, pa.timestamp("s")) for name in TIMESTAMP_COLUMNS]
+    fields += [(name, pa.float32()) for name in FLOAT_COLUMNS]
+    # Colors as 3 raw RGB bytes instead of "#rrggbb" strings
+    fields += [(name, pa.binary(3)) for name in PALETTE_COLUMNS]
+    fields += [
+        ("weather_code", pa.int16()),
+        ("hive_state", pa.dictionary(pa.int8(), pa.string())),
+        ("extra", pa.string()),
+        ("year", pa.int16()),
+        ("month", pa.int8()),
+    ]
+    return pa.schema(fields)
+
+def _parse_timestamp(value):
+    """Datetime from an EXIF ("YYYY:MM:DD HH:MM:SS") or ISO string, or None."""
+    if isinstance(value, datetime):
+        return value
+    if not value or not isinstance(value, str):
+        return None
+    for parse in (lambda v: datetime.strptime(v, "%Y:%m:%d %H:%M:%S"), datetime.fromisoformat):
+        try:
+            return parse(value.strip())
+        except ValueError:
+            continue
+    return None
+
+def _parse_float(value):
+    try:
+        return float(value) if value not in ("", None) else None
+    except (TypeError, ValueError):
+        return None
+
+def _parse_color(value):
+    """3 RGB bytes from "#rrggbb", or None."""
+    if isinstance(value, str) and len(value) == 7 and value.startswith("#"):
+        try:
+            return bytes.fromhex(value[1:])
+        except ValueError:
+            return None
+    return None
+
+def entries_to_table(entries):
+    """Convert log entries to a typed Arrow table with year/month partition columns."""
+    typed = set(STRING_COLUMNS + TIMESTAMP_COLUMNS + FLOAT_COLUMNS + PALETTE_COLUMNS + ["weather_code", "hive_state"])
+    columns = {name: [] for name in parquet_schema().names}
+    for entry in entries:
+        for name in STRING_COLUMNS:
+            value = entry.get(name)
+            columns[name].append(str(value) if value not in ("", None) else None)
+        for name in TIMESTAMP_COLUMNS:
+            columns[name].append(_parse_timestamp(entry.get(name)))
+        for name in FLOAT_COLUMNS:
+            columns[name].append(_parse_float(entry.get(name)))
+        for name in PALETTE_COLUMNS:
+            columns[name].append(_parse_color(entry.get(name)))
+        code = _parse_float(entry.get("weather_code"))
+        columns["weather_code"].append(int(code) if code is not None else None)
+        columns["hive_state"].append(entry.get("hive_state") or None)
+        extra = {k: v for k, v in entry.items() if k not in typed}
+        columns["extra"].append(json.dumps(extra, default=str) if extra else None)
+        
+        # Partition by the photo date (or the edit date for undated photos)
+        when = _parse_timestamp(entry.get("date")) or _parse_timestamp(entry.get("last_updated"))
+        columns["year"].append(when.year if when else 0)
+        columns["month"].append(when.month if when else 0)
+    return pa.table(columns, schema=parquet_schema())
 
 class DataManager:
-    """Manager class for handling data storage operations."""
+    """
+    Manager class for handling data storage operations.
+    
+    Entries are kept in an append-only JSON Lines log (hive_color_log.jsonl)
+    and an append-only CSV. Saving an entry appends one row to each; an
+    in-memory filename -> byte offset index points at the latest row of
+    every filename, so rows it supersedes are skipped by readers and
+    load_entry is a single seek. A background compaction rewrites both
+    files without superseded rows once they make up most of the log, and
+    saves the index next to the log so startup only scans rows appended
+    since.
+    
+    Several instances (and processes) can share the files: saves, reads
+    and the compaction swap hold a lock file (hive_color_log.jsonl.lock),
+    and every read or compaction first indexes the rows appended since the
+    index was last brought up to date, or reloads it if another instance
+    compacted the log.
     
-    def __init__(self, csv_file="data/hive_color_log.csv", json_file="data/hive_color_log.json"):
+    With backend="parquet" (requires pyarrow) compaction writes a typed
+    Parquet dataset partitioned by year/month (data/hive_color_log/)
+    instead of the CSV, and query() reads only the columns and partitions
+    it needs, plus the few rows saved since the last compaction.
+    """
+    
+    def __init__(self, csv_file="data/hive_color_log.csv", json_file="data/hive_color_log.json",
+                 backend="csv", parquet_dir=None):
         """Initialize the DataManager with file paths."""
+        if backend not in ("csv", "parquet"):
+            raise ValueError(f"Unknown backend: {backend}")
+        if backend == "parquet" and pa is None:
+            raise ImportError("The parquet backend requires pyarrow (pip install pyarrow)")
+        
         self.csv_file = csv_file
         self.json_file = json_file
+        self.backend = backend
+        self.log_file = os.path.splitext(json_file)[0] + ".jsonl"
+        self.index_file = self.log_file + ".idx"
+        self.lock_file = self.log_file + ".lock"
+        self.parquet_dir = parquet_dir or os.path.splitext(json_file)[0]
+        
+        self._lock = threading.Lock()
+        self._compaction = None
+        self._reset_index()
         
         # Create data directory if it doesn't exist
         os.makedirs(os.path.dirname(self.csv_file), exist_ok=True)
+        
+        if not os.path.exists(self.log_file) and os.path.exists(self.json_file):
+            self._migrate_json_list()
+        self._load_index()
                 
     def save_entry(self, data):
         """Save or update a metadata entry to both CSV and JSON storage."""
@@ -20,110 +171,121 @@ class DataManager:
             # Add timestamp for the edit
             data['last_updated'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
-            # Save to CSV
-            self._save_to_csv(data)
+            # Convert missing data to empty strings for CSV compatibility
+            for col in CSV_COLUMNS:
+                if col not in data:
+                    data[col] = ""
             
-            # Save to JSON
-            self._save_to_json(data)
+            with self._lock, self._file_lock():
+                # Save to JSON
+                self._save_to_json(data)
+                
+                # Save to CSV (the Parquet backend is written at compaction)
+                if self.backend == "csv":
+                    self._save_to_csv(data)
             
+            self._maybe_compact()
             return True
         except Exception as e:
             print(f"Error saving entry: {e}")
             return False
     
     def _save_to_csv(self, data):
-        """Save metadata to CSV file."""
-        # Define expected columns
-        columns = [
-            "date", "date_source", "filename", "image_resolution", "camera_model",
-            "dominant_color", "palette_1", "palette_2", "palette_3", "palette_4", "palette_5",
-            "weather_datetime", "weather_temperature_C", "weather_precipitation_mm",
-            "weather_cloud_cover_percent", "weather_wind_speed_kph", "weather_code",
-            "weather_source", "hive_state", "notes", "gps_lat", "gps_long", "last_updated"
-        ]
+        """Append metadata to the CSV file (superseded rows are dropped at compaction)."""
+        if not self._ensure_csv_header(data):
+            # New columns: the header can only be widened by rewriting the file
+            self._rewrite_csv(self._read_entries())
+            return
         
-        # Convert missing data to empty strings for CSV compatibility
-        for col in columns:
-            if col not in data:
-                data[col] = ""
+        with open(self.csv_file, 'a', newline='') as f:
+            csv.DictWriter(f, fieldnames=self._csv_columns, extrasaction='ignore').writerow(data)
+    
+    def _ensure_csv_header(self, data):
+        """Create the CSV with a header if needed; False if `data` has keys the header lacks."""
+        if self._csv_columns is None:
+            if os.path.exists(self.csv_file) and os.path.getsize(self.csv_file):
+                with open(self.csv_file, 'r', newline='') as f:
+                    self._csv_columns = next(csv.reader(f))
+            else:
+                self._csv_columns = CSV_COLUMNS + [k for k in data if k not in CSV_COLUMNS]
+                with open(self.csv_file, 'w', newline='') as f:
+                    csv.DictWriter(f, fieldnames=self._csv_columns).writeheader()
         
-        # Prepare data frame with single row
-        df_new = pd.DataFrame([data])
+        return all(k in self._csv_columns for k in data)
+    
+    def _rewrite_csv(self, entries):
+        """Write the CSV from scratch with a header covering every entry's keys."""
+        tmp_path = self.csv_file + ".tmp"
+        columns = self._write_csv(entries, tmp_path)
+        os.replace(tmp_path, self.csv_file)
+        self._csv_columns = columns
+    
+    @staticmethod
+    def _write_csv(entries, path):
+        """Write entries to a new CSV file; returns its columns."""
+        columns = list(CSV_COLUMNS)
+        for entry in entries:
+            columns.extend(k for k in entry if k not in columns)
         
-        if os.path.exists(self.csv_file):
-            # Load existing data
-            df_existing = pd.read_csv(self.csv_file)
-            
-            # Remove any existing entry with the same filename
-            df_existing = df_existing[df_existing['filename'] != data['filename']]
-            
-            # Check if df_existing is empty
-            if len(df_existing) == 0:
-                # If there's no existing data, just use the new data
-                df_combined = df_new
-            else:
-                # Make sure both dataframes have the same columns
-                # This addresses the deprecation warning
-                for col in df_new.columns:
-                    if col not in df_existing.columns:
-                        df_existing[col] = ""
-                for col in df_existing.columns:
-                    if col not in df_new.columns:
-                        df_new[col] = ""
-                
-                # Append new data
-                df_combined = pd.concat([df_existing, df_new], ignore_index=True)
-            
-            # Save combined data
-            df_combined.to_csv(self.csv_file, index=False)
-        else:
-            # Create new file
-            df_new.to_csv(self.csv_file, index=False)
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(entries)
+        return columns
                 
     def _save_to_json(self, data):
-        """Save metadata to JSON file with enhanced storage of nested data."""
-        # Ensure we include all nested data structures as is
-        # Ensures proper saving of complex structures like vision_analysis
-        
-        if os.path.exists(self.json_file):
-            # Load existing data
-            with open(self.json_file, 'r') as f:
-                existing = json.load(f)
-                
-            # Remove any existing entry with the same filename
-            existing = [entry for entry in existing if entry.get('filename') != data['filename']]
-            
-            # Append new data
-            existing.append(data)
-            
-            # Save updated data
-            with open(self.json_file, 'w') as f:
-                json.dump(existing, f, indent=2)
-        else:
-            # Create new file with single entry
-            with open(self.json_file, 'w') as f:
-                json.dump([data], f, indent=2)
+        """Append metadata to the JSON Lines log and point the index at the new row (locks held)."""
+        self._refresh()
+        line = (json.dumps(data, default=str) + "\n").encode("utf-8")
+        with open(self.log_file, 'ab+') as f:
+            offset = f.seek(0, os.SEEK_END)
+            if offset:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # Terminate a torn final row left by a crash, so it cannot swallow this one
+                    f.write(b"\n")
+                    offset += 1
+            f.write(line)
+        
+        if self._log_inode is None:
+            self._log_inode = os.stat(self.log_file).st_ino
+        self._offsets[data['filename']] = offset
+        self._rows += 1
+        self._indexed_size = offset + len(line)
                 
     def load_entry(self, filename):
         """Load a specific entry by filename."""
-        if os.path.exists(self.json_file):
-            with open(self.json_file, 'r') as f:
-                entries = json.load(f)
-                
-            # Find entry with matching filename
-            for entry in entries:
-                if entry.get('filename') == filename:
-                    return entry
-                    
-        return None
+        with self._lock, self._file_lock():
+            self._refresh()
+            offset = self._offsets.get(filename)
+            if offset is None:
+                return None
+            
+            with open(self.log_file, 'rb') as f:
+                f.seek(offset)
+                return json.loads(f.readline())
     
-    # The following methods should be indented to be part of the DataManager class
     def load_all_entries(self):
-        """Load all entries from the JSON file."""
-        if os.path.exists(self.json_file):
-            with open(self.json_file, 'r') as f:
-                return json.load(f)
-        return []
+        """Load all current entries (latest row per filename, in the order they were saved)."""
+        with self._lock, self._file_lock():
+            self._refresh()
+            return self._read_entries()
+    
+    def _read_entries(self, offsets=None):
+        """Read the rows the index (or `offsets`) points at."""
+        offsets = self._offsets if offsets is None else offsets
+        if not offsets:
+            return []
+        
+        wanted = set(offsets.values())
+        entries = []
+        with open(self.log_file, 'rb') as f:
+            offset = 0
+            for line in f:
+                if offset in wanted:
+                    entries.append(json.loads(line))
+                offset += len(line)
+        return entries
 
     def get_entry_summaries(self):
         """Return summaries of all entries for display in a browser/selector."""
@@ -137,4 +299,324 @@ class DataManager:
                 'thumbnail': entry.get('dominant_color', '#FFFFFF')
             }
             for entry in entries
-        ]
\ No newline at end of file
+        ]
+    
+    # ------------------------------------------------------------------ index
+    
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock on the log across instances and processes (take self._lock first)."""
+        with open(self.lock_file, 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            yield
+    
+    def _reset_index(self):
+        """Forget the index (and everything cached about the files)."""
+        self._offsets = {}
+        self._rows = 0
+        self._csv_columns = None
+        
+        # Log file the index describes and the byte offset it is current up to
+        self._log_inode = None
+        self._indexed_size = 0
+        
+        # Log offset and row count up to which the Parquet dataset is current
+        self._columnar_size = 0
+        self._columnar_rows = 0
+    
+    def _refresh(self):
+        """Index rows saved by other instances since the last look, or reload after their compaction (lock held)."""
+        if not os.path.exists(self.log_file):
+            return
+        stat = os.stat(self.log_file)
+        if stat.st_ino != self._log_inode or stat.st_size < self._indexed_size:
+            # The log was replaced by a compaction (or created) elsewhere
+            self._reset_index()
+            self._load_index()
+        elif stat.st_size > self._indexed_size:
+            self._scan(self._indexed_size)
+    
+    def _scan(self, start):
+        """Index the complete rows from byte `start` to the end of the log; returns how many were indexed."""
+        rows = 0
+        with open(self.log_file, 'rb') as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Unterminated final row: torn by a crash (the next save terminates it)
+                    break
+                try:
+                    self._offsets[json.loads(line)['filename']] = offset
+                    rows += 1
+                except (ValueError, KeyError):
+                    # Torn row from an interrupted save
+                    pass
+                offset += len(line)
+        
+        self._rows += rows
+        self._indexed_size = offset
+        return rows
+    
+    def _load_index(self):
+        """Load the saved index and scan only the rows appended after it was saved."""
+        if not os.path.exists(self.log_file):
+            return
+        
+        stat = os.stat(self.log_file)
+        self._log_inode = stat.st_ino
+        start = 0
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r') as f:
+                    saved = json.load(f)
+                # A saved index past the end, or of another file, belongs to an older log
+                if saved['size'] <= stat.st_size and saved.get('inode', stat.st_ino) == stat.st_ino:
+                    self._offsets = saved['offsets']
+                    self._rows = saved['rows']
+                    self._columnar_size = saved.get('columnar_size', 0)
+                    self._columnar_rows = saved.get('columnar_rows', 0)
+                    start = saved['size']
+            except (ValueError, KeyError):
+                start = 0
+        
+        if self._scan(start):
+            self._save_index(self._indexed_size)
+    
+    def _save_index(self, size):
+        """Save the index as of log size `size`."""
+        tmp_path = f"{self.index_file}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'size': size,
+                'inode': self._log_inode,
+                'rows': self._rows,
+                'offsets': self._offsets,
+                'columnar_size': self._columnar_size,
+                'columnar_rows': self._columnar_rows,
+            }, f)
+        os.replace(tmp_path, self.index_file)
+    
+    def _migrate_json_list(self):
+        """Convert the old single-list JSON file into the log (one time)."""
+        with open(self.json_file, 'r') as f:
+            entries = json.load(f)
+        
+        # Later entries for a filename replaced earlier ones
+        latest = {}
+        for entry in entries:
+            latest.pop(entry.get('filename'), None)
+            latest[entry.get('filename')] = entry
+        
+        tmp_path = self.log_file + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            for entry in latest.values():
+                f.write((json.dumps(entry, default=str) + "\n").encode("utf-8"))
+        os.replace(tmp_path, self.log_file)
+    
+    # ------------------------------------------------------------- compaction
+    
+    def _maybe_compact(self):
+        """Start a background compaction when superseded rows dominate the log (or Parquet is behind)."""
+        superseded = self._rows >= COMPACT_MIN_ROWS and self._rows > 2 * len(self._offsets)
+        behind = self.backend == "parquet" and self._rows - self._columnar_rows >= COLUMNAR_BATCH_ROWS
+        if not (superseded or behind):
+            return
+        if self._compaction is not None and self._compaction.is_alive():
+            return
+        
+        self._compaction = threading.Thread(target=self.compact, name="data-log-compaction", daemon=True)
+        self._compaction.start()
+    
+    def compact(self):
+        """
+        Rewrite the log and CSV (or Parquet dataset) with only the latest row per filename.
+        
+        The bulk of the copy runs without the lock; rows saved meanwhile (by
+        any instance) are carried over under the file lock before the new
+        files replace the old ones.
+        """
+        with self._lock, self._file_lock():
+            self._refresh()
+            if not os.path.exists(self.log_file):
+                return
+            end = self._indexed_size
+            inode = self._log_inode
+            offsets = dict(self._offsets)
+        
+        entries = self._read_entries(offsets)
+        tmp_path = self.log_file + ".compact"
+        csv_tmp_path = self.csv_file + ".compact"
+        new_offsets = {}
+        with open(tmp_path, 'wb') as out:
+            for entry in entries:
+                new_offsets[entry['filename']] = out.tell()
+                out.write((json.dumps(entry, default=str) + "\n").encode("utf-8"))
+            compacted_size = out.tell()
+        
+        if self.backend == "parquet":
+            parquet_tmp_dir = self.parquet_dir + ".compact"
+            self._write_parquet(entries, parquet_tmp_dir)
+        else:
+            columns = self._write_csv(entries, csv_tmp_path)
+        
+        with self._lock, self._file_lock():
+            if os.stat(self.log_file).st_ino != inode:
+                # Another instance compacted the log meanwhile; its result includes everything copied here
+                os.remove(tmp_path)
+                if self.backend == "parquet":
+                    shutil.rmtree(parquet_tmp_dir, ignore_errors=True)
+                else:
+                    os.remove(csv_tmp_path)
+                return
+            
+            # Carry over rows saved since the snapshot (they supersede copied rows)
+            tail = []
+            with open(self.log_file, 'rb') as f, open(tmp_path, 'ab') as out:
+                f.seek(end)
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        filename = entry['filename']
+                    except (ValueError, KeyError):
+                        continue
+                    new_offsets[filename] = out.tell()
+                    out.write(line if line.endswith(b"\n") else line + b"\n")
+                    tail.append(entry)
+            
+            os.replace(tmp_path, self.log_file)
+            self._offsets = new_offsets
+            self._rows = len(entries) + len(tail)
+            self._log_inode = os.stat(self.log_file).st_ino
+            self._indexed_size = os.path.getsize(self.log_file)
+            
+            if self.backend == "parquet":
+                # Carried-over rows stay in the log tail until the next compaction
+                self._swap_parquet(parquet_tmp_dir)
+                self._columnar_size = compacted_size
+                self._columnar_rows = len(entries)
+                self._save_index(os.path.getsize(self.log_file))
+                return
+            
+            self._save_index(os.path.getsize(self.log_file))
+            if all(k in columns for entry in tail for k in entry):
+                with open(csv_tmp_path, 'a', newline='') as f:
+                    csv.DictWriter(f, fieldnames=columns, extrasaction='ignore').writerows(tail)
+                os.replace(csv_tmp_path, self.csv_file)
+                self._csv_columns = columns
+            else:
+                os.remove(csv_tmp_path)
+                self._rewrite_csv(self._read_entries())
+
+    
+    # ---------------------------------------------------------------- parquet
+    
+    @staticmethod
+    def _write_parquet(entries, path):
+        """Write entries as a Parquet dataset partitioned by year/month (hive-style directories)."""
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        ds.write_dataset(
+            entries_to_table(entries), path, format="parquet",
+            partitioning=ds.partitioning(pa.schema([("year", pa.int16()), ("month", pa.int8())]), flavor="hive"),
+            existing_data_behavior="overwrite_or_ignore",
+        )
+    
+    def _swap_parquet(self, new_dir):
+        """Replace the dataset directory with a freshly written one."""
+        old_dir = self.parquet_dir + ".old"
+        if os.path.exists(self.parquet_dir):
+            os.replace(self.parquet_dir, old_dir)
+        os.replace(new_dir, self.parquet_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+    
+    def query(self, columns=None, start=None, end=None, where=None):
+        """
+        Read entries from the Parquet backend as a pandas DataFrame.
+        
+        Only the requested columns are read, and only from the year/month
+        partitions overlapping [start, end); `where` (a pyarrow.compute
+        expression, e.g. pc.field("hive_state") == "calm") is pushed down
+        to the Parquet reader. Colors come back as "#rrggbb" strings and
+        hive_state as a categorical.
+        
+        Parameters:
+            columns (list): Columns to read (default: all)
+            start (datetime): Earliest photo date, inclusive
+            end (datetime): Latest photo date, exclusive
+            where: Extra pyarrow.compute filter expression
+        
+        Returns:
+            pandas.DataFrame: One row per filename
+        """
+        if self.backend != "parquet":
+            raise ValueError("query() needs backend='parquet'")
+        
+        expression = where
+        for condition in self._date_conditions(start, end):
+            expression = condition if expression is None else expression & condition
+        
+        # filename is always read, so rows saved since compaction can replace stored ones
+        read_columns = None if columns is None else list(dict.fromkeys(["filename"] + list(columns)))
+        
+        with self._lock, self._file_lock():
+            self._refresh()
+            tail = self._read_tail()
+            if os.path.exists(self.parquet_dir):
+                dataset = ds.dataset(self.parquet_dir, format="parquet", schema=parquet_schema(),
+                                     partitioning="hive")
+                table = dataset.to_table(columns=read_columns, filter=expression)
+            else:
+                table = parquet_schema().empty_table().select(read_columns or parquet_schema().names)
+        
+        if tail:
+            recent = entries_to_table(tail)
+            if expression is not None:
+                recent = recent.filter(expression)
+            recent = recent.select(table.column_names)
+            table = table.filter(pc.invert(pc.is_in(table["filename"], value_set=pa.array([e["filename"] for e in tail]))))
+            table = pa.concat_tables([table, recent.cast(table.schema)])
+        
+        frame = table.to_pandas()
+        for name in PALETTE_COLUMNS:
+            if name in frame:
+                frame[name] = frame[name].map(lambda value: "#" + value.hex() if value is not None else None)
+        if columns is not None and "filename" not in columns:
+            frame = frame.drop(columns=["filename"])
+        return frame
+    
+    @staticmethod
+    def _date_conditions(start, end):
+        """Filters on the photo date plus the matching year/month partition keys (for pruning)."""
+        conditions = []
+        year, month = pc.field("year"), pc.field("month")
+        if start is not None:
+            conditions.append((year > start.year) | ((year == start.year) & (month >= start.month)))
+            conditions.append(pc.field("date") >= pa.scalar(start, type=pa.timestamp("s")))
+        if end is not None:
+            # End is exclusive: a range ending on the 1st at midnight does not touch that month
+            last = end - timedelta(seconds=1)
+            conditions.append((year < last.year) | ((year == last.year) & (month <= last.month)))
+            conditions.append(pc.field("date") < pa.scalar(end, type=pa.timestamp("s")))
+        return conditions
+    
+    def _read_tail(self):
+        """Latest rows saved since the Parquet dataset was written (call with the lock held)."""
+        if not os.path.exists(self.log_file):
+            return []
+        latest = {}
+        with open(self.log_file, 'rb') as f:
+            f.seek(self._columnar_size)
+            offset = self._columnar_size
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    offset += len(line)
+                    continue
+                # Only the row the index points at is current
+                if self._offsets.get(entry.get('filename')) == offset:
+                    latest[entry['filename']] = entry
+                offset += len(line)
+        return list(latest.values())
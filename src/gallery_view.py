@@ -6,6 +6,7 @@ import os
 import math
 from datetime import datetime
 from src.timeline_component import initialize_session_state
+from src.utils.thumbnail_cache import GRID_SIZE, PREVIEW_SIZE, rendition_for_photo
 
 def main():
     """Render the photo gallery page"""
@@ -78,22 +79,48 @@ def main():
     # Display photo gallery
     st.markdown("### Photo Gallery")
     
+    filter_col, quality_col, sort_col = st.columns(3)
+    with filter_col:
+        # Near-duplicates (burst shots) can be collapsed into the photo they resemble
+        collapse = st.checkbox("Collapse near-duplicates", value=False, key="collapse_near_duplicates")
+    with quality_col:
+        min_quality = st.slider("Minimum quality", min_value=0, max_value=100, value=0, step=5, key="min_photo_quality")
+    with sort_col:
+        sort_order = st.selectbox("Sort by", ["Upload order", "Quality (best first)", "Quality (worst first)"],
+                                  key="gallery_sort")
+    
+    inspection_hashes = {photo.get('content_hash') for photo in photos}
+    visible_photos = [
+        (photo_idx, photo) for photo_idx, photo in enumerate(photos)
+        if not (collapse and photo.get('near_duplicate_of') in inspection_hashes)
+        # Photos analyzed before quality scoring existed are always shown
+        and (quality_score(photo) is None or quality_score(photo) >= min_quality)
+    ]
+    if sort_order != "Upload order":
+        # Unscored photos go last either way
+        scored = [item for item in visible_photos if quality_score(item[1]) is not None]
+        unscored = [item for item in visible_photos if quality_score(item[1]) is None]
+        scored.sort(key=lambda item: quality_score(item[1]), reverse=sort_order == "Quality (best first)")
+        visible_photos = scored + unscored
+    if len(visible_photos) < len(photos):
+        st.caption(f"{len(photos) - len(visible_photos)} near-duplicate or low-quality photos hidden")
+    
     # Calculate grid layout based on number of photos
     cols_per_row = 3
-    rows = math.ceil(len(photos) / cols_per_row)
+    rows = math.ceil(len(visible_photos) / cols_per_row)
     
     # Create grid for photos
     for row in range(rows):
         columns = st.columns(cols_per_row)
         for col in range(cols_per_row):
-            photo_idx = row * cols_per_row + col
-            if photo_idx < len(photos):
-                photo = photos[photo_idx]
+            grid_idx = row * cols_per_row + col
+            if grid_idx < len(visible_photos):
+                photo_idx, photo = visible_photos[grid_idx]
                 with columns[col]:
                     # Display photo thumbnail
                     if 'file_path' in photo and os.path.exists(photo['file_path']):
-                        # Load from file path if available
-                        img = Image.open(photo['file_path'])
+                        # Small cached rendition instead of the full-size original
+                        img = rendition_for_photo(photo, GRID_SIZE)
                         st.image(img, caption=photo.get('filename', f"Photo {photo_idx+1}"), use_container_width=True)
                     elif 'data' in photo:
                         # Load from stored data
@@ -105,6 +132,15 @@ def main():
                     else:
                         st.error(f"Photo {photo_idx+1} data not available")
                     
+                    # Flag photos whose analysis was reused from a near-duplicate
+                    if photo.get('near_duplicate_of'):
+                        st.caption("≈ Near-duplicate of an earlier photo")
+                    
+                    # Quality score, and whether heavy analysis was skipped for it
+                    if quality_score(photo) is not None:
+                        note = " · heavy analysis skipped" if photo.get('quality_gated') else ""
+                        st.caption(f"Quality {quality_score(photo):.0f}/100{note}")
+                    
                     # Add a "View Details" button for each photo
                     if st.button(f"View Details", key=f"view_photo_{photo_idx}"):
                         st.session_state.selected_photo = photo_idx
@@ -124,9 +160,9 @@ def main():
             col1, col2 = st.columns([2, 1])
             
             with col1:
-                # Display full-size image
+                # Display the preview rendition (the original is only needed for analysis)
                 if 'file_path' in photo and os.path.exists(photo['file_path']):
-                    img = Image.open(photo['file_path'])
+                    img = rendition_for_photo(photo, PREVIEW_SIZE)
                     st.image(img, use_container_width=True)
                 elif 'data' in photo:
                     if isinstance(photo['data'], bytes):
@@ -147,5 +183,9 @@ def main():
                     st.session_state.view_photo_details = False
                     st.rerun()
 
+def quality_score(photo):
+    """Overall quality score of a photo record, or None if it was never scored"""
+    return (photo.get('quality') or {}).get('score')
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -3,9 +3,7 @@ import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import pandas as pd
 from PIL import Image
-import io
 import base64
-import requests
 from urllib.parse import urlparse
 
 # Updated initialize_session_state function
@@ -60,10 +58,6 @@ def initialize_session_state():
     # Collection of inspections
     if 'inspections' not in st.session_state:
         st.session_state.inspections = []
-    
-    # Image caching
-    if 'url_image_cache' not in st.session_state:
-        st.session_state.url_image_cache = {}
 
 
 
@@ -253,66 +247,23 @@ def render_timeline():
 def process_url_image(img_url):
     """
     Download and process an image from a URL with caching.
-    Images are cached in session state to avoid unnecessary downloads.
+    Downloads are cached on disk in the URL cache shared by all sessions.
     
     Parameters:
         img_url (str): URL of the image to process
         
     Returns:
-        bool: True if processing was successful
+        dict: Photo data if processing was successful, otherwise None
     """
-    try:
-        # Check cache first
-        if 'url_image_cache' in st.session_state and url in st.session_state.url_image_cache:
-            # Use cached image data
-            image_data = st.session_state.url_image_cache[url]
-            
-            # Extract filename from URL
-            filename = url.split('/')[-1]
-            if '?' in filename:
-                filename = filename.split('?')[0]
-            if not filename:
-                filename = "image_from_url.jpg"
-                
-            # Process the cached image
-            photo_data = process_image_file(io.BytesIO(image_data), filename)
-            
-            # Set refresh flag
-            st.session_state.needs_refresh = True
-            
-            return photo_data
-        else:
-            # Download the image
-            response = requests.get(url)
-            if response.status_code == 200:
-                # Get image data
-                image_data = response.content
-                
-                # Cache the image data
-                if 'url_image_cache' not in st.session_state:
-                    st.session_state.url_image_cache = {}
-                st.session_state.url_image_cache[url] = image_data
-                
-                # Extract filename from URL
-                filename = url.split('/')[-1]
-                if '?' in filename:
-                    filename = filename.split('?')[0]
-                if not filename:
-                    filename = "image_from_url.jpg"
-                
-                # Process the downloaded image
-                photo_data = process_image_file(io.BytesIO(image_data), filename)
-                
-                # Set refresh flag
-                st.session_state.needs_refresh = True
-                
-                return photo_data
-            else:
-                st.error(f"Failed to download image. Status code: {response.status_code}")
-                return None
-    except Exception as e:
-        st.error(f"Error processing URL image: {e}")
+    from src.utils.image_processor import process_url_image as process_cached_url_image
+    photo_data = process_cached_url_image(img_url)
+    if not photo_data:
         return None
+    
+    # Set refresh flag
+    st.session_state.needs_refresh = True
+    
+    return photo_data
 
 def extract_exif(img_file):
     """
@@ -325,15 +276,16 @@ def extract_exif(img_file):
         dict: Dictionary of EXIF metadata tags
     """
     try:
-        img = Image.open(img_file)
-        exif_data = {}
-        if hasattr(img, '_getexif') and img._getexif() is not None:
-            exif = img._getexif()
-            from PIL.ExifTags import TAGS
-            for tag_id, value in exif.items():
-                tag = TAGS.get(tag_id, tag_id)
-                exif_data[tag] = value
-        return exif_data
+        from src.utils.exif_reader import read_image_header
+        from src.utils.image_context import read_exif_tags
+        
+        # Header-only read for JPEG/PNG, no pixel decode
+        header = read_image_header(img_file)
+        if header:
+            return header['exif']
+        
+        with Image.open(img_file) as img:
+            return read_exif_tags(img)
     except Exception as e:
         st.warning(f"Could not extract EXIF data: {e}")
         return {}
@@ -360,7 +312,6 @@ def get_file_creation_date(img_file):
 def extract_gps_coordinates(exif_data):
     """
     Extract GPS coordinates from EXIF data.
-    Currently returns placeholder values to avoid parsing errors.
     
     Parameters:
         exif_data (dict): Dictionary of EXIF metadata
@@ -368,15 +319,8 @@ def extract_gps_coordinates(exif_data):
     Returns:
         tuple: (latitude, longitude) as floats, or (None, None) if not found
     """
-    try:
-        if 'GPSInfo' in exif_data:
-            # For now, just return placeholder values to avoid parsing errors
-            # This can be enhanced in the future as needed
-            return 37.7749, -122.4194
-        return None, None
-    except Exception as e:
-        st.warning(f"Could not extract GPS coordinates: {e}")
-        return None, None
+    from src.utils.geo import decode_gps
+    return decode_gps(exif_data)
 
 def rgb_to_hex(rgb):
     """
@@ -392,24 +336,26 @@ def rgb_to_hex(rgb):
 
 def get_palette(img_file):
     """
-    Extract dominant color palette from image using ColorThief.
+    Extract dominant color palette from image using the NumPy palette engine.
     
     Parameters:
-        img_file: File-like object or path to image
+        img_file: File-like object, path to image, or PIL Image
         
     Returns:
         list: List of RGB tuples representing the dominant colors
     """
     try:
-        from colorthief import ColorThief
+        from src.utils.palette import extract_palette
+        
+        if isinstance(img_file, Image.Image):
+            return extract_palette(img_file, color_count=5)
         
         # If img_file is a BytesIO object, we need to seek to the beginning
         if hasattr(img_file, 'seek'):
             img_file.seek(0)
             
-        color_thief = ColorThief(img_file)
-        palette = color_thief.get_palette(color_count=5, quality=1)
-        return palette
+        with Image.open(img_file) as img:
+            return extract_palette(img, color_count=5)
     except Exception as e:
         st.warning(f"Could not extract color palette: {e}")
         # Return fallback colors that look like honey/hive colors
@@ -417,7 +363,7 @@ def get_palette(img_file):
 
 def process_image(img_file, img_name):
     """
-    Process an image to extract metadata in a single efficient pass.
+    Process an image through the shared ingest pipeline and show it.
     
     Parameters:
         img_file (str or file-like): Path to image or file-like object
@@ -427,100 +373,34 @@ def process_image(img_file, img_name):
         bool: True if processing was successful
     """
     try:
-        # Reset file position if needed
-        if hasattr(img_file, 'seek'):
-            img_file.seek(0)
-            
-        # Open the image once and keep it in memory
-        img = Image.open(img_file)
+        from src.utils.image_processor import process_image_file
         
-        # Extract EXIF data
-        exif = {}
-        if hasattr(img, '_getexif') and img._getexif() is not None:
-            raw_exif = img._getexif()
-            from PIL.ExifTags import TAGS
-            for tag_id, value in raw_exif.items():
-                tag = TAGS.get(tag_id, tag_id)
-                exif[tag] = value
-        
-        # Get date taken
-        date_taken = exif.get("DateTimeOriginal")
-        if not date_taken:
-            # Use file creation date as fallback
-            date_taken = datetime.now().strftime("%Y:%m:%d %H:%M:%S")
-            date_source = "File Creation Date"
-        else:
-            date_source = "EXIF"
+        # Store, analyze (stage pipeline) and load the photo into session state
+        photo_data = process_image_file(img_file, img_name)
+        if not photo_data:
+            return False
         
         # Convert date string to datetime
-        if isinstance(date_taken, str):
-            try:
-                date_taken_dt = datetime.strptime(date_taken, "%Y:%m:%d %H:%M:%S")
-            except ValueError:
-                # Fallback to current date if parsing fails
-                date_taken_dt = datetime.now()
-                date_taken = date_taken_dt.strftime("%Y:%m:%d %H:%M:%S")
-        else:
-            date_taken_dt = date_taken
-        
-        # Extract GPS coordinates if available (simplified)
-        lat, lon = extract_gps_coordinates(exif)
-        
-        # Get camera model
-        camera_model = exif.get("Model", "Unknown")
-        
-        # Get image resolution
-        image_resolution = f"{img.width} x {img.height}"
+        try:
+            date_taken_dt = datetime.strptime(photo_data.get('date_taken', ""), "%Y:%m:%d %H:%M:%S")
+        except ValueError:
+            # Fallback to current date if parsing fails
+            date_taken_dt = datetime.now()
+        st.session_state.date_taken_dt = date_taken_dt
         
-        # Reset file position for color thief
-        if hasattr(img_file, 'seek'):
-            img_file.seek(0)
-            
-        # Extract color palette
-        palette_rgb = get_palette(img_file)
-        palette_hex = [rgb_to_hex(c) for c in palette_rgb]
-        
-        # Store the image data in session state
-        if hasattr(img_file, 'seek'):
-            img_file.seek(0)
-            img_data = img_file.read()
-            st.session_state.current_image = img_data
-        else:
-            # For PIL Image objects without file backing
-            img_buffer = io.BytesIO()
-            img.save(img_buffer, format=img.format or 'JPEG')
-            img_buffer.seek(0)
-            st.session_state.current_image = img_buffer.read()
-        
-        # Update metadata in session state
-        metadata = {
-            "filename": img_name,
-            "exif_data": exif,
-            "date_taken": date_taken,
-            "date_taken_dt": date_taken_dt,
-            "date_source": date_source,
-            "camera_model": camera_model,
-            "palette_hex": palette_hex,
-            "image_resolution": image_resolution,
-            "lat": lat,
-            "lon": lon,
-            "weather_info": {
-                "weather_datetime": date_taken,
-                "weather_temperature_C": None,
-                "weather_precipitation_mm": None,
-                "weather_cloud_cover_percent": None,
-                "weather_wind_speed_kph": None,
-                "weather_code": None,
-                "weather_source": "Not retrieved"
-            }
+        # Weather is fetched on demand
+        st.session_state.weather_info = photo_data.get('weather') or {
+            "weather_datetime": photo_data.get('date_taken'),
+            "weather_temperature_C": None,
+            "weather_precipitation_mm": None,
+            "weather_cloud_cover_percent": None,
+            "weather_wind_speed_kph": None,
+            "weather_code": None,
+            "weather_source": "Not retrieved"
         }
         
-        # Update session state
-        for key, value in metadata.items():
-            st.session_state[key] = value
-        
         # Update inspections data
-        update_inspections(date_taken_dt, lat, lon)
+        update_inspections(date_taken_dt, photo_data.get('lat'), photo_data.get('lon'))
         
         return True
     except Exception as e:
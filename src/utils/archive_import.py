@@ -0,0 +1,232 @@
+# src/utils/archive_import.py
+# --------------------------------------------------------------------------
+# Import of whole inspections shared as ZIP or TAR archives (e.g. exported
+# from a phone). Members are streamed one at a time straight into the blob
+# store, never extracted to a temporary directory, and each stored photo
+# is analyzed on a worker pool with a bounded number of photos in flight,
+# so memory stays flat however large the archive is. Members larger than
+# MAX_MEMBER_BYTES (declared or decompressed) are rejected, so a small
+# archive cannot fill the disk. The photos are then grouped into
+# inspections with a single store write.
+#
+# Usage (from the project root):
+#   python -m src.utils.archive_import inspection.zip [--workers 4]
+# --------------------------------------------------------------------------
+import argparse
+import os
+import tarfile
+import time
+import zipfile
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from src.utils.blob_store import CHUNK_SIZE, get_blob_store
+from src.utils.ingest import ingest_stored
+from src.utils.inspection_store import INSPECTIONS_FILE, get_inspection_store
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+# Upload types accepted by the sidebar archive uploader
+ARCHIVE_TYPES = ["zip", "tar", "tgz", "gz", "bz2", "xz"]
+
+# Default analysis workers, and stored photos waiting for or under analysis per worker
+DEFAULT_ARCHIVE_WORKERS = min(4, os.cpu_count() or 1)
+IN_FLIGHT_PER_WORKER = 2
+
+# Largest decompressed member accepted (a few times the biggest panorama expected)
+MAX_MEMBER_BYTES = 200 * 1024 * 1024
+
+
+class MemberTooLarge(ValueError):
+    """An archive member decompresses to more than the per-member limit"""
+
+
+def _limit_message(max_bytes):
+    return f"larger than the {max_bytes / (1024 * 1024):.1f} MB per-photo limit"
+
+
+def is_image_member(name):
+    """True for image members, skipping macOS resource forks and hidden files"""
+    base = os.path.basename(name)
+    if not base or base.startswith(".") or "__MACOSX/" in name:
+        return False
+    return os.path.splitext(base)[1].lower() in IMAGE_EXTENSIONS
+
+
+def _read_chunks(member, max_bytes=MAX_MEMBER_BYTES, chunk_size=CHUNK_SIZE):
+    """Fixed-size chunks of an archive member, read forward only; raises MemberTooLarge past `max_bytes`"""
+    received = 0
+    while True:
+        chunk = member.read(chunk_size)
+        if not chunk:
+            break
+        received += len(chunk)
+        if received > max_bytes:
+            raise MemberTooLarge(_limit_message(max_bytes))
+        yield chunk
+
+
+def iter_archive_members(source):
+    """
+    Stream the image members of a ZIP or TAR archive.
+
+    ZIP members are decompressed one at a time from the central directory;
+    TARs (optionally gzip/bzip2/xz compressed) are read as a forward-only
+    stream. Each member must be consumed before the next one is requested.
+    A TAR that turns out truncated or corrupt partway through raises
+    ValueError, like one that cannot be opened at all.
+
+    Parameters:
+        source: Path or seekable binary file-like object
+
+    Yields:
+        tuple: (member name, readable file-like object, declared uncompressed size)
+    """
+    if not isinstance(source, (str, os.PathLike)):
+        source.seek(0)
+    is_zip = zipfile.is_zipfile(source)
+    if not isinstance(source, (str, os.PathLike)):
+        source.seek(0)
+
+    if is_zip:
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not is_image_member(info.filename):
+                    continue
+                with archive.open(info) as member:
+                    yield info.filename, member, info.file_size
+        return
+
+    try:
+        if isinstance(source, (str, os.PathLike)):
+            archive = tarfile.open(source, mode="r|*")
+        else:
+            archive = tarfile.open(fileobj=source, mode="r|*")
+    except tarfile.TarError:
+        raise ValueError("not a ZIP or TAR archive")
+
+    with archive:
+        members = iter(archive)
+        while True:
+            try:
+                info = next(members)
+            except StopIteration:
+                return
+            except (tarfile.TarError, EOFError, OSError, zlib.error) as e:
+                raise ValueError(f"truncated or corrupt archive: {e}")
+            if not info.isfile() or not is_image_member(info.name):
+                continue
+            member = archive.extractfile(info)
+            if member is not None:
+                yield info.name, member, info.size
+
+
+def ingest_archive(source, workers=DEFAULT_ARCHIVE_WORKERS, store=None, progress=None,
+                   max_member_bytes=MAX_MEMBER_BYTES):
+    """
+    Store and analyze every photo in an archive, without writing the inspection store.
+
+    Members are copied into the blob store on the calling thread (an archive
+    can only be read in order); analysis runs on `workers` threads, and
+    reading pauses while too many stored photos are waiting for analysis.
+
+    Parameters:
+        source: Path or seekable binary file-like object
+        workers (int): Analysis threads
+        store (BlobStore): Blob store to use (defaults to the process-wide one)
+        progress (callable): Called as progress(members read, photos finished)
+        max_member_bytes (int): Members larger than this are skipped and counted as failed
+
+    Returns:
+        tuple: (photo records in archive order, stats dict with 'files', 'cached', 'failed', 'errors')
+    """
+    store = store or get_blob_store()
+    workers = max(1, workers or DEFAULT_ARCHIVE_WORKERS)
+    max_in_flight = workers * IN_FLIGHT_PER_WORKER
+
+    results = {}
+    stats = {"files": 0, "cached": 0, "failed": 0, "errors": []}
+    in_flight = {}
+
+    def collect(done):
+        for future in done:
+            index, name = in_flight.pop(future)
+            try:
+                photo, cached = future.result()
+                results[index] = photo
+                stats["cached"] += int(cached)
+            except Exception as e:
+                stats["failed"] += 1
+                stats["errors"].append(f"{name}: {e}")
+            if progress:
+                progress(stats["files"], len(results) + stats["failed"])
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="archive") as executor:
+        for index, (name, member, size) in enumerate(iter_archive_members(source)):
+            stats["files"] += 1
+            filename = os.path.basename(name)
+            try:
+                # The declared size can lie, so the stream is counted as well
+                if size > max_member_bytes:
+                    raise MemberTooLarge(_limit_message(max_member_bytes))
+                content_hash, file_path, created, _ = store.put_chunks(
+                    _read_chunks(member, max_member_bytes), filename
+                )
+            except Exception as e:
+                stats["failed"] += 1
+                stats["errors"].append(f"{name}: {e}")
+                continue
+
+            future = executor.submit(ingest_stored, content_hash, file_path, created, filename, store)
+            in_flight[future] = (index, name)
+            if len(in_flight) >= max_in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            collect(done)
+
+    return [results[index] for index in sorted(results)], stats
+
+
+def import_archive(source, workers=DEFAULT_ARCHIVE_WORKERS, data_file=INSPECTIONS_FILE, log=print):
+    """
+    Ingest an archive and group its photos into inspections with one store write.
+
+    Returns:
+        dict: Counts of files, added, skipped (already recorded) and failed photos, plus elapsed seconds
+    """
+    def progress(read, finished):
+        if finished % 100 == 0:
+            log(f"  {finished} photos analyzed ({read} read from the archive)")
+
+    start = time.perf_counter()
+    photos, stats = ingest_archive(source, workers, progress=progress)
+    for error in stats["errors"]:
+        log(f"  failed: {error}")
+
+    added = get_inspection_store(data_file).publish_photos(photos)
+
+    stats["added"] = added
+    stats["skipped"] = len(photos) - added
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import hive photos from a ZIP or TAR archive")
+    parser.add_argument("archive", help="Archive (.zip, .tar, .tar.gz, ...) of .jpg/.jpeg/.png photos")
+    parser.add_argument("--workers", type=int, default=DEFAULT_ARCHIVE_WORKERS, help="Analysis threads")
+    parser.add_argument("--data-file", default=INSPECTIONS_FILE, help="Inspection store file")
+    args = parser.parse_args()
+
+    try:
+        stats = import_archive(args.archive, args.workers, args.data_file)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Added {stats['added']}, skipped {stats['skipped']} already recorded, "
+          f"failed {stats['failed']} of {stats['files']} photos in {stats['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
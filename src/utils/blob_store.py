@@ -0,0 +1,221 @@
+# src/utils/blob_store.py
+# --------------------------------------------------------------------------
+# Content-addressed store for original photos.
+#
+# Each upload is stored once under its SHA-256 digest in a sharded layout
+# (data/blobs/ab/cd/abcd....jpg). A JSON sidecar next to the blob keeps the
+# analyzed photo record and a refcount of the inspection photo records that
+# point at it, so duplicate uploads can reuse the existing analysis.
+#
+# Sidecar updates hold a per-shard lock file (data/blobs/locks/ab.lock), so
+# the Streamlit server, the bulk ingest workers and the CLI tools never
+# lose each other's refcount changes.
+# --------------------------------------------------------------------------
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from src.utils.persistence import file_lock
+
+DEFAULT_BLOB_ROOT = os.path.join("data", "blobs")
+
+# Size of each read/write when streaming uploads and downloads to disk
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_bytes(data):
+    """SHA-256 hex digest of a bytes-like object"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(source, chunk_size=CHUNK_SIZE):
+    """SHA-256 hex digest of a file (path or file-like), read in fixed-size chunks"""
+    sha256 = hashlib.sha256()
+    for chunk in iter_chunks(source, chunk_size):
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def iter_chunks(source, chunk_size=CHUNK_SIZE):
+    """Yield fixed-size chunks from bytes, a binary file-like object or a path"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source).cast("B")
+        for start in range(0, len(view), chunk_size):
+            yield view[start:start + chunk_size]
+        return
+
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            yield from iter_chunks(f, chunk_size)
+        return
+
+    if hasattr(source, "seek"):
+        source.seek(0)
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+class BlobStore:
+    """Content-addressed blob store with per-blob refcounts and cached analysis"""
+
+    def __init__(self, root=DEFAULT_BLOB_ROOT):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def _shard_dir(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4])
+
+    def _sidecar_lock(self, digest):
+        """Lock held across processes while a blob's sidecar is read and rewritten"""
+        return file_lock(os.path.join(self.root, "locks", f"{digest[:2]}.lock"))
+
+    def blob_path(self, digest, ext=""):
+        """Path of the blob for `digest` (the extension is kept for readability)"""
+        return os.path.join(self._shard_dir(digest), f"{digest}{ext.lower()}")
+
+    def meta_path(self, digest):
+        return os.path.join(self._shard_dir(digest), f"{digest}.json")
+
+    def _read_meta(self, digest):
+        try:
+            with open(self.meta_path(digest), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, digest, meta):
+        """Atomically replace the sidecar so readers never see a partial file"""
+        directory = self._shard_dir(digest)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            # default=str keeps raw EXIF values (e.g. rationals) from breaking the write
+            json.dump(meta, f, default=str)
+        os.replace(tmp_path, self.meta_path(digest))
+
+    def find(self, digest):
+        """Return the stored blob path for `digest`, or None"""
+        meta = self._read_meta(digest)
+        if meta and os.path.exists(meta.get("path", "")):
+            return meta["path"]
+        return None
+
+    def put_chunks(self, chunks, filename=""):
+        """
+        Stream chunks to disk while hashing them, then file the blob under its digest.
+
+        Only one chunk is held in memory at a time, so peak memory does not
+        depend on the size of the photo.
+
+        Returns:
+            tuple: (digest, blob path, created, size) where created is False for duplicates
+        """
+        staging_dir = os.path.join(self.root, "tmp")
+        os.makedirs(staging_dir, exist_ok=True)
+
+        sha256 = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=staging_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    if not chunk:
+                        continue
+                    sha256.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            digest = sha256.hexdigest()
+
+            with self._sidecar_lock(digest):
+                existing = self.find(digest)
+                if existing:
+                    return digest, existing, False, size
+
+                ext = os.path.splitext(filename)[1]
+                path = self.blob_path(digest, ext)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+
+                self._write_meta(digest, {"path": path, "size": size, "refcount": 0, "photo": None})
+                return digest, path, True, size
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def put_file(self, source, filename="", chunk_size=CHUNK_SIZE):
+        """Store bytes, a file-like object or a path in fixed-size chunks (see put_chunks)"""
+        return self.put_chunks(iter_chunks(source, chunk_size), filename)
+
+    def put_bytes(self, data, filename=""):
+        """Store an in-memory blob; returns (digest, blob path, created)"""
+        digest, path, created, _ = self.put_file(data, filename)
+        return digest, path, created
+
+    def get_record(self, digest):
+        """Cached photo record for an already analyzed blob, or None"""
+        meta = self._read_meta(digest)
+        if meta and meta.get("photo") and os.path.exists(meta.get("path", "")):
+            return meta["photo"]
+        return None
+
+    def set_record(self, digest, photo):
+        """Cache the analyzed photo record alongside the blob"""
+        with self._sidecar_lock(digest):
+            meta = self._read_meta(digest)
+            if meta is None:
+                return False
+            meta["photo"] = {k: v for k, v in photo.items() if k != "data"}
+            self._write_meta(digest, meta)
+            return True
+
+    def refcount(self, digest):
+        meta = self._read_meta(digest)
+        return meta.get("refcount", 0) if meta else 0
+
+    def incref(self, digest):
+        """Record one more photo record pointing at this blob"""
+        with self._sidecar_lock(digest):
+            meta = self._read_meta(digest)
+            if meta is None:
+                return 0
+            meta["refcount"] = meta.get("refcount", 0) + 1
+            self._write_meta(digest, meta)
+            return meta["refcount"]
+
+    def decref(self, digest):
+        """Drop one reference; the blob and its sidecar are deleted when none remain"""
+        with self._sidecar_lock(digest):
+            meta = self._read_meta(digest)
+            if meta is None:
+                return 0
+
+            meta["refcount"] = max(0, meta.get("refcount", 0) - 1)
+            if meta["refcount"] > 0:
+                self._write_meta(digest, meta)
+                return meta["refcount"]
+
+            for path in (meta.get("path"), self.meta_path(digest)):
+                try:
+                    if path:
+                        os.remove(path)
+                except OSError:
+                    pass
+            return 0
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_blob_store():
+    """Process-wide BlobStore rooted at data/blobs"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = BlobStore()
+        return _default_store
@@ -0,0 +1,300 @@
+# src/utils/exif_reader.py
+# --------------------------------------------------------------------------
+# Header-only metadata reader: image size and EXIF tags straight from the
+# JPEG APP1 / SOF segments or the PNG IHDR / eXIf chunks, without decoding
+# any pixels. Used for re-indexing, sorting uploads and date grouping.
+# --------------------------------------------------------------------------
+import io
+import os
+import struct
+from datetime import datetime
+from PIL import ExifTags
+from PIL.TiffImagePlugin import IFDRational
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# SOFn markers carry the frame size (C4, C8 and CC are DHT, JPG and DAC)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+JPEG_SOS = 0xDA
+JPEG_APP1 = 0xE1
+
+EXIF_IFD_POINTER = 0x8769
+GPS_IFD_POINTER = 0x8825
+
+# TIFF field type -> (struct format, size in bytes)
+TIFF_TYPES = {
+    1: ("B", 1),    # BYTE
+    2: ("s", 1),    # ASCII
+    3: ("H", 2),    # SHORT
+    4: ("L", 4),    # LONG
+    5: ("LL", 8),   # RATIONAL
+    6: ("b", 1),    # SBYTE
+    7: ("s", 1),    # UNDEFINED
+    8: ("h", 2),    # SSHORT
+    9: ("l", 4),    # SLONG
+    10: ("ll", 8),  # SRATIONAL
+    11: ("f", 4),   # FLOAT
+    12: ("d", 8),   # DOUBLE
+}
+
+
+class _BufferReader:
+    """Minimal read/seek interface over a bytes-like object, without copying it"""
+
+    def __init__(self, buffer):
+        self.view = memoryview(buffer).cast("B")
+        self.pos = 0
+
+    def read(self, size):
+        chunk = self.view[self.pos:self.pos + size].tobytes()
+        self.pos += len(chunk)
+        return chunk
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+        self.pos = max(0, offset)
+        return self.pos
+
+
+def _read_value(tiff, endian, field_type, count, value_offset):
+    """Decode one IFD entry value the same way PIL presents it"""
+    fmt, size = TIFF_TYPES[field_type]
+    if field_type in (1, 2, 7):
+        raw = bytes(tiff[value_offset:value_offset + count])
+        if field_type == 2:
+            return raw.split(b"\x00", 1)[0].decode("utf-8", "replace").strip()
+        return raw
+
+    values = struct.unpack_from(endian + fmt * count, tiff, value_offset)
+    if field_type in (5, 10):
+        values = tuple(IFDRational(values[i], values[i + 1]) for i in range(0, len(values), 2))
+    return values[0] if len(values) == 1 else tuple(values)
+
+
+def _parse_ifd(tiff, endian, offset):
+    """Parse one IFD into a {tag_id: value} dict"""
+    tags = {}
+    if offset <= 0 or offset + 2 > len(tiff):
+        return tags
+
+    (entry_count,) = struct.unpack_from(endian + "H", tiff, offset)
+    for i in range(entry_count):
+        entry = offset + 2 + i * 12
+        if entry + 12 > len(tiff):
+            break
+        tag, field_type, count = struct.unpack_from(endian + "HHL", tiff, entry)
+        if field_type not in TIFF_TYPES:
+            continue
+
+        data_size = TIFF_TYPES[field_type][1] * count
+        if data_size <= 4:
+            value_offset = entry + 8
+        else:
+            (value_offset,) = struct.unpack_from(endian + "L", tiff, entry + 8)
+            if value_offset + data_size > len(tiff):
+                continue
+
+        try:
+            tags[tag] = _read_value(tiff, endian, field_type, count, value_offset)
+        except struct.error:
+            continue
+    return tags
+
+
+def parse_tiff_exif(tiff):
+    """
+    Parse a raw TIFF/EXIF block into a dict keyed by readable tag names.
+
+    Uses the same layout as PIL's `_getexif()`: Exif sub-IFD tags are merged
+    in and GPS tags are kept as a nested dict under "GPSInfo".
+    """
+    tiff = memoryview(tiff).cast("B")
+    if len(tiff) < 8:
+        return {}
+
+    byte_order = bytes(tiff[:2])
+    if byte_order == b"II":
+        endian = "<"
+    elif byte_order == b"MM":
+        endian = ">"
+    else:
+        return {}
+
+    (ifd0_offset,) = struct.unpack_from(endian + "L", tiff, 4)
+    tags = _parse_ifd(tiff, endian, ifd0_offset)
+
+    exif_offset = tags.pop(EXIF_IFD_POINTER, None)
+    if isinstance(exif_offset, int):
+        tags.update(_parse_ifd(tiff, endian, exif_offset))
+
+    gps_offset = tags.pop(GPS_IFD_POINTER, None)
+    if isinstance(gps_offset, int):
+        gps_info = _parse_ifd(tiff, endian, gps_offset)
+        if gps_info:
+            tags[GPS_IFD_POINTER] = gps_info
+
+    return {ExifTags.TAGS.get(tag, tag): value for tag, value in tags.items()}
+
+
+def _read_jpeg_header(f):
+    """Walk JPEG markers up to the start of scan, collecting size and EXIF"""
+    width = height = None
+    exif = {}
+
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            break
+
+        # Skip fill bytes between markers
+        code = marker[1]
+        while code == 0xFF:
+            next_byte = f.read(1)
+            if not next_byte:
+                return width, height, exif
+            code = next_byte[0]
+
+        # Standalone markers have no length field
+        if code == 0x01 or 0xD0 <= code <= 0xD8:
+            continue
+        if code == JPEG_SOS or code == 0xD9:
+            break
+
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            break
+        (length,) = struct.unpack(">H", length_bytes)
+
+        if code == JPEG_APP1 and not exif:
+            segment = f.read(length - 2)
+            if segment[:6] == b"Exif\x00\x00":
+                exif = parse_tiff_exif(segment[6:])
+        elif code in JPEG_SOF_MARKERS:
+            segment = f.read(length - 2)
+            height, width = struct.unpack(">HH", segment[1:5])
+        else:
+            f.seek(length - 2, io.SEEK_CUR)
+
+        # Frame size always precedes the scan; EXIF always precedes the frame
+        if width is not None:
+            break
+
+    return width, height, exif
+
+
+def _read_png_header(f):
+    """Walk PNG chunks up to the first IDAT, collecting size and eXIf"""
+    width = height = None
+    exif = {}
+
+    while True:
+        chunk_header = f.read(8)
+        if len(chunk_header) < 8:
+            break
+        length, chunk_type = struct.unpack(">L4s", chunk_header)
+
+        if chunk_type == b"IHDR":
+            data = f.read(length)
+            width, height = struct.unpack(">LL", data[:8])
+            f.seek(4, io.SEEK_CUR)
+        elif chunk_type == b"eXIf":
+            exif = parse_tiff_exif(f.read(length))
+            f.seek(4, io.SEEK_CUR)
+        elif chunk_type in (b"IDAT", b"IEND"):
+            break
+        else:
+            f.seek(length + 4, io.SEEK_CUR)
+
+    return width, height, exif
+
+
+def read_image_header(source):
+    """
+    Read image size and EXIF without decoding pixels.
+
+    Parameters:
+        source: Path, binary file handle, bytes or memoryview
+
+    Returns:
+        dict: {'format', 'width', 'height', 'exif'}, or None if the format
+              is not JPEG/PNG or the header is unreadable
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return read_image_header(f)
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        f = _BufferReader(source)
+    else:
+        f = source
+        if hasattr(f, "seek"):
+            f.seek(0)
+
+    try:
+        signature = f.read(8)
+        if signature[:2] == b"\xff\xd8":
+            f.seek(2)
+            image_format = "JPEG"
+            width, height, exif = _read_jpeg_header(f)
+        elif signature == PNG_SIGNATURE:
+            image_format = "PNG"
+            width, height, exif = _read_png_header(f)
+        else:
+            return None
+    except (struct.error, ValueError, OSError):
+        return None
+
+    if width is None or height is None:
+        return None
+
+    return {"format": image_format, "width": width, "height": height, "exif": exif}
+
+
+def read_capture_date(source):
+    """Return the EXIF capture date string ("YYYY:MM:DD HH:MM:SS"), or None"""
+    header = read_image_header(source)
+    if not header:
+        return None
+    exif = header["exif"]
+    return exif.get("DateTimeOriginal") or exif.get("DateTime") or None
+
+
+def scan_capture_dates(paths):
+    """
+    Read capture dates for many files from their headers only.
+
+    Yields:
+        tuple: (path, datetime or None, (width, height) or None)
+    """
+    for path in paths:
+        try:
+            header = read_image_header(path)
+        except OSError:
+            header = None
+
+        if not header:
+            yield path, None, None
+            continue
+
+        exif = header["exif"]
+        date_str = exif.get("DateTimeOriginal") or exif.get("DateTime")
+        try:
+            taken = datetime.strptime(date_str, "%Y:%m:%d %H:%M:%S") if date_str else None
+        except (TypeError, ValueError):
+            taken = None
+        yield path, taken, (header["width"], header["height"])
+
+
+def group_paths_by_date(paths):
+    """Group image paths into inspection days ("YYYY-MM-DD") using header-only date reads"""
+    groups = {}
+    for path, taken, _ in scan_capture_dates(paths):
+        key = taken.strftime("%Y-%m-%d") if taken else "Unknown"
+        groups.setdefault(key, []).append(path)
+
+    for key in groups:
+        groups[key].sort()
+    return groups
@@ -0,0 +1,284 @@
+# src/utils/geo.py
+# --------------------------------------------------------------------------
+# GPS decoding and spatial bucketing for photos.
+#
+# `decode_gps` is the one EXIF GPS decoder: degrees/minutes/seconds
+# rationals plus N/S/E/W references to signed decimal degrees. Locations
+# are bucketed with geohashes, which gives every consumer the same cells:
+# apiaries (~150 m cells), weather lookups (~5 km cells, about the weather
+# model's grid) and `SpatialIndex` radius queries.
+# --------------------------------------------------------------------------
+import bisect
+import math
+import threading
+
+EARTH_RADIUS_M = 6371008.8
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Geohash precision stored on photo records (~5 m cells)
+PHOTO_GEOHASH_PRECISION = 9
+
+# Cells used to group photos into apiaries (~150 m) and to share weather lookups (~5 km)
+APIARY_PRECISION = 7
+WEATHER_PRECISION = 5
+
+# GPS IFD tag ids
+GPS_LATITUDE_REF = 1
+GPS_LATITUDE = 2
+GPS_LONGITUDE_REF = 3
+GPS_LONGITUDE = 4
+
+
+def _to_float(value):
+    """Float from an IFDRational, number or legacy (numerator, denominator) pair"""
+    if isinstance(value, (tuple, list)) and len(value) == 2:
+        numerator, denominator = value
+        return float(numerator) / float(denominator) if denominator else None
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def dms_to_degrees(dms, ref=None):
+    """
+    Convert EXIF degrees/minutes/seconds to signed decimal degrees.
+
+    Parameters:
+        dms: (degrees, minutes, seconds) as rationals, floats or (num, den) pairs;
+             a single number is taken as decimal degrees
+        ref: 'N', 'S', 'E' or 'W' (str or bytes); 'S' and 'W' are negative
+
+    Returns:
+        float: Decimal degrees, or None if the value cannot be decoded
+    """
+    try:
+        if isinstance(dms, (tuple, list)):
+            parts = [_to_float(v) for v in dms]
+            if not parts or any(p is None for p in parts):
+                return None
+            parts += [0.0] * (3 - len(parts))
+            degrees = parts[0] + parts[1] / 60 + parts[2] / 3600
+        else:
+            degrees = _to_float(dms)
+            if degrees is None:
+                return None
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+
+    if isinstance(ref, bytes):
+        ref = ref.decode("ascii", "ignore")
+    if isinstance(ref, str) and ref.strip().upper()[:1] in ("S", "W"):
+        degrees = -abs(degrees)
+    return degrees
+
+
+def decode_gps(exif_data):
+    """
+    Decimal (latitude, longitude) from EXIF data, or (None, None).
+
+    Accepts the readable-tag dict from the EXIF readers (GPS tags nested
+    under "GPSInfo" by tag id or by name).
+    """
+    gps_info = exif_data.get("GPSInfo") if exif_data else None
+    if not isinstance(gps_info, dict):
+        return None, None
+
+    def tag(tag_id, name):
+        for key in (tag_id, str(tag_id), name):
+            if key in gps_info:
+                return gps_info[key]
+        return None
+
+    lat = dms_to_degrees(tag(GPS_LATITUDE, "GPSLatitude"), tag(GPS_LATITUDE_REF, "GPSLatitudeRef"))
+    lon = dms_to_degrees(tag(GPS_LONGITUDE, "GPSLongitude"), tag(GPS_LONGITUDE_REF, "GPSLongitudeRef"))
+
+    # (0, 0) is what many cameras write when they have no fix
+    if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180) or (lat == 0 and lon == 0):
+        return None, None
+    return lat, lon
+
+
+def photo_coordinates(photo):
+    """
+    Decimal (latitude, longitude) of a photo record, or (None, None).
+
+    Older records stored the raw DMS tuples (without hemisphere); those are
+    converted as northern/eastern coordinates.
+    """
+    lat, lon = photo.get('lat'), photo.get('lon')
+    if lat is None or lon is None:
+        return None, None
+    lat, lon = dms_to_degrees(lat), dms_to_degrees(lon)
+    if lat is None or lon is None:
+        return None, None
+    return lat, lon
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def geohash_encode(lat, lon, precision=PHOTO_GEOHASH_PRECISION):
+    """Geohash string of a point"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value, interval = (lon, lon_range) if even else (lat, lat_range)
+        mid = (interval[0] + interval[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def geohash_bounds(geohash):
+    """(min_lat, min_lon, max_lat, max_lon) of a geohash cell"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            interval = lon_range if even else lat_range
+            mid = (interval[0] + interval[1]) / 2
+            if (value >> shift) & 1:
+                interval[0] = mid
+            else:
+                interval[1] = mid
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def geohash_center(geohash):
+    """(lat, lon) of a geohash cell's centre"""
+    min_lat, min_lon, max_lat, max_lon = geohash_bounds(geohash)
+    return (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+
+
+def cell_size_m(precision, lat=0.0):
+    """Approximate (height, width) in metres of a geohash cell at `lat`"""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = math.floor(precision * 5 / 2)
+    height = 180.0 / (1 << lat_bits) * 111320
+    width = 360.0 / (1 << lon_bits) * 111320 * math.cos(math.radians(lat))
+    return height, width
+
+
+def apiary_key(lat, lon):
+    """Apiary-sized cell (~150 m) used to group photos and inspections by location"""
+    if lat is None or lon is None:
+        return None
+    return geohash_encode(lat, lon, APIARY_PRECISION)
+
+
+def weather_bucket(lat, lon):
+    """
+    Shared coordinates for weather lookups.
+
+    Returns:
+        tuple: (cell key, centre latitude, centre longitude); photos in the same
+               ~5 km cell reuse one weather lookup
+    """
+    key = geohash_encode(lat, lon, WEATHER_PRECISION)
+    center_lat, center_lon = geohash_center(key)
+    return key, round(center_lat, 4), round(center_lon, 4)
+
+
+class SpatialIndex:
+    """
+    Photos keyed by geohash for radius and per-cell queries.
+
+    Geohashes are kept sorted, so every cell (any precision) is one
+    contiguous prefix range found by binary search rather than a scan of
+    all records.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = []  # sorted (geohash, key, lat, lon)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, key, lat, lon):
+        with self._lock:
+            bisect.insort(self._entries, (geohash_encode(lat, lon), key, lat, lon))
+
+    def _prefix_range(self, prefix):
+        lo = bisect.bisect_left(self._entries, (prefix,))
+        hi = bisect.bisect_left(self._entries, (prefix + "~",))
+        return self._entries[lo:hi]
+
+    def in_cell(self, cell):
+        """Keys of all photos inside a geohash cell"""
+        with self._lock:
+            return [entry[1] for entry in self._prefix_range(cell)]
+
+    def within(self, lat, lon, radius_m):
+        """
+        Photos within `radius_m` metres of a point.
+
+        Returns:
+            list: (distance in metres, key) pairs, nearest first
+        """
+        # Coarsest precision whose cells are still at least the radius across
+        precision = PHOTO_GEOHASH_PRECISION
+        while precision > 1 and min(cell_size_m(precision, lat)) < radius_m:
+            precision -= 1
+
+        # The point's cell and its neighbours cover the whole search circle
+        height, width = cell_size_m(precision, lat)
+        dlat = height / 111320
+        dlon = width / (111320 * max(math.cos(math.radians(lat)), 1e-6))
+        cells = {
+            geohash_encode(max(-90.0, min(90.0, lat + i * dlat)), ((lon + j * dlon + 180) % 360) - 180, precision)
+            for i in (-1, 0, 1)
+            for j in (-1, 0, 1)
+        }
+
+        matches = []
+        with self._lock:
+            for cell in cells:
+                for _, key, other_lat, other_lon in self._prefix_range(cell):
+                    distance = haversine_m(lat, lon, other_lat, other_lon)
+                    if distance <= radius_m:
+                        matches.append((distance, key))
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+    def group_by_cell(self, precision=APIARY_PRECISION):
+        """{geohash cell: [keys]} for every occupied cell (e.g. per-apiary photos)"""
+        groups = {}
+        with self._lock:
+            for geohash, key, _, _ in self._entries:
+                groups.setdefault(geohash[:precision], []).append(key)
+        return groups
+
+
+def build_photo_index(inspections):
+    """SpatialIndex of all geotagged photos, keyed by (inspection index, photo index)"""
+    index = SpatialIndex()
+    for i, inspection in enumerate(inspections or []):
+        for j, photo in enumerate(inspection.get('photos', [])):
+            lat, lon = photo_coordinates(photo)
+            if lat is not None:
+                index.add((i, j), lat, lon)
+    return index
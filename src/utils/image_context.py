@@ -0,0 +1,228 @@
+# src/utils/image_context.py
+import io
+import math
+import mmap
+import os
+import numpy as np
+from PIL import ExifTags
+from src.utils.exif_reader import read_image_header
+from src.utils.large_image import PixelCeilingExceeded, exceeds_ceiling, open_large, scan_large_image
+
+# Approximate pixel count of the downsampled image used by analysis stages
+ANALYSIS_PIXEL_BUDGET = 640 * 480
+
+# DCT scale factors libjpeg can decode at directly, largest first
+DRAFT_SCALES = (8, 4, 2)
+
+# EXIF sub-IFD pointers
+EXIF_IFD_POINTER = 0x8769
+GPS_IFD_POINTER = 0x8825
+
+
+def read_exif_tags(img):
+    """
+    Read EXIF tags from a PIL Image into a dict keyed by readable tag names.
+
+    Tags from the Exif sub-IFD are merged in and GPS tags are kept as a nested
+    dict under "GPSInfo", the same layout PIL's legacy `_getexif()` returns.
+    """
+    exif_data = {}
+    try:
+        exif = img.getexif()
+        tags = dict(exif)
+        tags.update(exif.get_ifd(EXIF_IFD_POINTER))
+        gps_info = exif.get_ifd(GPS_IFD_POINTER)
+        if gps_info:
+            tags[GPS_IFD_POINTER] = dict(gps_info)
+
+        for tag, value in tags.items():
+            if tag == EXIF_IFD_POINTER:
+                continue
+            exif_data[ExifTags.TAGS.get(tag, tag)] = value
+    except Exception:
+        pass
+
+    return exif_data
+
+
+def choose_draft_scale(size, pixel_budget=ANALYSIS_PIXEL_BUDGET):
+    """Largest JPEG draft scale (1, 2, 4 or 8) that still leaves at least `pixel_budget` pixels"""
+    width, height = size
+    for scale in DRAFT_SCALES:
+        if (width // scale) * (height // scale) >= pixel_budget:
+            return scale
+    return 1
+
+
+class ImageContext:
+    """
+    One uploaded photo, shared by every ingest stage.
+
+    Holds the raw bytes (or a stored file, memory-mapped on demand) and lazily
+    derives the decoded image, the parsed EXIF and a downsampled analysis
+    image, so each of them is computed only once.
+    """
+
+    def __init__(self, data=None, filename=None, analysis_pixel_budget=ANALYSIS_PIXEL_BUDGET, path=None):
+        self._data = data
+        self.path = path
+        self._mmap = None
+        self.filename = filename
+        self.analysis_pixel_budget = analysis_pixel_budget
+        self.analysis_scale = None
+        # Palette histogram gathered while scanning an image too large to decode whole
+        self.color_histogram = None
+        self._image = None
+        self._header = None
+        self._exif = None
+        self._analysis_image = None
+        self._analysis_array = None
+
+    @classmethod
+    def from_file(cls, image_file, filename=None):
+        """Build a context from bytes, a file-like object or a path"""
+        if isinstance(image_file, (bytes, bytearray, memoryview)):
+            return cls(bytes(image_file), filename)
+
+        if isinstance(image_file, str):
+            with open(image_file, 'rb') as f:
+                return cls(f.read(), filename)
+
+        if hasattr(image_file, 'seek'):
+            image_file.seek(0)
+        if hasattr(image_file, 'getvalue'):
+            return cls(image_file.getvalue(), filename)
+        return cls(image_file.read(), filename)
+
+    @classmethod
+    def from_path(cls, path, filename=None):
+        """Build a context backed by a file on disk (nothing is read up front)"""
+        return cls(filename=filename or os.path.basename(path), path=path)
+
+    @property
+    def data(self):
+        """Raw bytes, or a read-only mmap of the backing file"""
+        if self._data is None and self.path:
+            with open(self.path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    self._data = b""
+                else:
+                    self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    self._data = self._mmap
+        return self._data
+
+    def _open(self):
+        """
+        Open a fresh PIL decoder on the file or bytes.
+
+        PIL's decompression-bomb limit is raised to MAX_IMAGE_PIXELS (see
+        open_large): nothing here decodes the full frame of an image over
+        the pixel ceiling.
+        """
+        return open_large(self.path or io.BytesIO(self.data))
+
+    @property
+    def image(self):
+        """PIL Image opened from the raw bytes (pixels are decoded on first use)"""
+        if self._image is None:
+            self._image = self._open()
+        return self._image
+
+    @property
+    def header(self):
+        """Header-only metadata (format, size, EXIF) or None for unsupported formats"""
+        if self._header is None:
+            self._header = read_image_header(self.path or self.data) or {}
+        return self._header or None
+
+    @property
+    def size(self):
+        """(width, height) from the image header"""
+        if self.header:
+            return self.header['width'], self.header['height']
+        return self.image.size
+
+    @property
+    def size_bytes(self):
+        if self.path:
+            return os.path.getsize(self.path)
+        return len(self.data)
+
+    @property
+    def exif(self):
+        """EXIF tags keyed by readable name, parsed once"""
+        if self._exif is None:
+            # Fall back to PIL for formats the header reader does not handle
+            self._exif = self.header['exif'] if self.header else read_exif_tags(self.image)
+        return self._exif
+
+    @property
+    def analysis_image(self):
+        """
+        RGB image downsampled to roughly `analysis_pixel_budget` pixels.
+
+        JPEGs are decoded in draft mode, so libjpeg's DCT scaling produces the
+        1/2, 1/4 or 1/8 scale image directly and the full-resolution frame is
+        never materialized. Other formats are decoded and box-reduced, except
+        above the pixel ceiling, where PNGs are scanned in strips and anything
+        else raises PixelCeilingExceeded.
+        """
+        if self._analysis_image is None:
+            large = exceeds_ceiling(self.size)
+
+            # Separate decoder, so draft mode never affects `self.image`
+            img = self._open()
+            full_width, full_height = img.size
+
+            if img.format == 'JPEG':
+                scale = choose_draft_scale(img.size, self.analysis_pixel_budget)
+                if scale > 1:
+                    img.draft('RGB', (full_width // scale, full_height // scale))
+                if large and exceeds_ceiling(img.size):
+                    raise PixelCeilingExceeded(f"{full_width}x{full_height} JPEG is too large even at 1/8 scale")
+            elif large:
+                # Never decoded whole: streamed in strips into the analysis image and palette histogram
+                if img.format != 'PNG':
+                    raise PixelCeilingExceeded(f"{img.format} images over the pixel ceiling are not supported")
+                img.close()
+                self._analysis_image, self.color_histogram, self.analysis_scale = scan_large_image(
+                    self.path or io.BytesIO(self.data), self.analysis_pixel_budget)
+                return self._analysis_image
+
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+
+            # Finish with a box reduce if the draft decode is still over budget
+            width, height = img.size
+            factor = int(math.floor(math.sqrt(width * height / self.analysis_pixel_budget)))
+            if factor > 1:
+                img = img.reduce(factor)
+
+            self.analysis_scale = full_width / img.size[0]
+            self._analysis_image = img
+        return self._analysis_image
+
+    @property
+    def analysis_array(self):
+        """The analysis image as an (H, W, 3) uint8 array"""
+        if self._analysis_array is None:
+            self._analysis_array = np.asarray(self.analysis_image)
+        return self._analysis_array
+
+    def save(self, file_path):
+        """Write the original bytes to disk unchanged"""
+        with open(file_path, 'wb') as f:
+            f.write(self.data)
+        return file_path
+
+    def close(self):
+        """Release the decoded image"""
+        if self._image is not None:
+            self._image.close()
+        self._image = None
+        self._analysis_image = None
+        self._analysis_array = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+            self._data = None
@@ -0,0 +1,233 @@
+# src/utils/ingest.py
+# --------------------------------------------------------------------------
+# Session-independent ingest pipeline: store the original in the blob store,
+# then run the stage pipeline (src/utils/stages.py) to build a photo record.
+# Used by the Streamlit upload flow and by command-line tools.
+# --------------------------------------------------------------------------
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.utils.blob_store import get_blob_store
+from src.utils.image_context import ImageContext
+from src.utils.stages import apply_updates, run_stages
+from src.utils.url_cache import get_url_cache, normalize_url
+from src.utils.url_fetcher import download_to_store
+
+
+def analyze_photo(ctx, file_path, content_hash, store=None):
+    """
+    Build the photo record for an image by running it through the stage pipeline.
+
+    Near-duplicates of an already analyzed photo (found by perceptual hash)
+    copy its pixel-derived fields instead of recomputing them, and the
+    grid/preview thumbnails are rendered alongside the analysis.
+
+    Parameters:
+        ctx (ImageContext): Context for the stored image
+        file_path (str): Path of the stored original
+        content_hash (str): SHA-256 digest of the original
+        store (BlobStore): Blob store holding the analyzed records
+
+    Returns:
+        dict: Photo record, with per-stage timings under 'stage_timings'
+    """
+    photo_data = {
+        'filename': ctx.filename,
+        'file_path': file_path,
+        'content_hash': content_hash
+    }
+    return apply_updates(photo_data, run_stages(ctx, photo_data, store=store))
+
+
+def reuse_record(cached_photo, filename, file_path):
+    """Copy of a cached photo record carrying this upload's filename and stored path"""
+    photo_data = dict(cached_photo)
+    photo_data['filename'] = filename
+    photo_data['file_path'] = file_path
+    return photo_data
+
+
+def ingest_file(source, filename, store=None):
+    """
+    Store an image and analyze it, reusing the cached analysis for known content.
+
+    Parameters:
+        source: Bytes, binary file-like object or path
+        filename (str): Original filename
+        store (BlobStore): Blob store to use (defaults to the process-wide one)
+
+    Returns:
+        tuple: (photo record, cached) where cached is True if no analysis ran
+    """
+    store = store or get_blob_store()
+
+    # Stream the upload to the blob store in fixed-size chunks, hashing as it is written
+    content_hash, file_path, created, _ = store.put_file(source, filename)
+
+    return ingest_stored(content_hash, file_path, created, filename, store)
+
+
+def ingest_stored(content_hash, file_path, created, filename, store=None):
+    """
+    Analyze a photo already written to the blob store (the second half of ingest_file).
+
+    Parameters:
+        content_hash (str): Digest returned by put_file/put_chunks
+        file_path (str): Stored blob path
+        created (bool): False if the blob was already in the store
+        filename (str): Original filename
+        store (BlobStore): Blob store to use (defaults to the process-wide one)
+
+    Returns:
+        tuple: (photo record, cached) where cached is True if no analysis ran
+    """
+    store = store or get_blob_store()
+
+    # Already known photo: reuse the cached analysis instead of recomputing it
+    if not created:
+        cached_photo = store.get_record(content_hash)
+        if cached_photo:
+            return reuse_record(cached_photo, filename, file_path), True
+
+    # Every stage below reopens the stored file, decoding it at most once
+    ctx = ImageContext.from_path(file_path, filename)
+    try:
+        photo_data = analyze_photo(ctx, file_path, content_hash, store)
+    finally:
+        ctx.close()
+
+    # Cache the analysis so a re-upload of the same bytes can skip it
+    store.set_record(content_hash, photo_data)
+    return photo_data, False
+
+
+def url_to_filename(url):
+    """Extract a filename from a URL"""
+    filename = url.split('/')[-1]
+    if '?' in filename:
+        filename = filename.split('?')[0]
+    if not filename:
+        filename = "image_from_url.jpg"
+    return filename
+
+
+def revalidate_url(url, entry, store=None, cache=None):
+    """
+    Conditional GET for a stale cache entry.
+
+    Returns:
+        tuple: (content hash, stored path, hit) where hit is True on a 304
+    """
+    cache = cache or get_url_cache()
+    result = download_to_store(url, url_to_filename(url), store, validators=entry)
+    if result['not_modified']:
+        cache.mark_revalidated(url)
+        return entry['digest'], entry['path'], True
+
+    cache.put(url, result['digest'], result['path'], result['size'], result['etag'], result['last_modified'])
+    return result['digest'], result['path'], False
+
+
+# Background revalidations for stale-while-revalidate, one per URL at a time
+_revalidation_executor = None
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+
+def _get_revalidation_executor():
+    """Revalidation pool, created on first use so importing this module starts no threads"""
+    global _revalidation_executor
+    with _revalidating_lock:
+        if _revalidation_executor is None:
+            _revalidation_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="revalidate")
+        return _revalidation_executor
+
+
+def _revalidate_in_background(url, entry, store, cache):
+    key = normalize_url(url)
+    with _revalidating_lock:
+        if key in _revalidating:
+            return
+        _revalidating.add(key)
+
+    def run():
+        try:
+            content_hash, file_path, not_modified = revalidate_url(url, entry, store, cache)
+            if not not_modified:
+                # Changed upstream: analyze the new bytes now so the next request is instant
+                ingest_stored(content_hash, file_path, False, url_to_filename(url), store)
+        except Exception:
+            # Keep serving the stale copy; the next request retries
+            pass
+        finally:
+            with _revalidating_lock:
+                _revalidating.discard(key)
+
+    _get_revalidation_executor().submit(run)
+
+
+def fetch_url_cached(url, store=None, cache=None, stale_while_revalidate=False):
+    """
+    Stored copy of a URL's image, downloading it only when the cache cannot answer.
+
+    Fresh entries are used as they are. Stale entries are revalidated with a
+    conditional GET, so unchanged images are not downloaded again; with
+    stale_while_revalidate=True the stale copy is returned at once and the
+    revalidation runs in the background.
+
+    Returns:
+        tuple: (content hash, stored path, hit) where hit is True if nothing was downloaded
+    """
+    cache = cache or get_url_cache()
+    entry = cache.lookup(url, include_stale=True)
+    if entry and not entry['stale']:
+        return entry['digest'], entry['path'], True
+
+    if entry:
+        if stale_while_revalidate:
+            _revalidate_in_background(url, entry, store, cache)
+            return entry['digest'], entry['path'], True
+        return revalidate_url(url, entry, store, cache)
+
+    result = download_to_store(url, url_to_filename(url), store)
+    cache.put(url, result['digest'], result['path'], result['size'], result['etag'], result['last_modified'])
+    return result['digest'], result['path'], False
+
+
+def ingest_url(url, store=None, stale_while_revalidate=False):
+    """Download (or reuse the cached download of) an image and ingest it; returns (photo record, cached)"""
+    store = store or get_blob_store()
+    content_hash, file_path, _ = fetch_url_cached(url, store, stale_while_revalidate=stale_while_revalidate)
+
+    # Unchanged bytes: reuse the stored analysis without re-hashing the file
+    filename = url_to_filename(url)
+    cached_photo = store.get_record(content_hash)
+    if cached_photo:
+        return reuse_record(cached_photo, filename, file_path), True
+    # Already in the blob store: analyze it in place rather than storing it again
+    return ingest_stored(content_hash, file_path, False, filename, store)
+
+
+def cached_url_photo(url, store=None):
+    """
+    Photo record for a URL answered entirely from the caches (no network on the caller's thread).
+
+    Stale entries are returned immediately and revalidated in the background.
+
+    Returns:
+        dict: Photo record, or None if the URL has not been downloaded and analyzed yet
+    """
+    store = store or get_blob_store()
+    cache = get_url_cache()
+    # Only counted in the cache statistics if it answers the request
+    entry = cache.lookup(url, include_stale=True, count=False)
+    if not entry:
+        return None
+
+    cached_photo = store.get_record(entry['digest'])
+    if not cached_photo:
+        return None
+
+    cache.count_hit(entry['stale'])
+    if entry['stale']:
+        _revalidate_in_background(url, entry, store, cache)
+    return reuse_record(cached_photo, url_to_filename(url), entry['path'])
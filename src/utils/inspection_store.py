@@ -0,0 +1,657 @@
+# src/utils/inspection_store.py
+# --------------------------------------------------------------------------
+# Session-independent inspection storage. These functions work on a plain
+# list of inspection dicts so they can be used from Streamlit pages (through
+# src/utils/data_handler.py) and from command-line tools alike.
+#
+# Storage is a snapshot (inspections.json) plus an append-only journal of
+# change records (inspections.journal.jsonl): adding or updating a photo,
+# updating a field or deleting an inspection appends one line instead of rewriting
+# the whole library. Reading replays the journal tail onto the snapshot;
+# compaction folds the journal into a new snapshot. Every record carries a
+# sequence number and the snapshot remembers the last one it includes, so
+# a crash between writing the snapshot and truncating the journal cannot
+# apply a change twice.
+#
+# Appends, reads and compaction hold a lock file (inspections.lock), so
+# the app and the command-line tools can write the same store. A snapshot
+# is always rebuilt from the stored state; a caller's list is merged into
+# it, never written over it.
+#
+# The Streamlit sessions use a write-behind store (see
+# src/utils/persistence.py): changes land in the session's list at once
+# and are written out from a background thread, coalesced over a short
+# window. Command-line tools write synchronously.
+# --------------------------------------------------------------------------
+import json
+import os
+import time
+from datetime import datetime
+from src.utils.blob_store import get_blob_store
+from src.utils.geo import apiary_key, photo_coordinates
+from src.utils.persistence import atomic_write_text, file_lock, flush_write_behind, get_write_behind
+from src.utils.thumbnail_cache import get_thumbnail_cache
+
+DATA_DIR = "data"
+INSPECTIONS_FILE = os.path.join(DATA_DIR, "inspections.json")
+
+
+# The journal is compacted into a new snapshot once it grows past this size
+JOURNAL_COMPACT_BYTES = 4 * 1024 * 1024
+
+# Change record types
+ADD_PHOTO = "add_photo"
+UPDATE_FIELD = "update_field"
+DELETE_INSPECTION = "delete_inspection"
+UPDATE_PHOTO = "update_photo"
+
+_last_seq = 0
+
+
+def journal_path(data_file=INSPECTIONS_FILE):
+    """Journal file that belongs to a snapshot file"""
+    return os.path.splitext(data_file)[0] + ".journal.jsonl"
+
+
+def _next_seq():
+    """Increasing sequence number (nanosecond clock, so it also orders across processes)"""
+    global _last_seq
+    _last_seq = max(_last_seq + 1, time.time_ns())
+    return _last_seq
+
+
+def _serialize_photo(photo):
+    return {k: v for k, v in photo.items() if k != 'data'}
+
+
+def _serialize_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def serialize_inspection(inspection):
+    """JSON-ready copy of one inspection"""
+    # Create a serializable copy
+    insp_copy = inspection.copy()
+
+    # Process photos to remove non-serializable data
+    if "photos" in insp_copy:
+        insp_copy["photos"] = [_serialize_photo(photo) for photo in insp_copy["photos"]]
+
+    # Handle datetime objects
+    if "date" in insp_copy:
+        insp_copy["date"] = _serialize_value(insp_copy["date"])
+
+    return insp_copy
+
+
+def serialize_inspections(inspections):
+    """Build the JSON-ready save document for a list of inspections"""
+    return {
+        "inspections": [serialize_inspection(inspection) for inspection in inspections or []],
+        "last_save": datetime.now().isoformat()
+    }
+
+
+def lock_path(data_file=INSPECTIONS_FILE):
+    """Lock file that serializes writers of a snapshot and its journal"""
+    return os.path.splitext(data_file)[0] + ".lock"
+
+
+def journal_lock(data_file=INSPECTIONS_FILE):
+    """Lock held while reading, appending to or compacting a snapshot and its journal (across processes)"""
+    return file_lock(lock_path(data_file))
+
+
+def _photo_key(photo):
+    return photo.get('content_hash') or photo.get('file_path') or photo.get('filename')
+
+
+def merge_inspections(stored, inspections):
+    """
+    Merge serialized inspections into a stored list in place.
+
+    An inspection replaces the header fields of the stored one for the same
+    day, and its photos replace the stored photos they match (by content
+    hash, or file path for legacy photos). Stored inspections and photos
+    missing from `inspections` are kept; removing them takes a deletion.
+    """
+    for inspection in inspections:
+        target = _find_target(stored, None, inspection_date_key(inspection.get('date')))
+        if target is None:
+            stored.append(inspection)
+            continue
+        current = stored[target]
+        photos = list(current.get('photos', []))
+        positions = {_photo_key(photo): k for k, photo in enumerate(photos)}
+        for photo in inspection.get('photos', []):
+            k = positions.get(_photo_key(photo))
+            if k is None:
+                photos.append(photo)
+            else:
+                photos[k] = photo
+        current.update(inspection)
+        current['photos'] = photos
+        current['photo_count'] = len(photos)
+
+
+def write_snapshot(data_file=INSPECTIONS_FILE, inspections=None):
+    """
+    Write a new snapshot of the stored inspections and empty the journal.
+
+    The snapshot is rebuilt from the stored state (snapshot plus journal,
+    read under the lock), so changes other writers appended are kept.
+    `inspections` (serialized) are merged in with merge_inspections.
+    """
+    with journal_lock(data_file):
+        stored, journal_seq = read_stored_inspections(data_file)
+        stored = stored or []
+        if inspections:
+            merge_inspections(stored, inspections)
+        save_data = {"inspections": stored, "last_save": datetime.now().isoformat(), "journal_seq": journal_seq}
+        atomic_write_text(data_file, json.dumps(save_data, indent=2))
+        # Every record was read under the lock; a crash before this point leaves records journal_seq covers
+        path = journal_path(data_file)
+        if os.path.exists(path):
+            open(path, "w").close()
+
+
+def write_inspections_file(inspections, data_file=INSPECTIONS_FILE):
+    """Merge inspections into the stored ones and write them as a new snapshot"""
+    write_snapshot(data_file, serialize_inspections(inspections)["inspections"])
+
+
+def append_changes(records, data_file=INSPECTIONS_FILE):
+    """
+    Append change records to the journal in one write.
+
+    Each photo the records add takes a reference on its blob once the
+    records are written. A photo another writer already stored is skipped
+    when the journal is replayed, so it takes none.
+
+    Returns:
+        int: Journal size in bytes after the append
+    """
+    os.makedirs(os.path.dirname(data_file) or ".", exist_ok=True)
+    with journal_lock(data_file):
+        added_hashes = _added_photo_hashes(records, data_file)
+        lines = "".join(json.dumps(dict(record, seq=_next_seq())) + "\n" for record in records)
+        with open(journal_path(data_file), "ab+") as f:
+            # Terminate a torn final line left by a crash, so it cannot swallow this record
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    lines = "\n" + lines
+            f.write(lines.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        for content_hash in added_hashes:
+            get_blob_store().incref(content_hash)
+        return size
+
+
+def _added_photo_hashes(records, data_file):
+    """Content hashes of the photos `records` add to the stored inspections (caller holds the lock)"""
+    if not any(record.get("op") == ADD_PHOTO and record["photo"].get('content_hash') for record in records):
+        return []
+
+    # Replay the records on the stored state, as a later load will
+    inspections, _ = read_stored_inspections(data_file)
+    inspections = inspections or []
+    added = []
+    for record in records:
+        content_hash = record["photo"].get('content_hash') if record.get("op") == ADD_PHOTO else None
+        if content_hash and find_photo_by_hash(inspections, content_hash):
+            content_hash = None
+        apply_change(inspections, record)
+        if content_hash:
+            added.append(content_hash)
+    return added
+
+
+def journal_size(data_file=INSPECTIONS_FILE):
+    """Journal size in bytes (0 if there is none)"""
+    path = journal_path(data_file)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def compact_if_needed(data_file=INSPECTIONS_FILE, size=None, limit=JOURNAL_COMPACT_BYTES):
+    """Fold the journal into a new snapshot if it has grown past `limit` bytes; returns True if it did"""
+    if size is None:
+        size = journal_size(data_file)
+    if size <= limit:
+        return False
+    write_snapshot(data_file)
+    return True
+
+
+def _find_target(inspections, index, date_key):
+    """
+    Index of the inspection a record refers to.
+
+    Records name both the list index and the inspection's date key, so a
+    record written by another writer against a slightly different list
+    still lands on the right inspection.
+    """
+    if index is not None and index < len(inspections):
+        if date_key is None or inspection_date_key(inspections[index].get('date')) == date_key:
+            return index
+    for i, inspection in enumerate(inspections):
+        if date_key is not None and inspection_date_key(inspection.get('date')) == date_key:
+            return i
+    return None
+
+
+def apply_change(inspections, record):
+    """Apply one journal record to a list of (serialized) inspections"""
+    op = record.get("op")
+    target = _find_target(inspections, record.get("index"), record.get("date_key"))
+
+    if op == ADD_PHOTO:
+        photo = record["photo"]
+        # Already applied (e.g. the photo was also published in a batch)
+        if photo.get('content_hash') and find_photo_by_hash(inspections, photo['content_hash']):
+            return
+        if target is None:
+            inspections.append(dict(record["inspection"], photos=[photo], photo_count=1))
+        else:
+            inspection = inspections[target]
+            inspection.setdefault('photos', []).append(photo)
+            inspection['photo_count'] = len(inspection['photos'])
+    elif op == UPDATE_FIELD:
+        if target is not None:
+            inspections[target][record["field"]] = record["value"]
+    elif op == DELETE_INSPECTION:
+        if target is not None:
+            del inspections[target]
+    elif op == UPDATE_PHOTO:
+        if target is not None:
+            photo = record["photo"]
+            photos = inspections[target].get('photos', [])
+            for k, stored in enumerate(photos):
+                if _photo_key(stored) == _photo_key(photo):
+                    photos[k] = photo
+                    break
+
+
+def replay_journal(inspections, data_file=INSPECTIONS_FILE, after_seq=0):
+    """
+    Apply the journal records newer than `after_seq` to `inspections` in place.
+
+    Returns:
+        tuple: (number of records applied, sequence number of the last one or `after_seq`)
+    """
+    path = journal_path(data_file)
+    if not os.path.exists(path):
+        return 0, after_seq
+
+    applied = 0
+    last_seq = after_seq
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Torn final line from a crash mid-append
+                continue
+            if record.get("seq", 0) <= after_seq:
+                continue
+            apply_change(inspections, record)
+            applied += 1
+            last_seq = max(last_seq, record.get("seq", 0))
+    return applied, last_seq
+
+
+def read_stored_inspections(data_file=INSPECTIONS_FILE):
+    """
+    Stored inspections (serialized, as on disk): the snapshot plus the journal tail, read under the lock.
+
+    Returns:
+        tuple: (inspections list or None if there is no saved data,
+                sequence number of the last journal record included)
+    """
+    with journal_lock(data_file):
+        data = {}
+        if os.path.exists(data_file):
+            with open(data_file, "r") as f:
+                data = json.load(f)
+
+        journal_seq = data.get("journal_seq", 0)
+        inspections = data.get("inspections")
+        if inspections is None:
+            inspections = []
+            applied, journal_seq = replay_journal(inspections, data_file, journal_seq)
+            if not applied:
+                return None, journal_seq
+        else:
+            _, journal_seq = replay_journal(inspections, data_file, journal_seq)
+    return inspections, journal_seq
+
+
+def read_inspections_file(data_file=INSPECTIONS_FILE):
+    """
+    Read inspections from the snapshot plus the journal tail.
+
+    Returns:
+        tuple: (inspections list or None if there is no saved data,
+                list of photos whose files are missing)
+    """
+    inspections, _ = read_stored_inspections(data_file)
+    if inspections is None:
+        return None, []
+
+    loaded_inspections = []
+    missing_photos = []
+
+    for inspection in inspections:
+        # Convert date strings back to datetime objects
+        if "date" in inspection and isinstance(inspection["date"], str):
+            try:
+                inspection["date"] = datetime.fromisoformat(inspection["date"])
+            except ValueError:
+                # Keep as string if parsing fails
+                pass
+
+        # Keep only photos whose files still exist
+        if "photos" in inspection:
+            valid_photos = []
+            for photo in inspection["photos"]:
+                if "file_path" in photo and os.path.exists(photo["file_path"]):
+                    valid_photos.append(photo)
+                else:
+                    missing_photos.append(photo)
+
+            inspection["photos"] = valid_photos
+            inspection["photo_count"] = len(valid_photos)
+
+        loaded_inspections.append(inspection)
+
+    return loaded_inspections, missing_photos
+
+
+def inspection_date_key(date_value):
+    """Normalize an inspection or photo date to a "YYYY-MM-DD" grouping key"""
+    if isinstance(date_value, datetime):
+        return date_value.strftime("%Y-%m-%d")
+    if isinstance(date_value, str):
+        try:
+            return datetime.strptime(date_value, "%Y:%m:%d %H:%M:%S").strftime("%Y-%m-%d")
+        except ValueError:
+            try:
+                # Try ISO format
+                return datetime.fromisoformat(date_value).strftime("%Y-%m-%d")
+            except ValueError:
+                # Keep as is if parsing fails
+                return date_value
+    return None
+
+
+def find_photo_by_hash(inspections, content_hash):
+    """Find a photo by content hash; returns (inspection index, photo index) or None"""
+    for i, inspection in enumerate(inspections):
+        for j, photo in enumerate(inspection.get('photos', [])):
+            if photo.get('content_hash') == content_hash:
+                return i, j
+    return None
+
+
+def format_location(photo_data):
+    """Human-readable location for a new inspection created from a photo"""
+    lat, lon = photo_coordinates(photo_data)
+    if lat is None:
+        return "Unknown"
+    return f"{lat:.6f}, {lon:.6f}"
+
+
+def photo_date_key(photo_data):
+    """Day ("YYYY-MM-DD") a photo is grouped under: the day it was taken, or today if undated"""
+    if photo_data.get("date_taken") and photo_data["date_taken"] != "Unknown":
+        try:
+            return datetime.strptime(photo_data["date_taken"], "%Y:%m:%d %H:%M:%S").strftime("%Y-%m-%d")
+        except (TypeError, ValueError):
+            pass
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def new_inspection(photo_data, date_str):
+    """Header fields of the inspection created for a photo on a day without one"""
+    return {
+        'date': datetime.strptime(date_str, "%Y-%m-%d"),
+        'location': format_location(photo_data),
+        'apiary': apiary_key(*photo_coordinates(photo_data)),
+        'weather_summary': "Not recorded"
+    }
+
+
+def add_photo(inspections, photo_data):
+    """
+    Add a photo to the inspection on the same day, creating one if needed.
+
+    Photos whose content hash is already recorded are not added again. The
+    blob reference is taken when the addition is journaled (append_changes).
+
+    Returns:
+        tuple: (inspection index, added) where added is False for duplicates
+    """
+    content_hash = photo_data.get('content_hash')
+    if content_hash:
+        existing = find_photo_by_hash(inspections, content_hash)
+        if existing:
+            return existing[0], False
+
+    date_str = photo_date_key(photo_data)
+
+    index = None
+    for i, inspection in enumerate(inspections):
+        if inspection_date_key(inspection.get('date')) == date_str:
+            inspection.setdefault('photos', []).append(photo_data)
+            inspection['photo_count'] = len(inspection['photos'])
+            index = i
+            break
+
+    if index is None:
+        inspections.append(dict(new_inspection(photo_data, date_str), photos=[photo_data], photo_count=1))
+        index = len(inspections) - 1
+
+    return index, True
+
+
+def add_photo_records(inspections, photos):
+    """
+    Add photos (see add_photo) and build their journal records.
+
+    Returns:
+        tuple: (inspection index of the last photo or None, records of the photos added)
+    """
+    records = []
+    index = None
+    for photo_data in photos:
+        index, added = add_photo(inspections, photo_data)
+        if not added:
+            continue
+        inspection = inspections[index]
+        records.append({
+            "op": ADD_PHOTO,
+            "index": index,
+            "date_key": inspection_date_key(inspection.get('date')),
+            "photo": _serialize_photo(photo_data),
+            # Header used when replaying creates the inspection
+            "inspection": serialize_inspection(
+                {k: v for k, v in inspection.items() if k not in ('photos', 'photo_count')}
+            ),
+        })
+    return index, records
+
+
+def update_field_record(inspections, index, field, value):
+    """Set one inspection field; returns its journal record"""
+    date_key = inspection_date_key(inspections[index].get('date'))
+    inspections[index][field] = value
+    return {
+        "op": UPDATE_FIELD, "index": index, "date_key": date_key,
+        "field": field, "value": _serialize_value(value),
+    }
+
+
+def update_photo_records(inspections, changed):
+    """Journal records for photos updated in place; `changed` is a list of (inspection index, photo)"""
+    return [{
+        "op": UPDATE_PHOTO, "index": index,
+        "date_key": inspection_date_key(inspections[index].get('date')),
+        "photo": _serialize_photo(photo),
+    } for index, photo in changed]
+
+
+def delete_inspection_record(inspections, index):
+    """Remove an inspection (releasing its photos); returns its journal record"""
+    inspection = inspections.pop(index)
+    release_inspection_photos(inspection)
+    return {
+        "op": DELETE_INSPECTION, "index": index,
+        "date_key": inspection_date_key(inspection.get('date')),
+    }
+
+
+def add_photos_logged(inspections, photos, data_file=INSPECTIONS_FILE):
+    """
+    Add photos (see add_photo) and journal the additions with a single append.
+
+    Returns:
+        tuple: (inspection index of the last photo or None, number of photos added)
+    """
+    index, records = add_photo_records(inspections, photos)
+    if records:
+        compact_if_needed(data_file, append_changes(records, data_file))
+    return index, len(records)
+
+
+def update_field_logged(inspections, index, field, value, data_file=INSPECTIONS_FILE):
+    """Set one inspection field and journal the change"""
+    size = append_changes([update_field_record(inspections, index, field, value)], data_file)
+    compact_if_needed(data_file, size)
+
+
+def delete_inspection_logged(inspections, index, data_file=INSPECTIONS_FILE):
+    """Remove an inspection (releasing its photos) and journal the deletion"""
+    size = append_changes([delete_inspection_record(inspections, index)], data_file)
+    compact_if_needed(data_file, size)
+
+
+def release_inspection_photos(inspection):
+    """Drop blob references (or delete legacy upload files) for an inspection's photos"""
+    for photo in inspection.get('photos', []):
+        if photo.get('content_hash'):
+            # Shared blob: only removed once no photo record references it
+            if get_blob_store().decref(photo['content_hash']) == 0:
+                get_thumbnail_cache().discard(photo['content_hash'])
+        elif 'file_path' in photo and os.path.exists(photo['file_path']):
+            try:
+                os.remove(photo['file_path'])
+            except OSError:
+                pass
+
+
+class JsonInspectionStore:
+    """
+    Inspection storage in the JSON snapshot and change journal.
+
+    Methods mirror SQLiteInspectionStore (src/utils/sqlite_store.py): the
+    ones taking `inspections` update that in-memory list and persist the change.
+    With a `writer` (WriteBehindWriter), changes are queued on it and written
+    from its background thread instead of before returning.
+    """
+
+    backend = "json"
+
+    def __init__(self, data_file=INSPECTIONS_FILE, writer=None):
+        self.data_file = data_file
+        self.writer = writer
+
+    def exists(self):
+        return os.path.exists(self.data_file) or os.path.exists(journal_path(self.data_file))
+
+    def load(self):
+        """Returns (inspections or None if nothing is saved, photos whose files are missing)"""
+        # Read back what this process has queued, too
+        flush_write_behind()
+        # Fold a long change journal into the snapshot so the next load replays less
+        compact_if_needed(self.data_file)
+        return read_inspections_file(self.data_file)
+
+    def save(self, inspections):
+        """
+        Merge `inspections` into the stored ones and write a new snapshot.
+
+        The stored state is reread under the lock, so inspections and photos
+        other writers added are kept, and nothing missing from `inspections`
+        is removed (use delete_inspection).
+        """
+        # Copied now, so the list can keep changing while the write waits
+        serialized = json.loads(json.dumps(serialize_inspections(inspections)["inspections"]))
+        if self.writer is None:
+            write_snapshot(self.data_file, serialized)
+            return
+        self.writer.call(self.data_file, lambda: write_snapshot(self.data_file, serialized))
+
+    def _journal(self, records):
+        if not records:
+            return
+        if self.writer is None:
+            self._append(records)
+            return
+        self.writer.append(self.data_file, records, self._append)
+
+    def _append(self, records):
+        compact_if_needed(self.data_file, append_changes(records, self.data_file))
+
+    def add_photos(self, inspections, photos):
+        index, records = add_photo_records(inspections, photos)
+        self._journal(records)
+        return index, len(records)
+
+    def publish_photos(self, photos):
+        """Add photos to the stored inspections (no session list to update); returns the number added"""
+        flush_write_behind()
+        # Read and append under one lock, so duplicates are checked against what is stored
+        with journal_lock(self.data_file):
+            inspections, _ = read_inspections_file(self.data_file)
+            _, records = add_photo_records(inspections or [], photos)
+            size = append_changes(records, self.data_file) if records else 0
+        compact_if_needed(self.data_file, size)
+        return len(records)
+
+    def update_field(self, inspections, index, field, value):
+        self._journal([update_field_record(inspections, index, field, value)])
+
+    def update_photos(self, inspections, changed):
+        """Journal photos whose fields were updated in place; `changed` is a list of (inspection index, photo)"""
+        self._journal(update_photo_records(inspections, changed))
+
+    def delete_inspection(self, inspections, index):
+        self._journal([delete_inspection_record(inspections, index)])
+
+    def find_photo_by_hash(self, inspections, content_hash):
+        return find_photo_by_hash(inspections, content_hash)
+
+
+def configured_storage_backend():
+    """Configured inspection storage backend: "json" (default) or "sqlite" (HIVE_STORAGE_BACKEND)"""
+    backend = os.environ.get("HIVE_STORAGE_BACKEND", "json").strip().lower()
+    return backend if backend in ("json", "sqlite") else "json"
+
+
+def get_inspection_store(data_file=INSPECTIONS_FILE, backend=None, write_behind=False):
+    """
+    Inspection store for the configured backend.
+
+    The SQLite database lives next to the JSON file (data/inspections.db).
+    With `write_behind`, JSON store writes go through the process-wide
+    write-behind writer; SQLite writes are transactions and stay synchronous.
+    """
+    backend = backend or configured_storage_backend()
+    if backend == "sqlite":
+        from src.utils.sqlite_store import get_sqlite_store, sqlite_path
+        return get_sqlite_store(sqlite_path(data_file))
+    if write_behind:
+        return JsonInspectionStore(data_file, get_write_behind())
+    return JsonInspectionStore(data_file)
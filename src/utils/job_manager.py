@@ -0,0 +1,318 @@
+# src/utils/job_manager.py
+# --------------------------------------------------------------------------
+# Process-wide background ingest jobs. Uploads and URLs are queued as jobs
+# on a bounded worker pool; the UI only polls their status. When the last
+# job of a batch finishes, its photos are published into the inspection
+# store in one write, so every session can pick them up on its
+# next rerun.
+#
+# Uploads are streamed into the blob store when they are submitted, so a
+# queued job only holds the stored blob's digest and path, not a copy of
+# the upload. Finished batches no session picks up are dropped after
+# FINISHED_BATCH_TTL seconds.
+# --------------------------------------------------------------------------
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.utils.archive_import import ingest_archive
+from src.utils.blob_store import CHUNK_SIZE, get_blob_store
+from src.utils.ingest import fetch_url_cached, ingest_stored, reuse_record
+from src.utils.inspection_store import INSPECTIONS_FILE, get_inspection_store
+from src.utils.url_fetcher import DEFAULT_FETCH_WORKERS
+
+# Default pool size and how many unfinished jobs may wait in the queue
+DEFAULT_JOB_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_MAX_PENDING = 256
+
+# Seconds a published batch is kept for its session to poll before it is dropped
+FINISHED_BATCH_TTL = 60 * 60
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobManager:
+    """Bounded worker pool for ingest jobs with pollable status and batched publishing"""
+
+    def __init__(self, max_workers=DEFAULT_JOB_WORKERS, max_pending=DEFAULT_MAX_PENDING,
+                 data_file=INSPECTIONS_FILE, fetch_workers=DEFAULT_FETCH_WORKERS):
+        self.max_pending = max_pending
+        self.data_file = data_file
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        # Downloads wait on the network, so URL jobs fetch on their own wider pool
+        self._fetch_executor = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="fetch")
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._jobs = {}
+        self._batches = {}
+
+        # Bumped every time published photos change the inspection file
+        self.version = 0
+
+    def pending_count(self):
+        """Number of jobs that are queued or running"""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job["status"] in (QUEUED, RUNNING))
+
+    def submit_batch(self, items):
+        """
+        Queue a batch of ingest jobs.
+
+        Uploads are streamed into the blob store here, in chunks, so the
+        queued job only keeps the stored blob's digest and path.
+
+        Parameters:
+            items: List of ("file", file-like or bytes, filename) or ("url", url, filename)
+
+        Returns:
+            str: Batch id, or None if the queue has no room for the batch
+        """
+        if not items:
+            return None
+
+        with self._lock:
+            self._expire_batches()
+            pending = sum(1 for job in self._jobs.values() if job["status"] in (QUEUED, RUNNING))
+            if pending + len(items) > self.max_pending:
+                return None
+
+        # The job outlives the rerun (and its request buffer), so the upload goes to disk now
+        store = get_blob_store()
+        queued = []
+        for kind, source, filename in items:
+            if kind == "file":
+                content_hash, file_path, created, _ = store.put_file(source, filename)
+                source = (content_hash, file_path, created)
+            queued.append((kind, source, filename))
+
+        with self._lock:
+            batch_id = f"batch-{next(self._ids)}"
+            job_ids = []
+            for kind, source, filename in queued:
+                job_id = f"job-{next(self._ids)}"
+                self._jobs[job_id] = {
+                    "id": job_id,
+                    "batch_id": batch_id,
+                    "kind": kind,
+                    "filename": filename,
+                    "status": QUEUED,
+                    "cached": False,
+                    "photo": None,
+                    "error": None,
+                    "submitted_at": time.time(),
+                }
+                job_ids.append((job_id, kind, source, filename))
+
+            self._batches[batch_id] = self._new_batch(batch_id, [job_id for job_id, _, _, _ in job_ids])
+
+        for job_id, kind, source, filename in job_ids:
+            if kind == "url":
+                self._fetch_executor.submit(self._run_fetch, job_id, source, filename)
+            else:
+                self._executor.submit(self._run_job, job_id, *source, filename)
+
+        return batch_id
+
+    def submit_archive(self, source, filename):
+        """
+        Queue a ZIP/TAR archive as a single job whose photos are published together.
+
+        The upload is spooled to an anonymous temporary file, so the job does
+        not keep a second in-memory copy of the archive alive.
+
+        Returns:
+            str: Batch id, or None if the queue is full
+        """
+        with self._lock:
+            self._expire_batches()
+            pending = sum(1 for job in self._jobs.values() if job["status"] in (QUEUED, RUNNING))
+            if pending >= self.max_pending:
+                return None
+
+        spooled = tempfile.TemporaryFile()
+        if hasattr(source, "seek"):
+            source.seek(0)
+        shutil.copyfileobj(source, spooled, CHUNK_SIZE)
+        spooled.seek(0)
+
+        with self._lock:
+            batch_id = f"batch-{next(self._ids)}"
+            job_id = f"job-{next(self._ids)}"
+            self._jobs[job_id] = {
+                "id": job_id,
+                "batch_id": batch_id,
+                "kind": "archive",
+                "filename": filename,
+                "status": QUEUED,
+                "cached": False,
+                "photo": None,
+                "photos": [],
+                "read": 0,
+                "finished": 0,
+                "error": None,
+                "submitted_at": time.time(),
+            }
+            self._batches[batch_id] = self._new_batch(batch_id, [job_id])
+
+        self._executor.submit(self._run_archive, job_id, spooled)
+        return batch_id
+
+    def _run_archive(self, job_id, spooled):
+        """Worker: stream an archive's photos through the ingest pipeline on its own bounded pool"""
+        with self._lock:
+            self._jobs[job_id]["status"] = RUNNING
+
+        def progress(read, finished):
+            with self._lock:
+                self._jobs[job_id].update({"read": read, "finished": finished})
+
+        try:
+            photos, stats = ingest_archive(spooled, progress=progress)
+            update = {"status": DONE, "photos": photos, "cached": bool(photos) and stats["cached"] == len(photos)}
+            if stats["errors"]:
+                update["error"] = f"{stats['failed']} of {stats['files']} photos failed: " + "; ".join(stats["errors"][:3])
+        except Exception as e:
+            update = {"status": FAILED, "error": str(e)}
+        finally:
+            spooled.close()
+        self._finish_job(job_id, update)
+
+    def _run_fetch(self, job_id, url, filename):
+        """Fetch worker: download a URL job, then hand it to the ingest pool if it needs analysis"""
+        with self._lock:
+            self._jobs[job_id]["status"] = RUNNING
+
+        try:
+            content_hash, file_path, _ = fetch_url_cached(url)
+            cached_photo = get_blob_store().get_record(content_hash)
+        except Exception as e:
+            self._finish_job(job_id, {"status": FAILED, "error": str(e)})
+            return
+
+        if cached_photo:
+            self._finish_job(job_id, {"status": DONE, "photo": reuse_record(cached_photo, filename, file_path), "cached": True})
+        else:
+            self._executor.submit(self._run_job, job_id, content_hash, file_path, False, filename)
+
+    def _run_job(self, job_id, content_hash, file_path, created, filename):
+        """Worker: run the session-independent ingest pipeline for one stored photo"""
+        with self._lock:
+            self._jobs[job_id]["status"] = RUNNING
+
+        try:
+            photo, cached = ingest_stored(content_hash, file_path, created, filename)
+            update = {"status": DONE, "photo": photo, "cached": cached}
+        except Exception as e:
+            update = {"status": FAILED, "error": str(e)}
+        self._finish_job(job_id, update)
+
+    def _finish_job(self, job_id, update):
+        """Record a job's outcome and publish its batch if it was the last one running"""
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(update)
+            job["finished_at"] = time.time()
+            batch = self._batches[job["batch_id"]]
+            finished = all(self._jobs[j]["status"] in (DONE, FAILED) for j in batch["job_ids"])
+
+        if finished:
+            self._publish_batch(batch["id"])
+
+    @staticmethod
+    def _new_batch(batch_id, job_ids):
+        return {
+            "id": batch_id,
+            "job_ids": job_ids,
+            "publishing": False,
+            "published": False,
+            "published_at": None,
+            "added": 0,
+            "error": None,
+        }
+
+    def _publish_batch(self, batch_id):
+        """Add a finished batch's photos to the inspection store in one write"""
+        with self._lock:
+            batch = self._batches[batch_id]
+            if batch["publishing"] or batch["published"]:
+                return
+            batch["publishing"] = True
+            photos = []
+            for j in batch["job_ids"]:
+                job = self._jobs[j]
+                if job["photo"]:
+                    photos.append(job["photo"])
+                photos.extend(job.get("photos", []))
+
+        # Store I/O runs outside the lock, so status polls from other sessions are not held up
+        added, error = 0, None
+        try:
+            if photos:
+                added = get_inspection_store(self.data_file).publish_photos(photos)
+        except Exception as e:
+            error = f"Saving the photos failed: {e}"
+
+        with self._lock:
+            if added:
+                self.version += 1
+            batch.update({"published": True, "published_at": time.time(), "added": added, "error": error})
+
+    def _expire_batches(self):
+        """Drop published batches no session has picked up within FINISHED_BATCH_TTL (lock held)"""
+        cutoff = time.time() - FINISHED_BATCH_TTL
+        for batch_id, batch in list(self._batches.items()):
+            if batch["published"] and batch["published_at"] < cutoff:
+                for job_id in batch["job_ids"]:
+                    self._jobs.pop(job_id, None)
+                del self._batches[batch_id]
+
+    def job_status(self, job_id):
+        """Copy of one job record, or None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def batch_status(self, batch_id):
+        """
+        Progress of a batch for polling.
+
+        Returns:
+            dict: {'id', 'total', 'finished', 'done' (published), 'added', 'error', 'jobs'}, or None
+        """
+        with self._lock:
+            self._expire_batches()
+            batch = self._batches.get(batch_id)
+            if batch is None:
+                return None
+            jobs = [dict(self._jobs[j]) for j in batch["job_ids"]]
+            return {
+                "id": batch_id,
+                "total": len(jobs),
+                "finished": sum(1 for job in jobs if job["status"] in (DONE, FAILED)),
+                "done": batch["published"],
+                "added": batch["added"],
+                "error": batch["error"],
+                "jobs": jobs,
+            }
+
+    def forget_batch(self, batch_id):
+        """Drop a published batch and its jobs once the UI has shown the result"""
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            if batch is None or not batch["published"]:
+                return False
+            for job_id in batch["job_ids"]:
+                self._jobs.pop(job_id, None)
+            del self._batches[batch_id]
+            return True
+
+    def shutdown(self, wait=True):
+        self._fetch_executor.shutdown(wait=wait)
+        self._executor.shutdown(wait=wait)
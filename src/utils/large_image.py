@@ -0,0 +1,307 @@
+# src/utils/large_image.py
+# --------------------------------------------------------------------------
+# Memory-bounded analysis of very large photos (stitched panoramas above
+# 100 MP). Above PIXEL_CEILING an image is never decoded at full
+# resolution:
+#
+#   - JPEGs are decoded in draft mode (DCT-scaled by libjpeg), which is
+#     already bounded as long as the 1/8 scale image fits under the ceiling.
+#   - PNGs are streamed in horizontal strips: the IDAT stream is inflated
+#     incrementally and each strip of scanlines is decoded by PIL on its
+#     own, so only one strip of pixels is held at a time.
+#
+# Each strip is added to a ColorHistogram for the palette and box-reduced
+# into the small analysis image used by the other pixel stages.
+#
+# MAX_IMAGE_PIXELS is a hard limit: images declaring more pixels are
+# rejected from their header, before any data is inflated, since a tiny,
+# highly compressible PNG can declare billions of pixels.
+# --------------------------------------------------------------------------
+import io
+import math
+import struct
+import zlib
+import numpy as np
+from PIL import Image
+from src.utils.exif_reader import PNG_SIGNATURE, read_image_header
+from src.utils.palette import DEFAULT_SAMPLE_BUDGET, ColorHistogram
+
+# Images with more pixels than this are only analyzed in tiled mode
+PIXEL_CEILING = 50 * 1000 * 1000
+
+# Images with more pixels than this are rejected (PIL's own limit is ~179 MP)
+MAX_IMAGE_PIXELS = 500 * 1000 * 1000
+
+# Decoded pixel bytes held per strip
+STRIP_BYTE_BUDGET = 8 * 1024 * 1024
+
+# Compressed bytes read per inflate step
+READ_SIZE = 256 * 1024
+
+# PNG color type -> (channels, PIL mode) for the 8-bit, non-interlaced layouts streamed here
+PNG_COLOR_TYPES = {
+    0: (1, "L"),
+    2: (3, "RGB"),
+    3: (1, "P"),
+    4: (2, "LA"),
+    6: (4, "RGBA"),
+}
+
+
+class PixelCeilingExceeded(Exception):
+    """The image is over the pixel ceiling and cannot be decoded in bounded memory"""
+
+
+def exceeds_ceiling(size, ceiling=PIXEL_CEILING):
+    width, height = size
+    return width * height > ceiling
+
+
+def open_large(source, max_pixels=MAX_IMAGE_PIXELS):
+    """
+    Image.open for photos up to `max_pixels`, past PIL's decompression-bomb limit.
+
+    Only for callers that bound the decode themselves (draft mode or strips);
+    PIL's limit would otherwise reject every photo over ~179 MP before it is
+    looked at. The size is read from the header first and anything over
+    `max_pixels` raises Image.DecompressionBombError. PIL's process-wide
+    limit is left alone: images between it and `max_pixels` are opened
+    through their format plugin, which does not consult it.
+    """
+    header = read_image_header(source)
+    if header is None:
+        # Not a JPEG/PNG: PIL's own limit applies
+        return Image.open(source)
+
+    width, height = header['width'], header['height']
+    if width * height > max_pixels:
+        raise Image.DecompressionBombError(
+            f"{width}x{height} image exceeds the limit of {max_pixels} pixels"
+        )
+    if hasattr(source, "seek"):
+        source.seek(0)
+    if not Image.MAX_IMAGE_PIXELS or width * height <= Image.MAX_IMAGE_PIXELS:
+        return Image.open(source)
+
+    Image.init()
+    factory, _ = Image.OPEN[header['format']]
+    try:
+        return factory(source)
+    except SyntaxError as e:
+        raise Image.UnidentifiedImageError(f"cannot identify image file: {e}")
+
+
+def _write_chunk(out, chunk_type, data):
+    out.write(struct.pack(">L", len(data)))
+    out.write(chunk_type)
+    out.write(data)
+    out.write(struct.pack(">L", zlib.crc32(data, zlib.crc32(chunk_type))))
+
+
+def iter_png_strips(source, byte_budget=STRIP_BYTE_BUDGET, row_multiple=1):
+    """
+    Decode a PNG in horizontal strips.
+
+    The filtered scanlines of each strip are re-wrapped as a small PNG and
+    decoded by PIL. The previous strip's last row is prepended unfiltered,
+    so Up/Average/Paeth filters of the strip's first row see the right
+    neighbour.
+
+    Parameters:
+        source: Path or binary file-like object
+        byte_budget (int): Approximate decoded bytes per strip
+        row_multiple (int): Strip heights are a multiple of this (except the last)
+
+    Yields:
+        tuple: (top row, PIL Image of the strip)
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            yield from iter_png_strips(f, byte_budget, row_multiple)
+        return
+
+    f = source
+    f.seek(0)
+    if f.read(8) != PNG_SIGNATURE:
+        raise PixelCeilingExceeded("not a PNG")
+
+    ancillary = []  # (type, data) of the PLTE / tRNS chunks copied into every strip
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise PixelCeilingExceeded("no image data")
+        length, chunk_type = struct.unpack(">L4s", header)
+        if chunk_type == b"IHDR":
+            ihdr = f.read(length)
+            width, height, bit_depth, color_type, _, _, interlace = struct.unpack(">LLBBBBB", ihdr[:13])
+            if bit_depth != 8 or interlace or color_type not in PNG_COLOR_TYPES:
+                raise PixelCeilingExceeded("only 8-bit, non-interlaced PNGs can be streamed")
+            f.seek(4, io.SEEK_CUR)
+        elif chunk_type in (b"PLTE", b"tRNS"):
+            ancillary.append((chunk_type, f.read(length)))
+            f.seek(4, io.SEEK_CUR)
+        elif chunk_type == b"IDAT":
+            idat_remaining = length
+            break
+        elif chunk_type == b"IEND":
+            raise PixelCeilingExceeded("no image data")
+        else:
+            f.seek(length + 4, io.SEEK_CUR)
+
+    channels = PNG_COLOR_TYPES[color_type][0]
+    row_bytes = width * channels
+    stride = row_bytes + 1  # filter byte + samples
+    strip_rows = max(1, byte_budget // row_bytes) // row_multiple * row_multiple or row_multiple
+
+    def idat_data():
+        """Compressed bytes of consecutive IDAT chunks"""
+        remaining = idat_remaining
+        while True:
+            while remaining:
+                data = f.read(min(READ_SIZE, remaining))
+                if not data:
+                    return
+                remaining -= len(data)
+                yield data
+            f.seek(4, io.SEEK_CUR)  # CRC
+            header = f.read(8)
+            if len(header) < 8:
+                return
+            remaining, chunk_type = struct.unpack(">L4s", header)
+            if chunk_type != b"IDAT":
+                return
+
+    inflater = zlib.decompressobj()
+    compressed = idat_data()
+    seed = None  # last decoded row of the previous strip
+    top = 0
+
+    while top < height:
+        rows = min(strip_rows, height - top)
+        body = bytearray(b"\x00" + seed) if seed is not None else bytearray()
+        needed = len(body) + rows * stride
+        while len(body) < needed:
+            # max_length keeps the inflated output to exactly this strip
+            data = inflater.unconsumed_tail or next(compressed, b"")
+            if not data:
+                raise PixelCeilingExceeded("truncated PNG data")
+            body += inflater.decompress(data, needed - len(body))
+
+        strip_height = rows if seed is None else rows + 1
+        mini = io.BytesIO()
+        mini.write(PNG_SIGNATURE)
+        _write_chunk(mini, b"IHDR", struct.pack(">LL", width, strip_height) + ihdr[8:13])
+        for chunk_type, data in ancillary:
+            _write_chunk(mini, chunk_type, data)
+        # Stored (level 0) deflate: only framing, no compression work
+        _write_chunk(mini, b"IDAT", zlib.compress(body, 0))
+        _write_chunk(mini, b"IEND", b"")
+        del body
+
+        mini.seek(0)
+        strip = Image.open(mini)
+        strip.load()
+        del mini
+        if seed is not None:
+            strip = strip.crop((0, 1, width, strip_height))
+
+        seed = strip.crop((0, rows - 1, width, rows)).tobytes()
+        yield top, strip
+        top += rows
+
+
+def sample_grid(size, sample_budget=DEFAULT_SAMPLE_BUDGET):
+    """
+    Row and column indices of the pixels `sample_pixels` keeps for an image.
+
+    Matches its nearest-neighbour resize, so a strip scan samples exactly
+    the pixels an in-memory analysis of the whole image would.
+    """
+    width, height = size
+    step = max(1, int(math.ceil(math.sqrt(width * height / sample_budget))))
+    sampled_width, sampled_height = max(1, width // step), max(1, height // step)
+    return _nearest_indices(height, sampled_height), _nearest_indices(width, sampled_width)
+
+
+def _nearest_indices(size, sampled_size):
+    """Source indices of PIL's nearest-neighbour resize (accumulated the way PIL steps them)"""
+    scale = size / sampled_size
+    steps = np.full(sampled_size, scale)
+    steps[0] = 0.5 * scale
+    return np.floor(np.add.accumulate(steps)).astype(np.int64)
+
+
+def scan_large_image(source, analysis_pixel_budget, sample_budget=DEFAULT_SAMPLE_BUDGET,
+                     byte_budget=STRIP_BYTE_BUDGET):
+    """
+    Stream a large PNG once, building its palette histogram and analysis image.
+
+    Parameters:
+        source: Path or binary file-like object
+        analysis_pixel_budget (int): Approximate pixel count of the reduced image
+        sample_budget (int): Approximate pixels sampled into the histogram (None: no histogram)
+        byte_budget (int): Decoded bytes held per strip
+
+    Returns:
+        tuple: (RGB analysis image, ColorHistogram or None, downscale factor)
+    """
+    header = read_image_header(source)
+    if not header or header['format'] != "PNG":
+        raise PixelCeilingExceeded("only PNGs can be scanned in strips")
+    width, height = header['width'], header['height']
+    if width * height > MAX_IMAGE_PIXELS:
+        raise Image.DecompressionBombError(
+            f"{width}x{height} image exceeds the limit of {MAX_IMAGE_PIXELS} pixels"
+        )
+
+    factor = max(1, int(math.floor(math.sqrt(width * height / analysis_pixel_budget))))
+    analysis = Image.new("RGB", (max(1, width // factor), max(1, height // factor)))
+    histogram = ColorHistogram() if sample_budget else None
+    if sample_budget:
+        sample_rows, sample_columns = sample_grid((width, height), sample_budget)
+
+    # Strips start on a multiple of the reduction factor, so each maps to whole analysis rows
+    for top, strip in iter_png_strips(source, byte_budget, row_multiple=factor):
+        has_alpha = "A" in strip.getbands() or "transparency" in strip.info
+        strip = strip.convert("RGBA" if has_alpha else "RGB")
+
+        if histogram is not None:
+            # The same pixels the in-memory sampler picks, restricted to this strip's rows
+            rows = sample_rows[(sample_rows >= top) & (sample_rows < top + strip.size[1])] - top
+            sample = np.asarray(strip)[rows][:, sample_columns]
+            histogram.add(sample.reshape(-1, sample.shape[-1]))
+            del sample
+
+        if has_alpha:
+            strip = strip.convert("RGB")
+        band_top = top // factor
+        band_bottom = min(analysis.size[1], (top + strip.size[1]) // factor)
+        if band_bottom > band_top:
+            band = strip.resize((analysis.size[0], band_bottom - band_top), Image.BOX,
+                                box=(0, 0, analysis.size[0] * factor, (band_bottom - band_top) * factor))
+            analysis.paste(band, (0, band_top))
+
+    return analysis, histogram, factor
+
+
+def load_reduced(source, max_side):
+    """
+    Reduced RGB copy of a large image, for thumbnails, without a full decode.
+
+    Returns:
+        PIL.Image: Image whose longer side is at least `max_side` (when the original is)
+    """
+    img = open_large(source)
+    if img.format == "JPEG":
+        img.draft("RGB", (max_side, max_side))
+        if exceeds_ceiling(img.size):
+            raise PixelCeilingExceeded(f"{img.size[0]}x{img.size[1]} JPEG is too large even at 1/8 scale")
+        return img.convert("RGB")
+    if img.format != "PNG":
+        raise PixelCeilingExceeded(f"{img.format} images over the pixel ceiling are not supported")
+
+    width, height = img.size
+    img.close()
+    factor = max(1, max(width, height) // max_side)
+    reduced, _, _ = scan_large_image(source, width * height / (factor * factor), sample_budget=None)
+    return reduced
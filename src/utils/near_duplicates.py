@@ -0,0 +1,168 @@
+# src/utils/near_duplicates.py
+# --------------------------------------------------------------------------
+# Perceptual-hash index for near-duplicate photos (bursts of almost
+# identical frame shots).
+#
+# Each ingested photo gets a 64-bit difference hash (dHash) of its
+# analysis image. Hashes are kept in a multi-index hash table, so all
+# photos within a Hamming radius are found without comparing against every
+# stored hash, and appended to data/phash_index.jsonl so the index survives restarts
+# and is shared with bulk-ingest worker processes.
+# --------------------------------------------------------------------------
+import json
+import os
+import threading
+import numpy as np
+from PIL import Image
+
+DEFAULT_INDEX_FILE = os.path.join("data", "phash_index.jsonl")
+
+# dHash grid: 8x8 comparisons -> 64-bit hash
+HASH_SIZE = 8
+
+# Photos at most this many differing bits apart are treated as near-duplicates
+NEAR_DUPLICATE_RADIUS = 6
+
+
+def dhash(img, hash_size=HASH_SIZE):
+    """
+    Difference hash of an image as an int.
+
+    The image is reduced to a (hash_size + 1) x hash_size grayscale grid and
+    each bit records whether a pixel is brighter than its right neighbour, so
+    the hash survives rescaling, recompression and small exposure changes.
+    """
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class MultiIndexHash:
+    """
+    Multi-index hash table for Hamming radius searches.
+
+    The 64-bit hash is split into radius + 1 disjoint blocks, each with its
+    own exact-match table. By the pigeonhole principle any hash within
+    `radius` bits agrees exactly with the query on at least one block, so
+    only the few hashes sharing a block are compared instead of all of them.
+    """
+
+    def __init__(self, radius=NEAR_DUPLICATE_RADIUS, bits=HASH_SIZE * HASH_SIZE):
+        self.radius = radius
+        block_count = radius + 1
+        # (shift, mask) of each block, sizes differing by at most one bit
+        self._blocks = []
+        start = 0
+        for i in range(block_count):
+            width = bits // block_count + (1 if i < bits % block_count else 0)
+            self._blocks.append((start, (1 << width) - 1))
+            start += width
+        self._tables = [{} for _ in self._blocks]
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, value, item):
+        self._size += 1
+        for table, (shift, mask) in zip(self._tables, self._blocks):
+            table.setdefault((value >> shift) & mask, []).append((value, item))
+
+    def search(self, value, radius=None):
+        """All (distance, item) pairs within `radius` of `value`, nearest first"""
+        radius = self.radius if radius is None else min(radius, self.radius)
+        seen = set()
+        matches = []
+        for table, (shift, mask) in zip(self._tables, self._blocks):
+            for candidate, item in table.get((value >> shift) & mask, ()):
+                if item in seen:
+                    continue
+                seen.add(item)
+                distance = hamming_distance(value, candidate)
+                if distance <= radius:
+                    matches.append((distance, item))
+
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+
+class NearDuplicateIndex:
+    """Persistent content hash -> dHash index with sub-linear radius lookups"""
+
+    def __init__(self, index_file=DEFAULT_INDEX_FILE):
+        self.index_file = index_file
+        self._lock = threading.Lock()
+        self._table = MultiIndexHash()
+        self._hashes = {}
+        self._offset = 0
+
+    def _refresh(self):
+        """Load entries appended since the last read (by this or another process)"""
+        try:
+            with open(self.index_file, "rb") as f:
+                f.seek(self._offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # Partially written line: read it next time
+                        break
+                    self._offset += len(line)
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._insert(entry["content_hash"], int(entry["phash"], 16))
+        except OSError:
+            pass
+
+    def _insert(self, content_hash, value):
+        if content_hash not in self._hashes:
+            self._hashes[content_hash] = value
+            self._table.add(value, content_hash)
+
+    def add(self, content_hash, value):
+        """Record a photo's perceptual hash"""
+        with self._lock:
+            self._refresh()
+            if content_hash in self._hashes:
+                return
+            self._insert(content_hash, value)
+
+            os.makedirs(os.path.dirname(self.index_file) or ".", exist_ok=True)
+            line = json.dumps({"content_hash": content_hash, "phash": f"{value:016x}"}) + "\n"
+            # One small append per photo; O_APPEND keeps concurrent writers from interleaving
+            # (the line is read back, and skipped, by the next refresh)
+            with open(self.index_file, "a") as f:
+                f.write(line)
+
+    def find_near(self, value, radius=NEAR_DUPLICATE_RADIUS, exclude=None):
+        """Stored photos within `radius` bits of `value`: list of (distance, content hash)"""
+        with self._lock:
+            self._refresh()
+            return [
+                (distance, content_hash)
+                for distance, content_hash in self._table.search(value, radius)
+                if content_hash != exclude
+            ]
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._hashes)
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_near_duplicate_index():
+    """Process-wide NearDuplicateIndex backed by data/phash_index.jsonl"""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = NearDuplicateIndex()
+        return _default_index
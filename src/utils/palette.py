@@ -0,0 +1,206 @@
+# src/utils/palette.py
+import math
+import numpy as np
+from PIL import Image
+
+# Bits kept per channel when building the color histogram (same as ColorThief's MMCQ)
+SIGBITS = 5
+RSHIFT = 8 - SIGBITS
+HISTOGRAM_BINS = 1 << (3 * SIGBITS)
+
+# Default number of pixels sampled from an image for palette extraction
+DEFAULT_SAMPLE_BUDGET = 65536
+
+# Fallback palette used when extraction fails
+DEFAULT_PALETTE = ["#CCCCCC", "#DDDDDD", "#EEEEEE", "#EFEFEF", "#F5F5F5"]
+
+# Fraction of the boxes split by population before switching to population * volume
+FRACT_BY_POPULATION = 0.75
+
+
+def sample_pixels(img, sample_budget=DEFAULT_SAMPLE_BUDGET):
+    """
+    Sample RGB pixels from a PIL Image or a (H, W, 3|4) uint8 array.
+
+    The image is subsampled on a regular grid so that roughly `sample_budget`
+    pixels are kept. Transparent and near-white pixels are skipped, matching
+    ColorThief's behaviour.
+
+    Returns:
+        np.ndarray: (N, 3) uint8 array of RGB pixels
+    """
+    if isinstance(img, np.ndarray):
+        arr = img
+        height, width = arr.shape[:2]
+        step = max(1, int(math.ceil(math.sqrt(height * width / sample_budget))))
+        arr = arr[::step, ::step]
+    else:
+        if img.mode not in ("RGB", "RGBA"):
+            has_alpha = "A" in img.getbands() or "transparency" in img.info
+            img = img.convert("RGBA" if has_alpha else "RGB")
+        width, height = img.size
+        step = max(1, int(math.ceil(math.sqrt(width * height / sample_budget))))
+        if step > 1:
+            # Nearest-neighbour resize is a grid sample done in C, without copying the full frame
+            img = img.resize((max(1, width // step), max(1, height // step)), Image.NEAREST)
+        arr = np.asarray(img)
+
+    pixels = arr.reshape(-1, arr.shape[-1]) if arr.ndim == 3 else np.repeat(arr.reshape(-1, 1), 3, axis=1)
+
+    # Drop transparent pixels
+    if pixels.shape[1] == 4:
+        pixels = pixels[pixels[:, 3] >= 125, :3]
+
+    # Drop near-white pixels unless that would leave nothing
+    not_white = ~np.all(pixels > 250, axis=1)
+    if not_white.any():
+        pixels = pixels[not_white]
+
+    return np.ascontiguousarray(pixels[:, :3], dtype=np.uint8)
+
+
+def _split_box(box, colors, counts):
+    """Split a box of histogram bins at the population median of its widest channel"""
+    box_colors = colors[box]
+    ranges = box_colors.max(axis=0) - box_colors.min(axis=0)
+    if len(box) < 2 or ranges.max() == 0:
+        return None
+
+    channel = int(np.argmax(ranges))
+    values = box_colors[:, channel]
+    order = np.argsort(values, kind="stable")
+    cumulative = np.cumsum(counts[box][order])
+    median_value = values[order][np.searchsorted(cumulative, cumulative[-1] / 2.0)]
+
+    left = values <= median_value
+    if left.all():
+        left = values < median_value
+    return box[left], box[~left]
+
+
+def _median_cut(colors, counts, color_count):
+    """Partition the quantized histogram into at most `color_count` boxes"""
+    boxes = [np.arange(len(colors))]
+    frozen = [False]
+
+    def volume(box):
+        box_colors = colors[box]
+        return float(np.prod(box_colors.max(axis=0) - box_colors.min(axis=0) + 1))
+
+    def split_until(target, key):
+        while len(boxes) < target:
+            candidates = [i for i in range(len(boxes)) if not frozen[i]]
+            if not candidates:
+                return
+            i = max(candidates, key=lambda j: key(boxes[j]))
+            halves = _split_box(boxes[i], colors, counts)
+            if halves is None:
+                frozen[i] = True
+                continue
+            boxes[i] = halves[0]
+            boxes.append(halves[1])
+            frozen.append(False)
+
+    # First pass splits the most populated boxes, second pass favours large sparse boxes
+    split_until(max(1, int(FRACT_BY_POPULATION * color_count)), lambda b: counts[b].sum())
+    split_until(color_count, lambda b: counts[b].sum() * volume(b))
+    return boxes
+
+
+class ColorHistogram:
+    """
+    Quantized color histogram that can be built up from batches of pixels.
+
+    Large images are scanned in strips (src/utils/large_image.py): each
+    strip's pixels are added and the palette is cut from the merged counts,
+    so the result does not depend on how the image was split.
+    """
+
+    def __init__(self):
+        self.counts = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+        self.sums = np.zeros((HISTOGRAM_BINS, 3))
+        # Near-white pixels are kept apart and only used if nothing else is left
+        self.white_counts = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+        self.white_sums = np.zeros((HISTOGRAM_BINS, 3))
+
+    def add(self, pixels):
+        """Add (N, 3|4) uint8 pixels (transparent ones are skipped)"""
+        if pixels.shape[1] == 4:
+            pixels = pixels[pixels[:, 3] >= 125, :3]
+        white = np.all(pixels > 250, axis=1)
+        self._add(pixels[~white], self.counts, self.sums)
+        self._add(pixels[white], self.white_counts, self.white_sums)
+
+    @staticmethod
+    def _add(pixels, counts, sums):
+        if len(pixels) == 0:
+            return
+        quantized = (pixels >> RSHIFT).astype(np.int32)
+        bin_index = (quantized[:, 0] << (2 * SIGBITS)) | (quantized[:, 1] << SIGBITS) | quantized[:, 2]
+        counts += np.bincount(bin_index, minlength=HISTOGRAM_BINS)
+        # Per-bin sums of the real pixel values, so box colors are exact averages
+        for c in range(3):
+            sums[:, c] += np.bincount(bin_index, weights=pixels[:, c], minlength=HISTOGRAM_BINS)
+
+    def merge(self, other):
+        """Add another histogram's counts (e.g. from a strip processed elsewhere)"""
+        self.counts += other.counts
+        self.sums += other.sums
+        self.white_counts += other.white_counts
+        self.white_sums += other.white_sums
+        return self
+
+    @property
+    def total(self):
+        return int(self.counts.sum() + self.white_counts.sum())
+
+    def palette(self, color_count=5):
+        """Dominant colors (RGB tuples, most dominant first) by median cut over the histogram"""
+        counts, sums = self.counts, self.sums
+        if not counts.any():
+            counts, sums = self.white_counts, self.white_sums
+        bins = np.flatnonzero(counts)
+        if len(bins) == 0:
+            return []
+
+        counts, sums = counts[bins], sums[bins]
+        mask = (1 << SIGBITS) - 1
+        colors = np.stack([(bins >> (2 * SIGBITS)) & mask, (bins >> SIGBITS) & mask, bins & mask], axis=1)
+
+        boxes = _median_cut(colors, counts, color_count)
+
+        palette = []
+        for box in boxes:
+            population = counts[box].sum()
+            mean = sums[box].sum(axis=0) / population
+            palette.append((population, tuple(int(round(v)) for v in mean)))
+
+        palette.sort(key=lambda item: item[0], reverse=True)
+        return [rgb for _, rgb in palette]
+
+
+def extract_palette(img, color_count=5, sample_budget=DEFAULT_SAMPLE_BUDGET):
+    """
+    Extract dominant colors with a vectorized median cut.
+
+    Parameters:
+        img: PIL Image or uint8 RGB(A) array
+        color_count (int): Maximum number of colors to return
+        sample_budget (int): Approximate number of pixels to analyze
+
+    Returns:
+        list: RGB tuples ordered from most to least dominant
+    """
+    histogram = ColorHistogram()
+    histogram.add(sample_pixels(img, sample_budget))
+    return histogram.palette(color_count)
+
+
+def palette_to_hex(palette):
+    """Convert a list of RGB tuples to hex color codes"""
+    return ['#%02x%02x%02x' % tuple(rgb) for rgb in palette]
+
+
+def extract_palette_hex(img, color_count=5, sample_budget=DEFAULT_SAMPLE_BUDGET):
+    """Extract dominant colors as a list of hex color codes"""
+    return palette_to_hex(extract_palette(img, color_count, sample_budget))
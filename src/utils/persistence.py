@@ -0,0 +1,290 @@
+# src/utils/persistence.py
+# --------------------------------------------------------------------------
+# Write-behind persistence for the Streamlit sessions. Inspection changes
+# are applied to the session's list right away and queued here; a
+# background thread writes them out once the write window
+# (HIVE_WRITE_BEHIND_SECONDS, default 0.5 s) has passed since the first
+# queued change. A burst of edits becomes one journal append, so the
+# script thread never waits on the disk. Operations on one file are
+# written in the order they were queued; a snapshot never drops changes
+# queued before it.
+#
+# Files are replaced atomically: the new contents go to a temporary file
+# in the same directory, are fsynced, and are moved over the old file
+# with os.replace, so a crash leaves either the old or the new file.
+#
+# flush() is a barrier: it returns once everything queued before the call
+# has been written. It runs at interpreter exit and before the store is
+# read back.
+#
+# file_lock() serializes writers of a file across threads and processes
+# (the Streamlit server and the ingest command-line tools).
+# --------------------------------------------------------------------------
+import atexit
+import logging
+import os
+import threading
+import time
+
+# fcntl is POSIX-only; without it file_lock() only serializes the threads of one process
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds to collect changes before writing; override with HIVE_WRITE_BEHIND_SECONDS
+DEFAULT_WRITE_WINDOW = 0.5
+
+# Queued operation kinds
+APPEND = "append"
+CALL = "call"
+
+
+def configured_write_window():
+    """Configured write-behind window in seconds"""
+    try:
+        return max(0.0, float(os.environ.get("HIVE_WRITE_BEHIND_SECONDS", DEFAULT_WRITE_WINDOW)))
+    except ValueError:
+        return DEFAULT_WRITE_WINDOW
+
+
+def fsync_directory(path):
+    """Make a rename inside `path` durable (a no-op where directories cannot be opened)"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_text(path, text):
+    """Replace `path` with `text` via a fsynced temporary file and os.replace"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    fsync_directory(directory)
+
+
+class FileLock:
+    """
+    Exclusive lock held through a lock file (fcntl.flock) and a thread lock.
+
+    Reentrant within a thread, so a compaction can run inside an append
+    that already holds the lock. Use file_lock() to get the process-wide
+    instance for a path.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a")
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth == 0:
+            # Closing the file releases the flock
+            self._file.close()
+            self._file = None
+        self._lock.release()
+
+
+_file_locks = {}
+_file_locks_lock = threading.Lock()
+
+
+def file_lock(path):
+    """Process-wide FileLock for a lock file path"""
+    path = os.path.abspath(path)
+    with _file_locks_lock:
+        if path not in _file_locks:
+            _file_locks[path] = FileLock(path)
+        return _file_locks[path]
+
+
+class WriteBehindWriter:
+    """
+    Debounced background writer.
+
+    Writes are queued per target (usually a file path) as either
+    append(target, items, write) or call(target, write). Appends queued
+    back to back are merged into one write(items) call. A target's
+    operations run in the order they were queued, and targets are written
+    in the order they were first queued.
+    """
+
+    def __init__(self, window=None):
+        self.window = configured_write_window() if window is None else window
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._first_queued = None
+        self._flush_requested = False
+        self._started = 0
+        self._finished = 0
+        self._last_failed = 0
+        self._thread = None
+        self._stats = {
+            'writes': 0,
+            'coalesced': 0,
+            'flushes': 0,
+            'errors': 0,
+            'last_error': None,
+            'last_flush_seconds': 0.0,
+            'max_flush_seconds': 0.0,
+            'total_flush_seconds': 0.0,
+        }
+
+    def append(self, target, items, write):
+        """Queue `items` to be written with write(items), merged with appends queued just before"""
+        with self._cond:
+            ops = self._queue(target)
+            if ops and ops[-1][0] == APPEND:
+                ops[-1] = (APPEND, ops[-1][1] + list(items), write)
+                self._stats['coalesced'] += 1
+            else:
+                ops.append((APPEND, list(items), write))
+
+    def call(self, target, write):
+        """Queue write() to run after everything already queued for `target`"""
+        with self._cond:
+            self._queue(target).append((CALL, None, write))
+
+    def _queue(self, target):
+        """Pending operations for `target` (caller holds the lock); starts the thread if needed"""
+        self._stats['writes'] += 1
+        if not self._pending:
+            self._first_queued = time.monotonic()
+            self._cond.notify_all()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+        return self._pending.setdefault(target, [])
+
+    def flush(self, timeout=None):
+        """
+        Write everything queued so far now and wait for it.
+
+        Returns:
+            bool: True if it was written, False on a write error or timeout
+        """
+        with self._cond:
+            if self._pending:
+                target_cycle = self._started + 1
+                self._flush_requested = True
+                self._cond.notify_all()
+            else:
+                target_cycle = self._started
+            finished = self._cond.wait_for(lambda: self._finished >= target_cycle, timeout)
+            return finished and self._last_failed < target_cycle
+
+    def stats(self):
+        """Writes queued and coalesced, flush count and latency, and the error of the last flush (None if it succeeded)"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['pending'] = sum(len(ops) for ops in self._pending.values())
+        stats['mean_flush_seconds'] = (
+            stats['total_flush_seconds'] / stats['flushes'] if stats['flushes'] else 0.0
+        )
+        return stats
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+                deadline = self._first_queued + self.window
+                self._cond.wait_for(
+                    lambda: self._flush_requested or time.monotonic() >= deadline,
+                    max(0.0, deadline - time.monotonic()),
+                )
+                batch, self._pending = self._pending, {}
+                self._flush_requested = False
+                self._started += 1
+                cycle = self._started
+
+            start = time.perf_counter()
+            failed = {}
+            for target, ops in batch.items():
+                for i, (kind, items, write) in enumerate(ops):
+                    try:
+                        if kind == APPEND:
+                            write(items)
+                        else:
+                            write()
+                    except Exception as e:
+                        logger.error("Write-behind write to %s failed: %s", target, e)
+                        failed[target] = (ops[i:], e)
+                        break
+            elapsed = time.perf_counter() - start
+
+            with self._cond:
+                if not failed:
+                    # Recovered: the sidebar stops reporting the earlier failure
+                    self._stats['last_error'] = None
+                for target, (ops, error) in failed.items():
+                    # Retry in the next cycle, ahead of anything queued since
+                    self._pending[target] = ops + self._pending.get(target, [])
+                    self._stats['errors'] += 1
+                    self._stats['last_error'] = f"{target}: {error}"
+                    self._last_failed = cycle
+                if self._pending:
+                    self._first_queued = time.monotonic()
+                self._stats['flushes'] += 1
+                self._stats['last_flush_seconds'] = elapsed
+                self._stats['max_flush_seconds'] = max(self._stats['max_flush_seconds'], elapsed)
+                self._stats['total_flush_seconds'] += elapsed
+                self._finished = cycle
+                self._cond.notify_all()
+
+
+_default_writer = None
+_default_writer_lock = threading.Lock()
+
+
+def get_write_behind():
+    """Process-wide write-behind writer, flushed at interpreter exit"""
+    global _default_writer
+    with _default_writer_lock:
+        if _default_writer is None:
+            _default_writer = WriteBehindWriter()
+            atexit.register(_default_writer.flush)
+        return _default_writer
+
+
+def flush_write_behind(timeout=None):
+    """Flush the process-wide writer, if one has been created; returns False if a write failed"""
+    writer = _default_writer
+    return writer.flush(timeout) if writer is not None else True
@@ -0,0 +1,104 @@
+# src/utils/quality.py
+# --------------------------------------------------------------------------
+# Cheap image quality score, computed with NumPy on the downsampled
+# analysis image (a few milliseconds per photo):
+#
+#   - sharpness: variance of the Laplacian (blurry photos have few edges)
+#   - exposure: mean brightness and the share of clipped shadows/highlights
+#   - dynamic range: spread between the 1st and 99th brightness percentiles
+#
+# Photos scoring below the threshold (lid shots, gloves over the lens,
+# almost black frames) skip the heavy analysis stages such as palette
+# extraction and the billable Vision API call.
+# --------------------------------------------------------------------------
+import os
+import numpy as np
+
+# Scores below this skip the heavy stages; override with HIVE_QUALITY_THRESHOLD
+DEFAULT_QUALITY_THRESHOLD = 30.0
+
+# Laplacian variance (on the analysis image) counted as fully sharp
+SHARP_VARIANCE = 150.0
+
+# Brightness spread (1st to 99th percentile, 0-255) counted as full dynamic range
+FULL_DYNAMIC_RANGE = 160.0
+
+# Luminance levels counted as clipped
+SHADOW_CLIP = 8
+HIGHLIGHT_CLIP = 247
+
+# Weights of the component scores in the overall (weighted geometric mean) score
+WEIGHTS = {'sharpness': 0.5, 'exposure': 0.3, 'dynamic_range': 0.2}
+
+
+def configured_quality_threshold():
+    """Configured minimum quality score (0-100)"""
+    try:
+        return float(os.environ.get("HIVE_QUALITY_THRESHOLD", DEFAULT_QUALITY_THRESHOLD))
+    except ValueError:
+        return DEFAULT_QUALITY_THRESHOLD
+
+
+def luminance(img):
+    """Float32 (H, W) luminance of a PIL Image or RGB array"""
+    arr = np.asarray(img, dtype=np.float32)
+    if arr.ndim == 2:
+        return arr
+    return arr[..., 0] * 0.299 + arr[..., 1] * 0.587 + arr[..., 2] * 0.114
+
+
+def laplacian_variance(gray):
+    """Variance of the 4-neighbour Laplacian"""
+    if gray.shape[0] < 3 or gray.shape[1] < 3:
+        return 0.0
+    laplacian = (gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+                 - 4 * gray[1:-1, 1:-1])
+    return float(laplacian.var())
+
+
+def score_quality(img):
+    """
+    Score an (already downsampled) image.
+
+    Parameters:
+        img: PIL Image or uint8 array
+
+    Returns:
+        dict: 'score' (0-100) plus the measurements behind it
+    """
+    gray = luminance(img)
+    histogram = np.bincount(np.clip(gray, 0, 255).astype(np.uint8).ravel(), minlength=256)
+    total = max(1, int(histogram.sum()))
+
+    variance = laplacian_variance(gray)
+    mean = float(gray.mean()) if gray.size else 0.0
+    cumulative = np.cumsum(histogram) / total
+    low, high = int(np.searchsorted(cumulative, 0.01)), int(np.searchsorted(cumulative, 0.99))
+    shadows = float(histogram[:SHADOW_CLIP + 1].sum()) / total
+    highlights = float(histogram[HIGHLIGHT_CLIP:].sum()) / total
+
+    components = {
+        'sharpness': min(1.0, variance / SHARP_VARIANCE),
+        # Best around mid-grey, and penalized for clipped areas
+        'exposure': max(0.0, 1 - abs(mean - 128) / 128) * (1 - min(1.0, shadows + highlights)),
+        'dynamic_range': min(1.0, (high - low) / FULL_DYNAMIC_RANGE),
+    }
+    # Geometric mean: a photo failing badly on any one component is unusable
+    score = 100 * float(np.prod([value ** WEIGHTS[name] for name, value in components.items()]))
+
+    return {
+        'score': round(score, 1),
+        'sharpness': round(variance, 1),
+        'mean_brightness': round(mean, 1),
+        'clipped_shadows': round(shadows, 3),
+        'clipped_highlights': round(highlights, 3),
+        'dynamic_range': high - low,
+    }
+
+
+def passes_quality(quality, threshold=None):
+    """True if a photo's quality (None: not scored) is good enough for the heavy stages"""
+    if not quality:
+        return True
+    threshold = configured_quality_threshold() if threshold is None else threshold
+    return quality.get('score', 100) >= threshold
@@ -0,0 +1,173 @@
+# src/utils/reprocess.py
+# --------------------------------------------------------------------------
+# Incremental recomputation of derived photo data. Photos whose stage
+# stamps are older than the current stage versions (see
+# src/utils/stages.py) are reopened from their stored originals and only
+# the stale stages are rerun, on a worker pool with a bounded number of
+# photos in flight. Results are merged back into the inspections and only
+# the updated photos are written out, in batches, so photos the app adds
+# during a long run are left alone.
+#
+# Usage (from the project root):
+#   python -m src.utils.reprocess [--stages palette exif] [--workers 8]
+#
+# The optional network stages (weather, vision) only run when named.
+# --------------------------------------------------------------------------
+import argparse
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from src.utils.blob_store import get_blob_store
+from src.utils.image_context import ImageContext
+from src.utils.inspection_store import INSPECTIONS_FILE, get_inspection_store
+from src.utils.stages import apply_updates, run_stages, stale_stages
+
+# Photos submitted to the pool but not yet collected, per worker
+IN_FLIGHT_PER_WORKER = 2
+
+
+def find_stale_photos(inspections, names=None, quality_threshold=None):
+    """
+    Photos that need at least one stage recomputed.
+
+    Returns:
+        list: (inspection index, photo index, stale stage names)
+    """
+    stale = []
+    for i, inspection in enumerate(inspections or []):
+        for j, photo in enumerate(inspection.get('photos', [])):
+            stages = stale_stages(photo, names, quality_threshold)
+            if stages:
+                stale.append((i, j, stages))
+    return stale
+
+
+def reprocess_photo(photo, names, quality_threshold=None):
+    """
+    Worker: rerun `names` on one photo's stored original.
+
+    Returns:
+        tuple: (updated fields or None, error message or None)
+    """
+    file_path = photo.get('file_path')
+    if not file_path or not os.path.exists(file_path):
+        return None, "original not found"
+
+    ctx = ImageContext.from_path(file_path, photo.get('filename'))
+    try:
+        return run_stages(ctx, photo, names, quality_threshold=quality_threshold), None
+    except Exception as e:
+        return None, str(e)
+    finally:
+        ctx.close()
+
+
+def reprocess_inspections(inspections, names=None, workers=None, batch_size=50,
+                          save=None, use_processes=False, progress=None, quality_threshold=None):
+    """
+    Recompute stale stages for every affected photo and save the updated photos in batches.
+
+    Parameters:
+        inspections (list): Inspections to update in place
+        names (list): Only consider these stages (default: every non-optional stage)
+        workers (int): Worker count (defaults to the number of CPUs)
+        batch_size (int): Photos updated per save
+        save (callable): Called with a list of (inspection index, updated photo) after each batch
+        use_processes (bool): Use worker processes instead of threads
+        progress (callable): Called as progress(done, total)
+        quality_threshold (float): Minimum quality score for the gated stages (default: configured)
+
+    Returns:
+        dict: Counts of updated and failed photos, elapsed seconds and photos/sec
+    """
+    stale = find_stale_photos(inspections, names, quality_threshold)
+    stats = {'stale': len(stale), 'updated': 0, 'failed': 0, 'errors': []}
+    start = time.perf_counter()
+
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * IN_FLIGHT_PER_WORKER
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    store = get_blob_store()
+    changed = []
+    in_flight = {}
+
+    def collect(done):
+        for future in done:
+            i, j = in_flight.pop(future)
+            photo = inspections[i]['photos'][j]
+            updates, error = future.result()
+
+            if error:
+                stats['failed'] += 1
+                stats['errors'].append(f"{photo.get('filename', 'unknown')}: {error}")
+            else:
+                apply_updates(photo, updates)
+                stats['updated'] += 1
+                changed.append((i, photo))
+
+                # Keep the dedup cache in step with the record
+                if photo.get('content_hash'):
+                    store.set_record(photo['content_hash'], photo)
+
+            if save and len(changed) >= batch_size:
+                save(list(changed))
+                changed.clear()
+            if progress:
+                progress(stats['updated'] + stats['failed'], len(stale))
+
+    with executor_class(max_workers=workers) as executor:
+        # Only a few photos are submitted ahead, so a process pool does not pickle the whole backlog up front
+        for i, j, stages in stale:
+            future = executor.submit(reprocess_photo, inspections[i]['photos'][j], stages, quality_threshold)
+            in_flight[future] = (i, j)
+            if len(in_flight) >= max_in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            collect(done)
+
+    if save and changed:
+        save(changed)
+
+    stats['elapsed'] = time.perf_counter() - start
+    stats['photos_per_sec'] = stats['updated'] / stats['elapsed'] if stats['elapsed'] else 0.0
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute stale derived data for stored photos")
+    parser.add_argument("--stages", nargs="+", help="Only these stages (default: every non-optional stage)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=50, help="Photos per inspection store write")
+    parser.add_argument("--data-file", default=INSPECTIONS_FILE, help="Inspection store file")
+    parser.add_argument("--quality-threshold", type=float, default=None,
+                        help="Minimum quality score (0-100) for palette/Vision (default: HIVE_QUALITY_THRESHOLD or 30)")
+    args = parser.parse_args()
+
+    store = get_inspection_store(args.data_file)
+    inspections, _ = store.load()
+    if not inspections:
+        print("No inspections found.")
+        return
+
+    stats = reprocess_inspections(
+        inspections,
+        names=args.stages,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        save=lambda changed: store.update_photos(inspections, changed),
+        use_processes=True,
+        progress=lambda done, total: print(f"\r{done}/{total} photos", end="", flush=True),
+        quality_threshold=args.quality_threshold,
+    )
+    print()
+    for error in stats['errors']:
+        print(f"  failed: {error}")
+    print(f"Updated {stats['updated']} of {stats['stale']} stale photos "
+          f"({stats['failed']} failed) in {stats['elapsed']:.1f}s, {stats['photos_per_sec']:.1f} photos/s")
+
+
+if __name__ == "__main__":
+    main()
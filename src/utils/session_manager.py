@@ -71,10 +71,6 @@ def initialize_full_session_state():
     if 'inspections' not in st.session_state:
         st.session_state.inspections = []
     
-    # Image caching
-    if 'url_image_cache' not in st.session_state:
-        st.session_state.url_image_cache = {}
-    
     # Load saved data if available
     load_data_from_disk()
 
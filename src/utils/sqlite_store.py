@@ -0,0 +1,522 @@
+# src/utils/sqlite_store.py
+# --------------------------------------------------------------------------
+# SQLite storage backend for inspections (enabled with
+# HIVE_STORAGE_BACKEND=sqlite). Inspections, photos and per-stage analysis
+# results live in their own tables, indexed on inspection date, content
+# hash, filename and location bucket, so grouping a new photo into its
+# inspection or finding a duplicate is an index lookup instead of a scan
+# over the whole library. The database runs in WAL mode, so the Streamlit
+# sessions and background jobs can read while a batch is being written.
+#
+# Photo records are split on the way in: each stage's output fields (see
+# src/utils/stages.py) become one row in `analyses`, stamped with the
+# stage version; everything else is kept on the photo row.
+#
+# One-shot migration of an existing inspections.json (plus its journal):
+#   python -m src.utils.sqlite_store migrate [--data-file data/inspections.json]
+# --------------------------------------------------------------------------
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from collections import Counter
+from datetime import datetime
+from src.utils.blob_store import get_blob_store
+from src.utils.geo import apiary_key, photo_coordinates
+from src.utils.inspection_store import (
+    INSPECTIONS_FILE,
+    inspection_date_key,
+    new_inspection,
+    photo_date_key,
+    read_inspections_file,
+    release_inspection_photos,
+)
+from src.utils.stages import PRODUCERS, STAGES
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS inspections (
+    id INTEGER PRIMARY KEY,
+    date TEXT,
+    date_key TEXT,
+    location TEXT,
+    apiary TEXT,
+    weather_summary TEXT,
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_inspections_date ON inspections (date_key);
+CREATE INDEX IF NOT EXISTS idx_inspections_apiary ON inspections (apiary);
+
+CREATE TABLE IF NOT EXISTS photos (
+    id INTEGER PRIMARY KEY,
+    inspection_id INTEGER NOT NULL REFERENCES inspections (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    content_hash TEXT,
+    filename TEXT,
+    file_path TEXT,
+    date_taken TEXT,
+    lat REAL,
+    lon REAL,
+    location_bucket TEXT,
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_photos_inspection ON photos (inspection_id, position);
+CREATE INDEX IF NOT EXISTS idx_photos_hash ON photos (content_hash);
+CREATE INDEX IF NOT EXISTS idx_photos_filename ON photos (filename);
+CREATE INDEX IF NOT EXISTS idx_photos_bucket ON photos (location_bucket);
+
+CREATE TABLE IF NOT EXISTS analyses (
+    photo_id INTEGER NOT NULL REFERENCES photos (id) ON DELETE CASCADE,
+    stage TEXT NOT NULL,
+    version INTEGER,
+    data TEXT NOT NULL,
+    PRIMARY KEY (photo_id, stage)
+);
+"""
+
+# Inspection fields stored in their own columns (the rest go to `extra`)
+INSPECTION_COLUMNS = ('location', 'apiary', 'weather_summary')
+
+# Photo fields stored in their own columns and not in any analysis row
+PHOTO_COLUMNS = ('content_hash', 'filename', 'file_path')
+
+# Derived from the photos (or the database) on load, never stored
+DERIVED_INSPECTION_FIELDS = ('photos', 'photo_count', 'db_id')
+
+
+def sqlite_path(data_file=INSPECTIONS_FILE):
+    """Database file that replaces a JSON inspection file"""
+    return os.path.splitext(data_file)[0] + ".db"
+
+
+def split_photo(photo):
+    """
+    Split a photo record into its row fields and per-stage analysis rows.
+
+    Returns:
+        tuple: (extra fields dict, {stage: (version or None, output fields)})
+    """
+    versions = photo.get('stage_versions') or {}
+    analyses = {stage: (version, {}) for stage, version in versions.items()}
+    extra = {}
+    for field, value in photo.items():
+        if field in PHOTO_COLUMNS or field in ('stage_versions', 'data'):
+            continue
+        stage = PRODUCERS.get(field)
+        if stage and not STAGES[stage].transient:
+            analyses.setdefault(stage, (versions.get(stage), {}))[1][field] = value
+        else:
+            extra[field] = value
+    return extra, analyses
+
+
+def _inspection_row(inspection):
+    extra = {k: v for k, v in inspection.items()
+             if k not in INSPECTION_COLUMNS and k not in DERIVED_INSPECTION_FIELDS and k != 'date'}
+    date = inspection.get('date')
+    return (
+        date.isoformat() if isinstance(date, datetime) else date,
+        inspection_date_key(date),
+        *(inspection.get(column) for column in INSPECTION_COLUMNS),
+        json.dumps(extra),
+    )
+
+
+def _parse_date(value):
+    try:
+        return datetime.fromisoformat(value) if isinstance(value, str) else value
+    except ValueError:
+        return value
+
+
+class SQLiteInspectionStore:
+    """Inspections, photos and analyses in SQLite; same methods as JsonInspectionStore"""
+
+    backend = "sqlite"
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        """One connection per thread (sqlite3 connections are not shared across threads)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def exists(self):
+        return self._connection().execute("SELECT 1 FROM inspections LIMIT 1").fetchone() is not None
+
+    # ---------------------------------------------------------------- reads
+
+    def load(self):
+        """
+        All inspections, oldest first, with their photos reassembled.
+
+        Returns:
+            tuple: (inspections or None if the database is empty, photos whose files are missing)
+        """
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT id, date, location, apiary, weather_summary, extra FROM inspections ORDER BY date_key, id"
+        ).fetchall()
+        if not rows:
+            return None, []
+
+        analyses = {}
+        for photo_id, stage, version, data in conn.execute("SELECT photo_id, stage, version, data FROM analyses"):
+            analyses.setdefault(photo_id, []).append((stage, version, data))
+
+        photos = {}
+        for row in conn.execute(
+            "SELECT id, inspection_id, content_hash, filename, file_path, extra FROM photos "
+            "ORDER BY inspection_id, position"
+        ):
+            photos.setdefault(row[1], []).append(self._photo_record(row, analyses.get(row[0], [])))
+
+        inspections, missing_photos = [], []
+        for inspection_id, date, location, apiary, weather_summary, extra in rows:
+            inspection = json.loads(extra)
+            inspection.update({
+                'db_id': inspection_id,
+                'date': _parse_date(date),
+                'location': location,
+                'apiary': apiary,
+                'weather_summary': weather_summary,
+            })
+            # Keep only photos whose files still exist (the rows stay until the inspection is deleted)
+            valid_photos = []
+            for photo in photos.get(inspection_id, []):
+                if photo.get('file_path') and os.path.exists(photo['file_path']):
+                    valid_photos.append(photo)
+                else:
+                    missing_photos.append(photo)
+            inspection['photos'] = valid_photos
+            inspection['photo_count'] = len(valid_photos)
+            inspections.append(inspection)
+
+        return inspections, missing_photos
+
+    @staticmethod
+    def _photo_record(row, analysis_rows):
+        _, _, content_hash, filename, file_path, extra = row
+        photo = {'filename': filename, 'file_path': file_path}
+        if content_hash:
+            photo['content_hash'] = content_hash
+        photo.update(json.loads(extra))
+
+        versions = {}
+        for stage, version, data in analysis_rows:
+            photo.update(json.loads(data))
+            if version is not None:
+                versions[stage] = version
+        if versions:
+            photo['stage_versions'] = versions
+        return photo
+
+    def find_photo(self, content_hash):
+        """(inspection row id, photo row id) of a stored photo, or None (index lookup)"""
+        return self._connection().execute(
+            "SELECT inspection_id, id FROM photos WHERE content_hash = ? LIMIT 1", (content_hash,)
+        ).fetchone()
+
+    def find_photo_by_hash(self, inspections, content_hash):
+        """Find a photo by content hash; returns (inspection index, photo index) in `inspections` or None"""
+        found = self.find_photo(content_hash)
+        if not found:
+            return None
+        index = self._index_of(inspections, found[0])
+        if index is None:
+            return None
+        for j, photo in enumerate(inspections[index].get('photos', [])):
+            if photo.get('content_hash') == content_hash:
+                return index, j
+        return None
+
+    def photos_by_filename(self, filename):
+        """Stored photo records with this original filename"""
+        return self._photos_where("p.filename = ?", (filename,))
+
+    def photos_in_bucket(self, location_bucket):
+        """Stored photo records in one apiary-sized location cell (see src/utils/geo.py)"""
+        return self._photos_where("p.location_bucket = ?", (location_bucket,))
+
+    def _photos_where(self, condition, params):
+        """Photo records matching `condition`, with their analysis rows joined in one query"""
+        rows = self._connection().execute(
+            "SELECT p.id, p.inspection_id, p.content_hash, p.filename, p.file_path, p.extra, "
+            "a.stage, a.version, a.data "
+            f"FROM photos p LEFT JOIN analyses a ON a.photo_id = p.id WHERE {condition} "
+            "ORDER BY p.inspection_id, p.position, p.id", params
+        ).fetchall()
+        photo_rows, analyses = {}, {}
+        for row in rows:
+            photo_rows.setdefault(row[0], row[:6])
+            if row[6] is not None:
+                analyses.setdefault(row[0], []).append(row[6:])
+        return [self._photo_record(row, analyses.get(photo_id, [])) for photo_id, row in photo_rows.items()]
+
+    @staticmethod
+    def _index_of(inspections, inspection_id):
+        for i, inspection in enumerate(inspections):
+            if inspection.get('db_id') == inspection_id:
+                return i
+        return None
+
+    # --------------------------------------------------------------- writes
+
+    def _insert_inspection(self, conn, inspection):
+        cursor = conn.execute(
+            "INSERT INTO inspections (date, date_key, location, apiary, weather_summary, extra) "
+            "VALUES (?, ?, ?, ?, ?, ?)", _inspection_row(inspection)
+        )
+        return cursor.lastrowid
+
+    def _insert_photo(self, conn, inspection_id, position, photo):
+        extra, analyses = split_photo(photo)
+        lat, lon = photo_coordinates(photo)
+        cursor = conn.execute(
+            "INSERT INTO photos (inspection_id, position, content_hash, filename, file_path, "
+            "date_taken, lat, lon, location_bucket, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (inspection_id, position, photo.get('content_hash'), photo.get('filename'), photo.get('file_path'),
+             photo.get('date_taken'), lat, lon, apiary_key(lat, lon), json.dumps(extra)),
+        )
+        conn.executemany(
+            "INSERT INTO analyses (photo_id, stage, version, data) VALUES (?, ?, ?, ?)",
+            [(cursor.lastrowid, stage, version, json.dumps(fields)) for stage, (version, fields) in analyses.items()],
+        )
+
+    def add_photos(self, inspections, photos):
+        """
+        Add photos to the inspection for their day (creating it if needed) in one transaction.
+
+        Photos whose content hash is already stored are skipped. Inspections
+        in `inspections` are updated to match.
+
+        Returns:
+            tuple: (index in `inspections` of the last photo's inspection or None, number added)
+        """
+        conn = self._connection()
+        index = None
+        added = 0
+        added_hashes = []
+        with conn:
+            for photo_data in photos:
+                content_hash = photo_data.get('content_hash')
+                existing = self.find_photo(content_hash) if content_hash else None
+                if existing:
+                    index = self._index_of(inspections, existing[0])
+                    continue
+
+                date_str = photo_date_key(photo_data)
+                row = conn.execute(
+                    "SELECT id FROM inspections WHERE date_key = ? ORDER BY id LIMIT 1", (date_str,)
+                ).fetchone()
+                if row:
+                    inspection_id = row[0]
+                    index = self._index_of(inspections, inspection_id)
+                else:
+                    header = new_inspection(photo_data, date_str)
+                    inspection_id = self._insert_inspection(conn, header)
+                    inspections.append(dict(header, db_id=inspection_id, photos=[], photo_count=0))
+                    index = len(inspections) - 1
+
+                position = conn.execute(
+                    "SELECT COUNT(*) FROM photos WHERE inspection_id = ?", (inspection_id,)
+                ).fetchone()[0]
+                self._insert_photo(conn, inspection_id, position, photo_data)
+                if index is not None:
+                    inspection = inspections[index]
+                    inspection.setdefault('photos', []).append(photo_data)
+                    inspection['photo_count'] = len(inspection['photos'])
+                added += 1
+                if content_hash:
+                    added_hashes.append(content_hash)
+
+        # The new photo records hold a reference to their stored blobs
+        for content_hash in added_hashes:
+            get_blob_store().incref(content_hash)
+        return index, added
+
+    def publish_photos(self, photos):
+        """Add photos to the stored inspections (no session list to update); returns the number added"""
+        return self.add_photos([], photos)[1]
+
+    def update_field(self, inspections, index, field, value):
+        """Set one inspection field in memory and in its row"""
+        inspection = inspections[index]
+        inspection[field] = value
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "UPDATE inspections SET date = ?, date_key = ?, location = ?, apiary = ?, weather_summary = ?, "
+                "extra = ? WHERE id = ?", (*_inspection_row(inspection), inspection['db_id'])
+            )
+
+    def update_photos(self, inspections, changed):
+        """Rewrite the rows of photos updated in place, in one transaction; `changed` is a list of (inspection index, photo)"""
+        conn = self._connection()
+        with conn:
+            for index, photo in changed:
+                inspection_id = inspections[index]['db_id']
+                row = conn.execute(
+                    "SELECT id, position FROM photos WHERE inspection_id = ? AND "
+                    "(content_hash = ? OR (content_hash IS NULL AND file_path = ?)) LIMIT 1",
+                    (inspection_id, photo.get('content_hash'), photo.get('file_path')),
+                ).fetchone()
+                if row is None:
+                    # Deleted since the list was loaded
+                    continue
+                conn.execute("DELETE FROM photos WHERE id = ?", (row[0],))
+                self._insert_photo(conn, inspection_id, row[1], photo)
+
+    def delete_inspection(self, inspections, index):
+        """Remove an inspection, its photo and analysis rows, and release its photos"""
+        inspection = inspections.pop(index)
+        conn = self._connection()
+        with conn:
+            photos = [
+                {'content_hash': content_hash, 'file_path': file_path}
+                for content_hash, file_path in conn.execute(
+                    "SELECT content_hash, file_path FROM photos WHERE inspection_id = ?", (inspection['db_id'],)
+                )
+            ]
+            conn.execute("DELETE FROM inspections WHERE id = ?", (inspection['db_id'],))
+        # Every stored photo row held a reference, including ones whose file went missing
+        release_inspection_photos({'photos': photos})
+
+    def save(self, inspections):
+        """
+        Upsert the inspections in `inspections` and their listed photos in one transaction.
+
+        Single changes go through add_photos/update_photos/update_field/
+        delete_inspection. Rows
+        missing from the list are kept: inspections another writer added
+        since the list was loaded stay, and rows are only removed (and their
+        blobs released) by delete_inspection.
+        """
+        conn = self._connection()
+        with conn:
+            stored_ids = {row[0] for row in conn.execute("SELECT id FROM inspections")}
+            for inspection in inspections or []:
+                inspection_id = inspection.get('db_id')
+                if inspection_id in stored_ids:
+                    conn.execute(
+                        "UPDATE inspections SET date = ?, date_key = ?, location = ?, apiary = ?, "
+                        "weather_summary = ?, extra = ? WHERE id = ?", (*_inspection_row(inspection), inspection_id)
+                    )
+                else:
+                    inspection_id = self._insert_inspection(conn, inspection)
+                    inspection['db_id'] = inspection_id
+
+                # Replace the listed photos' rows; photos whose files are missing are not listed and keep theirs
+                for position, photo in enumerate(inspection.get('photos', [])):
+                    conn.execute(
+                        "DELETE FROM photos WHERE inspection_id = ? AND "
+                        "(content_hash = ? OR (content_hash IS NULL AND file_path = ?))",
+                        (inspection_id, photo.get('content_hash'), photo.get('file_path')),
+                    )
+                    self._insert_photo(conn, inspection_id, position, photo)
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_sqlite_store(path=None):
+    """Process-wide store for a database file"""
+    path = path or sqlite_path()
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = SQLiteInspectionStore(path)
+        return _stores[path]
+
+
+def migrate_json_to_sqlite(data_file=INSPECTIONS_FILE, db_path=None, force=False):
+    """
+    Copy inspections from the JSON snapshot and journal into the database in one transaction.
+
+    Blob references are unchanged: every migrated photo record keeps the
+    reference it already held. Photos whose file is missing are not
+    migrated, and the references they held are released. With force=True
+    the photo rows already in the database are replaced: a row whose photo
+    is migrated again hands its reference to the new row (re-running a
+    migration leaves refcounts alone), and the others are released as
+    delete_inspection does.
+
+    Returns:
+        dict: Counts of migrated inspections and photos, and photos skipped because their file is missing
+    """
+    store = get_sqlite_store(db_path or sqlite_path(data_file))
+    if store.exists() and not force:
+        raise ValueError(f"{store.path} already holds inspections (use --force to replace them)")
+
+    inspections, missing_photos = read_inspections_file(data_file)
+    if inspections is None:
+        raise ValueError(f"No inspections found in {data_file}")
+
+    conn = store._connection()
+    with conn:
+        replaced_photos = [
+            {'content_hash': content_hash, 'file_path': file_path}
+            for content_hash, file_path in conn.execute("SELECT content_hash, file_path FROM photos")
+        ]
+        conn.execute("DELETE FROM inspections")
+        for inspection in inspections:
+            inspection_id = store._insert_inspection(conn, inspection)
+            for position, photo in enumerate(inspection.get('photos', [])):
+                store._insert_photo(conn, inspection_id, position, photo)
+
+    migrated = Counter(
+        photo.get('content_hash') or photo.get('file_path')
+        for inspection in inspections for photo in inspection.get('photos', [])
+    )
+    released = []
+    for photo in replaced_photos:
+        key = photo['content_hash'] or photo['file_path']
+        if migrated[key]:
+            migrated[key] -= 1
+        else:
+            released.append(photo)
+    release_inspection_photos({'photos': released + missing_photos})
+
+    return {
+        'inspections': len(inspections),
+        'photos': sum(len(inspection.get('photos', [])) for inspection in inspections),
+        'missing': len(missing_photos),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite inspection store tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate = subparsers.add_parser("migrate", help="Copy inspections.json (and its journal) into SQLite")
+    migrate.add_argument("--data-file", default=INSPECTIONS_FILE, help="Inspection store file")
+    migrate.add_argument("--db", default=None, help="Database file (default: next to the data file)")
+    migrate.add_argument("--force", action="store_true", help="Replace inspections already in the database")
+    args = parser.parse_args()
+
+    try:
+        stats = migrate_json_to_sqlite(args.data_file, args.db, args.force)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Migrated {stats['inspections']} inspections with {stats['photos']} photos "
+          f"({stats['missing']} photos skipped, file missing). "
+          f"Set HIVE_STORAGE_BACKEND=sqlite to use the database.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,536 @@
+# src/utils/stages.py
+# --------------------------------------------------------------------------
+# Versioned analysis pipeline. Every derived field on a photo record is
+# produced by exactly one registered stage, which declares the fields (or
+# context resources such as the decoded pixels) it reads and writes. The
+# record keeps the version of each stage that produced it under
+# 'stage_versions'.
+#
+# `run_stages` plans which stages a photo needs (stages whose outputs are
+# already present at the current version are skipped), then runs them on a
+# thread pool as soon as their inputs are available, so independent stages
+# (palette, perceptual hash, thumbnails) overlap. Wall time and bytes of
+# each stage are kept on the record under 'stage_timings' and appended to
+# data/logs/stage_timings.jsonl for capacity planning. Heavy stages are
+# gated on the photo's quality score (src/utils/quality.py).
+#
+# Bump a stage's version whenever its output would change (better palette,
+# new EXIF field, decoding fix); `stale_stages` then reports which photos
+# need that stage recomputed, and src/utils/reprocess.py reruns only those
+# stages from the stored originals.
+# --------------------------------------------------------------------------
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from src.utils.blob_store import get_blob_store
+from src.utils.geo import decode_gps, geohash_encode
+from src.utils.near_duplicates import dhash, get_near_duplicate_index
+from src.utils.palette import DEFAULT_PALETTE, extract_palette_hex, palette_to_hex
+from src.utils.quality import configured_quality_threshold, passes_quality, score_quality
+from src.utils.thumbnail_cache import PREVIEW_SIZE, get_thumbnail_cache
+
+logger = logging.getLogger(__name__)
+
+TIMINGS_LOG_FILE = os.path.join("data", "logs", "stage_timings.jsonl")
+
+# Threads shared by all pipeline runs in a process
+DEFAULT_STAGE_WORKERS = 4
+
+# Near-duplicates whose mean brightness differs by more than this get their own palette
+PALETTE_REUSE_BRIGHTNESS = 16
+
+# Key a stage function may add to its result to report the bytes it read or wrote
+BYTES_KEY = '_bytes'
+
+
+class StageSkipped(Exception):
+    """A stage could not run (missing service or dependency); it is retried on a later run"""
+
+
+class Stage:
+    """A registered stage: what it reads and writes, and its current version"""
+
+    def __init__(self, name, version, inputs, outputs, function, optional=False, transient=False, gated=False):
+        self.name = name
+        self.version = version
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.function = function
+        # Optional stages (network services) only run when asked for by name
+        self.optional = optional
+        # Transient stages produce context resources, not record fields, and are never stamped
+        self.transient = transient
+        # Gated (heavy) stages are skipped for photos below the quality threshold
+        self.gated = gated
+
+
+# name -> Stage, in registration order (a stage's inputs are produced by earlier stages)
+STAGES = {}
+
+# output name -> name of the stage producing it
+PRODUCERS = {}
+
+
+def register_stage(name, version, inputs=(), outputs=(), optional=False, transient=False, gated=False):
+    """
+    Decorator registering `function(ctx, photo, store)` as a pipeline stage.
+
+    The function reads its declared inputs from `photo` (the record merged
+    with the outputs of earlier stages in the same run) and returns a dict
+    with its declared outputs.
+    """
+    def decorator(function):
+        for field in inputs:
+            if field not in PRODUCERS:
+                raise ValueError(f"Stage '{name}' reads '{field}', which no earlier stage produces")
+        if gated and 'quality' not in inputs:
+            raise ValueError(f"Gated stage '{name}' must read 'quality'")
+        STAGES[name] = Stage(name, version, inputs, outputs, function, optional, transient, gated)
+        for field in outputs:
+            PRODUCERS[field] = name
+        return function
+    return decorator
+
+
+def _rational(value):
+    """Float from an IFDRational, number or legacy (numerator, denominator) tuple"""
+    try:
+        if isinstance(value, tuple):
+            return value[0] / value[1] if len(value) == 2 and value[1] else None
+        value = float(value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    return value if value == value and value > 0 else None
+
+
+def _pixel_bytes(ctx):
+    width, height = ctx.analysis_image.size
+    return width * height * 3
+
+
+@register_stage('header', 1, outputs=('header',), transient=True)
+def header_stage(ctx, photo, store):
+    """Parse the header and EXIF once, before the stages that read them run concurrently"""
+    ctx.exif
+    return {'header': True}
+
+
+@register_stage('decode', 1, outputs=('pixels',), transient=True)
+def decode_stage(ctx, photo, store):
+    """Decode the downsampled analysis image (JPEG draft mode) shared by the pixel stages"""
+    try:
+        # Draft decoding is lazy; load so the decode is timed here, not in the first consumer
+        ctx.analysis_image.load()
+    except Exception:
+        # Undecodable pixels: the pixel stages fall back to their defaults
+        pass
+    return {'pixels': True, BYTES_KEY: ctx.size_bytes}
+
+
+@register_stage('resolution', 1, inputs=('header',), outputs=('resolution', 'file_size_mb'))
+def resolution_stage(ctx, photo, store):
+    """Resolution and file size (from the header, no pixel decode)"""
+    width, height = ctx.size
+    return {
+        'resolution': f"{width} x {height}",
+        'file_size_mb': ctx.size_bytes / (1024 * 1024)
+    }
+
+
+@register_stage('exif', 1, inputs=('header',),
+                outputs=('date_taken', 'date_source', 'camera_model', 'exposure_time', 'f_number', 'focal_length'))
+def exif_stage(ctx, photo, store):
+    """Capture date, camera model and exposure settings"""
+    exif_data = ctx.exif
+    fields = {'date_source': "File metadata"}
+
+    if "DateTimeOriginal" in exif_data:
+        fields['date_taken'] = exif_data["DateTimeOriginal"]
+    elif "DateTime" in exif_data:
+        fields['date_taken'] = exif_data["DateTime"]
+    elif photo.get('date_taken') and photo.get('date_source') != "File metadata":
+        # Reprocessing: keep the fallback time chosen at first ingest
+        fields['date_taken'] = photo['date_taken']
+        fields['date_source'] = photo['date_source']
+    else:
+        # Use file creation time as fallback
+        fields['date_taken'] = datetime.now().strftime("%Y:%m:%d %H:%M:%S")
+        fields['date_source'] = "Current time (no EXIF date found)"
+
+    fields['camera_model'] = "Unknown"
+    if "Make" in exif_data and "Model" in exif_data:
+        fields['camera_model'] = f"{exif_data['Make']} {exif_data['Model']}"
+    elif "Model" in exif_data:
+        fields['camera_model'] = exif_data["Model"]
+
+    # Exposure values are IFDRationals (legacy readers gave (num, den) tuples)
+    exposure_time = _rational(exif_data.get("ExposureTime"))
+    if exposure_time:
+        fields['exposure_time'] = (f"1/{round(1 / exposure_time)} sec" if exposure_time < 1
+                                   else f"{exposure_time:g} sec")
+
+    f_number = _rational(exif_data.get("FNumber"))
+    if f_number:
+        fields['f_number'] = round(f_number, 1)
+
+    focal_length = _rational(exif_data.get("FocalLength"))
+    if focal_length:
+        fields['focal_length'] = f"{focal_length:g} mm"
+
+    return fields
+
+
+@register_stage('gps', 1, inputs=('header',), outputs=('lat', 'lon', 'geohash'))
+def gps_stage(ctx, photo, store):
+    """Signed decimal coordinates and geohash"""
+    lat, lon = decode_gps(ctx.exif)
+    return {
+        'lat': lat,
+        'lon': lon,
+        'geohash': geohash_encode(lat, lon) if lat is not None else None
+    }
+
+
+@register_stage('phash', 1, inputs=('pixels',), outputs=('phash',))
+def phash_stage(ctx, photo, store):
+    """Perceptual hash used to find near-duplicates"""
+    try:
+        return {'phash': f"{dhash(ctx.analysis_image):016x}", BYTES_KEY: _pixel_bytes(ctx)}
+    except Exception:
+        return {'phash': None}
+
+
+@register_stage('quality', 1, inputs=('pixels',), outputs=('quality',))
+def quality_stage(ctx, photo, store):
+    """Sharpness, exposure and dynamic range score of the analysis image"""
+    try:
+        return {'quality': score_quality(ctx.analysis_image), BYTES_KEY: _pixel_bytes(ctx)}
+    except Exception:
+        return {'quality': None}
+
+
+@register_stage('near_duplicate', 1, inputs=('phash',), outputs=('near_duplicate_of', 'near_duplicate_distance'))
+def near_duplicate_stage(ctx, photo, store):
+    """Nearest already analyzed near-duplicate (e.g. a burst shot); registers the photo's hash"""
+    phash, content_hash = photo.get('phash'), photo.get('content_hash')
+    if not phash:
+        return {}
+
+    index = get_near_duplicate_index()
+    fields = {}
+    for distance, other_hash in index.find_near(int(phash, 16), exclude=content_hash):
+        if store.get_record(other_hash):
+            fields = {'near_duplicate_of': other_hash, 'near_duplicate_distance': distance}
+            break
+
+    if content_hash:
+        index.add(content_hash, int(phash, 16))
+    return fields
+
+
+def _similar_exposure(quality, other):
+    if not quality or not other:
+        return True
+    return abs(quality['mean_brightness'] - other['mean_brightness']) <= PALETTE_REUSE_BRIGHTNESS
+
+
+@register_stage('palette', 1, inputs=('pixels', 'near_duplicate_of', 'quality'), outputs=('color_palette',), gated=True)
+def palette_stage(ctx, photo, store):
+    """Dominant colours of the downsampled analysis image"""
+    # A near-duplicate's palette is reused if it came from the current palette version
+    # and a similar exposure (the perceptual hash ignores overall brightness)
+    if photo.get('near_duplicate_of'):
+        neighbour = store.get_record(photo['near_duplicate_of'])
+        if (neighbour and neighbour.get('color_palette')
+                and (neighbour.get('stage_versions') or {}).get('palette') == STAGES['palette'].version
+                and _similar_exposure(photo.get('quality'), neighbour.get('quality'))):
+            return {'color_palette': list(neighbour['color_palette'])}
+    try:
+        img = ctx.analysis_image
+        if ctx.color_histogram is not None:
+            # Tiled scan of a very large image: cut the palette from the merged strip histograms
+            return {'color_palette': palette_to_hex(ctx.color_histogram.palette()), BYTES_KEY: _pixel_bytes(ctx)}
+        return {'color_palette': extract_palette_hex(img), BYTES_KEY: _pixel_bytes(ctx)}
+    except Exception:
+        return {'color_palette': list(DEFAULT_PALETTE)}
+
+
+@register_stage('thumbnail', 1, outputs=('thumbnail_sizes',))
+def thumbnail_stage(ctx, photo, store):
+    """Grid and preview renditions, so views never decode the original"""
+    if not photo.get('file_path') or not photo.get('content_hash'):
+        raise StageSkipped("photo is not in the blob store")
+    try:
+        # Own draft-mode decode of the original, so this overlaps with the analysis decode
+        paths = get_thumbnail_cache().generate(photo['file_path'], photo['content_hash'])
+    except Exception as e:
+        # Missing renditions are regenerated lazily when first shown
+        raise StageSkipped(f"thumbnails not generated: {e}")
+    return {
+        'thumbnail_sizes': sorted(paths),
+        BYTES_KEY: sum(os.path.getsize(path) for path in paths.values() if os.path.exists(path))
+    }
+
+
+@register_stage('weather', 1, inputs=('lat', 'lon', 'date_taken'), outputs=('weather',), optional=True)
+def weather_stage(ctx, photo, store):
+    """Historical weather at the photo's time and place (Open-Meteo)"""
+    try:
+        from src.api_services.weather import get_weather_open_meteo
+    except ImportError as e:
+        raise StageSkipped(f"Weather service unavailable: {e}")
+
+    try:
+        taken = datetime.strptime(photo.get('date_taken') or "", "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        taken = None
+    if photo.get('lat') is None or taken is None:
+        return {'weather': None}
+
+    weather = get_weather_open_meteo(photo['lat'], photo['lon'], taken)
+    if str(weather.get('weather_source', '')).startswith("Error"):
+        raise StageSkipped(weather['weather_source'])
+    return {'weather': weather}
+
+
+@register_stage('vision', 1, inputs=('thumbnail_sizes', 'quality'), outputs=('vision_analysis',), optional=True,
+                gated=True)
+def vision_stage(ctx, photo, store):
+    """Labels and objects from Google Cloud Vision, sent the preview rendition rather than the original"""
+    try:
+        from src.api_services.vision import BeeVisionAnalyzer
+    except ImportError as e:
+        raise StageSkipped(f"Vision API client not installed: {e}")
+
+    preview = get_thumbnail_cache().get(photo['content_hash'], photo['file_path'], PREVIEW_SIZE)
+    if preview is None:
+        raise StageSkipped("No preview rendition could be made")
+    with open(preview, 'rb') as f:
+        content = f.read()
+
+    result = BeeVisionAnalyzer().analyze_image(content)
+    if 'error' in result:
+        raise StageSkipped(result['error'])
+    return {'vision_analysis': result, BYTES_KEY: len(content)}
+
+
+def stage_version(name):
+    return STAGES[name].version
+
+
+def default_stages():
+    """Stages run on every photo (optional network stages are left out)"""
+    return [name for name, stage in STAGES.items() if not stage.optional and not stage.transient]
+
+
+def _is_current(photo, name, quality_threshold=None):
+    stamps = photo.get('stage_versions') or {}
+    if stamps.get(name, 0) < STAGES[name].version:
+        return False
+    # A stage skipped for low quality is due again once the photo passes the (lowered) threshold
+    return not (name in (photo.get('quality_gated') or ())
+                and passes_quality(photo.get('quality'), quality_threshold))
+
+
+def stale_stages(photo, names=None, quality_threshold=None):
+    """Stages whose stamped version on the record is missing or older than the current one"""
+    return [
+        name for name in (names or default_stages())
+        if name in STAGES and not STAGES[name].transient and not _is_current(photo, name, quality_threshold)
+    ]
+
+
+def plan_stages(photo, names=None, force=False, quality_threshold=None):
+    """
+    Stages a run has to execute, in registry order.
+
+    A requested stage runs if its stamp is missing or old. A current stage
+    one of whose inputs is recomputed in the same run is conditional: it
+    reruns only if the recomputed value actually changed. Producers of
+    inputs missing from the record (and the transient header/decode stages)
+    are pulled in as dependencies of the stages that will run.
+
+    Returns:
+        tuple: (stage names, set of conditional stage names)
+    """
+    wanted = set(names) if names is not None else set(default_stages())
+    planned = set()
+    conditional = set()
+
+    changed = True
+    while changed:
+        changed = False
+        for name, stage in STAGES.items():
+            if name in planned:
+                continue
+            recomputed_input = any(
+                PRODUCERS[field] in planned and not STAGES[PRODUCERS[field]].transient
+                for field in stage.inputs
+            )
+            needed_by = any(
+                field in stage.outputs
+                for other in planned - conditional
+                for field in STAGES[other].inputs
+            )
+            current = _is_current(photo, name, quality_threshold)
+            if name in wanted and not stage.transient and (force or not current):
+                planned.add(name)
+            elif name in wanted and not stage.transient and recomputed_input:
+                planned.add(name)
+                conditional.add(name)
+            elif needed_by and (stage.transient or not current):
+                planned.add(name)
+            else:
+                continue
+            changed = True
+
+    return [name for name in STAGES if name in planned], conditional
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DEFAULT_STAGE_WORKERS, thread_name_prefix="stage")
+        return _executor
+
+
+def _timed(stage, ctx, view, store):
+    start = time.perf_counter()
+    try:
+        result = stage.function(ctx, view, store)
+        skipped = None
+    except StageSkipped as e:
+        result, skipped = {}, str(e)
+    result = dict(result)
+    timing = {'seconds': round(time.perf_counter() - start, 4), 'bytes': result.pop(BYTES_KEY, 0)}
+    if skipped:
+        timing['skipped'] = skipped
+    return result, timing
+
+
+def run_stages(ctx, photo, names=None, force=False, store=None, quality_threshold=None):
+    """
+    Run a photo through the pipeline and stamp the versions of the stages that ran.
+
+    Parameters:
+        ctx (ImageContext): Context for the stored original
+        photo (dict): Current record (stages whose outputs are present and current are skipped)
+        names (list): Stages wanted (default: every non-optional stage)
+        force (bool): Rerun the wanted stages even if they are current
+        store (BlobStore): Blob store with the analyzed records (near-duplicate reuse)
+        quality_threshold (float): Minimum quality score for the gated stages (default: configured)
+
+    Returns:
+        dict: Updated fields, including the merged 'stage_versions', 'stage_timings'
+              and 'quality_gated' (stages skipped for low quality)
+    """
+    store = store or get_blob_store()
+    if quality_threshold is None:
+        quality_threshold = configured_quality_threshold()
+    plan, conditional = plan_stages(photo, names, force, quality_threshold)
+    view = dict(photo)
+    updates = {}
+    stamps = dict(photo.get('stage_versions') or {})
+    timings = {}
+    gated = set(photo.get('quality_gated') or ())
+
+    pending = list(plan)
+    running = {}
+    done = set()
+    start = time.perf_counter()
+    executor = _get_executor()
+    try:
+        while pending or running:
+            # Start every stage whose planned producers have all finished
+            for name in list(pending):
+                stage = STAGES[name]
+                producers = {PRODUCERS[field] for field in stage.inputs} & set(plan)
+                if not producers <= done:
+                    continue
+                pending.remove(name)
+                if name in conditional and all(view.get(field) == photo.get(field) for field in stage.inputs):
+                    # Recomputed inputs came out unchanged: the current output still holds
+                    done.add(name)
+                    continue
+                if stage.gated and not passes_quality(view.get('quality'), quality_threshold):
+                    # Unusable photo (blurred, almost black): not worth the heavy stage
+                    done.add(name)
+                    gated.add(name)
+                    timings[name] = {'seconds': 0.0, 'bytes': 0,
+                                     'skipped': f"quality {view['quality']['score']:g} < {quality_threshold:g}"}
+                    for field in stage.outputs:
+                        updates[field] = view[field] = None
+                    stamps[name] = stage.version
+                    continue
+                running[executor.submit(_timed, stage, ctx, dict(view), store)] = name
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                stage = STAGES[name]
+                result, timing = future.result()
+                timings[name] = timing
+                done.add(name)
+                if stage.transient or 'skipped' in timing:
+                    continue
+
+                # Fields a stage no longer produces are cleared
+                for field in stage.outputs:
+                    updates[field] = result.get(field)
+                    view[field] = result.get(field)
+                stamps[name] = stage.version
+                gated.discard(name)
+    finally:
+        for future in running:
+            future.cancel()
+
+    elapsed = time.perf_counter() - start
+    timings = {name: timings[name] for name in plan if name in timings}
+    if timings:
+        log_stage_timings(view, timings, elapsed)
+
+    updates['stage_versions'] = stamps
+    updates['quality_gated'] = sorted(gated) or None
+    updates['stage_timings'] = dict(photo.get('stage_timings') or {}, **timings)
+    return updates
+
+
+def log_stage_timings(photo, timings, elapsed, log_file=TIMINGS_LOG_FILE):
+    """Log one run's per-stage timings and append them to the capacity-planning log"""
+    logger.info("%s: %s in %.3fs", photo.get('filename', 'unknown'),
+                ", ".join(f"{name} {t['seconds'] * 1000:.0f} ms" for name, t in timings.items()), elapsed)
+    entry = {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'content_hash': photo.get('content_hash'),
+        'file_size_mb': photo.get('file_size_mb'),
+        'elapsed': round(elapsed, 4),
+        'stages': timings
+    }
+    try:
+        os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        # One short line per run; O_APPEND keeps concurrent writers from interleaving
+        with open(log_file, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+    except OSError:
+        pass
+
+
+def apply_updates(photo, updates):
+    """Merge stage output into a record (optional fields that came back empty are dropped)"""
+    for field, value in updates.items():
+        if value is None and field not in ('lat', 'lon'):
+            photo.pop(field, None)
+        else:
+            photo[field] = value
+    return photo
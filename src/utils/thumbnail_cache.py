@@ -0,0 +1,228 @@
+# src/utils/thumbnail_cache.py
+# --------------------------------------------------------------------------
+# On-disk preview pyramid. Every stored photo gets small JPEG renditions
+# (256 px for grids, 1024 px for detail views) keyed by its content hash,
+# so pages never have to decode the full-size original to show it.
+#
+# Renditions are generated at ingest, regenerated lazily if missing and
+# evicted least-recently-used first once the cache exceeds its byte budget.
+# The cache directory is scanned once; after that an in-memory LRU index of
+# rendition sizes tracks the total, so eviction never walks the directory.
+# --------------------------------------------------------------------------
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageOps
+from src.utils.large_image import exceeds_ceiling, load_reduced, open_large
+
+DEFAULT_THUMB_ROOT = os.path.join("data", "thumbs")
+
+# Longest side of each rendition, smallest first
+RENDITION_SIZES = (256, 1024)
+GRID_SIZE = 256
+PREVIEW_SIZE = 1024
+
+# Total size of all renditions before the least recently used are evicted
+DEFAULT_BUDGET_BYTES = 256 * 1024 * 1024
+
+JPEG_QUALITY = 85
+
+# Shown instead of originals that are too large to render
+PLACEHOLDER_COLOR = "#DDDDDD"
+
+
+def smallest_adequate_size(max_side):
+    """Smallest rendition size that is at least `max_side` px (the largest if none is)"""
+    for size in RENDITION_SIZES:
+        if size >= max_side:
+            return size
+    return RENDITION_SIZES[-1]
+
+
+class ThumbnailCache:
+    """Content-hash keyed rendition cache with a size budget"""
+
+    def __init__(self, root=DEFAULT_THUMB_ROOT, budget_bytes=DEFAULT_BUDGET_BYTES):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self._lock = threading.Lock()
+        # Rendition path -> size in bytes, least recently used first (None until scanned)
+        self._entries = None
+        self._total_bytes = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, digest, size):
+        """Path of the `size` px rendition of `digest`"""
+        return os.path.join(self.root, digest[:2], f"{digest}_{size}.jpg")
+
+    def generate(self, source_path, digest):
+        """
+        Write every missing rendition of an original from a single decode.
+
+        JPEGs are decoded in draft mode at the smallest DCT scale that still
+        covers the largest rendition; smaller renditions are resized from the
+        larger one instead of from the original.
+
+        Returns:
+            dict: {size: rendition path}
+        """
+        paths = {size: self.path(digest, size) for size in RENDITION_SIZES}
+        missing = [size for size, path in paths.items() if not os.path.exists(path)]
+        if not missing:
+            return paths
+
+        largest = max(missing)
+        with open_large(source_path) as img:
+            if exceeds_ceiling(img.size):
+                # Panorama-sized originals are reduced in draft mode or in strips
+                img = load_reduced(source_path, largest)
+            elif img.format == 'JPEG':
+                img.draft('RGB', (largest, largest))
+            img = ImageOps.exif_transpose(img)
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+
+            written = {}
+            for size in sorted(missing, reverse=True):
+                img.thumbnail((size, size), Image.LANCZOS)
+                written[paths[size]] = self._write(img, paths[size])
+
+        self._add_entries(written)
+        return paths
+
+    def _write(self, img, path):
+        """Atomically write one rendition; returns its size in bytes"""
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                img.save(f, "JPEG", quality=JPEG_QUALITY, optimize=True)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return os.path.getsize(path)
+
+    def get(self, digest, source_path, max_side=GRID_SIZE):
+        """
+        Path of the smallest rendition covering `max_side`, generating it if needed.
+
+        Returns None if no rendition can be made (the original is missing,
+        too large to decode in bounded memory, or unreadable); callers show
+        a placeholder then, never the full-size original.
+        """
+        size = smallest_adequate_size(max_side)
+        path = self.path(digest, size)
+        if os.path.exists(path):
+            # Modification time keeps the LRU order across restarts
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            with self._lock:
+                if self._entries is not None and path in self._entries:
+                    self._entries.move_to_end(path)
+            return path
+
+        if not source_path or not os.path.exists(source_path):
+            return None
+        try:
+            return self.generate(source_path, digest)[size]
+        except Exception:
+            # Over the pixel ceiling or undecodable
+            return None
+
+    def discard(self, digest):
+        """Remove all renditions of a photo whose original was deleted"""
+        for size in RENDITION_SIZES:
+            path = self.path(digest, size)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            with self._lock:
+                if self._entries is not None and path in self._entries:
+                    self._total_bytes -= self._entries.pop(path)
+
+    def _iter_files(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(".jpg"):
+                    yield os.path.join(dirpath, name)
+
+    def _load_entries(self):
+        """Build the LRU index from one scan of the cache directory (lock held)"""
+        if self._entries is not None:
+            return
+        found = []
+        for path in self._iter_files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            found.append((stat.st_mtime, path, stat.st_size))
+        self._entries = OrderedDict((path, size) for _, path, size in sorted(found))
+        self._total_bytes = sum(self._entries.values())
+
+    def total_bytes(self):
+        """Bytes used by all renditions (scanned once, then tracked)"""
+        with self._lock:
+            self._load_entries()
+            return self._total_bytes
+
+    def _add_entries(self, written):
+        """Record newly written renditions ({path: bytes}) and evict if over budget"""
+        with self._lock:
+            # The first scan already includes the files just written
+            self._load_entries()
+            for path, size in written.items():
+                self._total_bytes += size - self._entries.pop(path, 0)
+                self._entries[path] = size
+            over_budget = self._total_bytes > self.budget_bytes
+        if over_budget:
+            self.evict()
+
+    def evict(self, budget_bytes=None):
+        """Delete least recently used renditions until the cache fits the budget"""
+        budget = self.budget_bytes if budget_bytes is None else budget_bytes
+        with self._lock:
+            self._load_entries()
+            removed = 0
+            while self._entries and self._total_bytes > budget:
+                path, size = self._entries.popitem(last=False)
+                self._total_bytes -= size
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+            return removed
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_thumbnail_cache():
+    """Process-wide ThumbnailCache rooted at data/thumbs"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ThumbnailCache()
+        return _default_cache
+
+
+def rendition_for_photo(photo, max_side=GRID_SIZE):
+    """Best image source for showing a photo record at `max_side` px"""
+    file_path = photo.get('file_path')
+    content_hash = photo.get('content_hash')
+    if content_hash:
+        path = get_thumbnail_cache().get(content_hash, file_path, max_side)
+        if path:
+            return path
+        if file_path and os.path.exists(file_path):
+            # No rendition could be made: never hand the full-size original to the browser
+            return Image.new('RGB', (max_side, max_side * 3 // 4), PLACEHOLDER_COLOR)
+    return file_path
@@ -0,0 +1,246 @@
+# src/utils/url_cache.py
+# --------------------------------------------------------------------------
+# Persistent URL image cache shared by every session in the process.
+#
+# Downloaded images already live in the blob store, so the cache is just an
+# index from normalized URL to blob digest. Each entry holds one reference on
+# its blob and the response validators (ETag / Last-Modified). Entries older
+# than the TTL become stale: they are kept so they can be revalidated with a
+# conditional GET, and are the first to go once the cached bytes exceed the
+# budget. Evicting an entry only deletes the blob if no inspection photo
+# still references it.
+#
+# The index is rewritten at once when entries are added or dropped. A hit
+# only moves the entry's last_access in memory; those are written out by
+# the write-behind writer, at most once per write window.
+# --------------------------------------------------------------------------
+import json
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from src.utils.blob_store import get_blob_store
+from src.utils.persistence import get_write_behind
+
+DEFAULT_URL_CACHE_ROOT = os.path.join("data", "url_cache")
+
+# Cached bytes kept before the least recently used entries are evicted
+DEFAULT_BUDGET_BYTES = 512 * 1024 * 1024
+
+# Entries older than this are revalidated before use
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url):
+    """Canonical form of a URL for cache keys (case, default port, query order, fragment)"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+class UrlCache:
+    """Disk-backed LRU index of downloaded URLs with a byte budget and TTL"""
+
+    def __init__(self, root=DEFAULT_URL_CACHE_ROOT, budget_bytes=DEFAULT_BUDGET_BYTES,
+                 ttl_seconds=DEFAULT_TTL_SECONDS, store=None):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self.ttl_seconds = ttl_seconds
+        self.store = store or get_blob_store()
+        self.index_path = os.path.join(root, "index.json")
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.revalidated = 0
+        self.evictions = 0
+        self._access_dirty = False
+        os.makedirs(self.root, exist_ok=True)
+        self._entries = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r") as f:
+                return json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        """Atomically replace the index file (caller holds the lock)"""
+        self._access_dirty = False
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"entries": self._entries}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _touch(self, entry, now):
+        """Move an entry's last_access; the index is saved later by the write-behind writer"""
+        entry["last_access"] = now
+        if not self._access_dirty:
+            self._access_dirty = True
+            get_write_behind().call(self.index_path, self._save_access)
+
+    def _save_access(self):
+        """Write out last_access changes not already saved with a put, evict or drop"""
+        with self._lock:
+            if self._access_dirty:
+                self._save_index()
+
+    def _expired(self, entry, now):
+        return now - entry.get("fetched_at", 0) > self.ttl_seconds
+
+    def lookup(self, url, include_stale=False, count=True):
+        """
+        Cache entry for a URL, or None on a miss.
+
+        Stale entries (older than the TTL) are only returned with
+        include_stale=True, flagged with 'stale': True, so the caller can
+        revalidate them using their 'etag' / 'last_modified' validators.
+        With count=False the lookup is left out of the hit-rate statistics.
+
+        Returns:
+            dict: {'url', 'digest', 'path', 'size', 'etag', 'last_modified',
+                   'fetched_at', 'last_access', 'stale'}
+        """
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and not os.path.exists(entry.get("path", "")):
+                # Blob deleted behind our back: drop the entry so the caller refetches
+                self._drop(key)
+                self._save_index()
+                entry = None
+
+            stale = bool(entry) and self._expired(entry, now)
+            if entry is None or (stale and not include_stale):
+                if count:
+                    self.misses += 1
+                return None
+
+            self._touch(entry, now)
+            if count:
+                self.count_hit(stale)
+            return dict(entry, stale=stale)
+
+    def count_hit(self, stale=False):
+        """Record a lookup answered from the cache"""
+        with self._lock:
+            if stale:
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+
+    def put(self, url, digest, path, size, etag=None, last_modified=None):
+        """Record a downloaded URL, holding a blob reference, then evict down to budget"""
+        key = normalize_url(url)
+        now = time.time()
+        validators = {"etag": etag, "last_modified": last_modified}
+        with self._lock:
+            old = self._entries.get(key)
+            if old and old["digest"] == digest:
+                old.update(validators, path=path, size=size, fetched_at=now, last_access=now)
+            else:
+                if old:
+                    self._drop(key)
+                self.store.incref(digest)
+                self._entries[key] = {
+                    "url": url,
+                    "digest": digest,
+                    "path": path,
+                    "size": size,
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "fetched_at": now,
+                    "last_access": now,
+                }
+            self._evict(now)
+            self._save_index()
+            return dict(self._entries.get(key, {}))
+
+    def mark_revalidated(self, url):
+        """The origin answered 304 Not Modified: the entry is fresh again"""
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry["fetched_at"] = now
+            entry["last_access"] = now
+            self.revalidated += 1
+            self._save_index()
+            return dict(entry)
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self.store.decref(entry["digest"])
+
+    def _evict(self, now):
+        """Drop entries until within budget: stale ones first, then least recently used"""
+        total = self.total_bytes()
+        order = sorted(
+            self._entries.items(),
+            key=lambda item: (not self._expired(item[1], now), item[1]["last_access"])
+        )
+        for key, entry in order:
+            if total <= self.budget_bytes:
+                break
+            total -= entry.get("size", 0)
+            self._drop(key)
+            self.evictions += 1
+
+    def evict(self):
+        with self._lock:
+            self._evict(time.time())
+            self._save_index()
+
+    def clear(self):
+        """Drop every entry (blobs still used by inspections are kept)"""
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key)
+            self._save_index()
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(entry.get("size", 0) for entry in self._entries.values())
+
+    def stats(self):
+        """Entry count, bytes used and hit rate since the process started"""
+        with self._lock:
+            # Stale entries still served their bytes from the cache
+            served = self.hits + self.stale_hits
+            lookups = served + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes(),
+                "budget_bytes": self.budget_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale_hits": self.stale_hits,
+                "revalidated": self.revalidated,
+                "evictions": self.evictions,
+                "hit_rate": served / lookups if lookups else 0.0,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_url_cache():
+    """Process-wide UrlCache rooted at data/url_cache"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = UrlCache()
+        return _default_cache
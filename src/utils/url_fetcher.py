@@ -0,0 +1,143 @@
+# src/utils/url_fetcher.py
+# --------------------------------------------------------------------------
+# HTTP fetching for URL-sourced photos. All downloads share one pooled
+# requests.Session (kept-alive connections per host), use connect/read
+# timeouts, stream straight into the blob store and are aborted as soon as
+# a body grows past the size cap. `fetch_urls` downloads a list of URLs
+# concurrently, e.g. a pasted season's worth of Drive links.
+# --------------------------------------------------------------------------
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from requests.adapters import HTTPAdapter
+from src.utils.blob_store import CHUNK_SIZE, get_blob_store
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (5, 30)
+
+# Larger bodies are aborted mid-stream
+MAX_DOWNLOAD_BYTES = 50 * 1024 * 1024
+
+# Connection pools kept (one per host) and connections kept per host
+POOL_CONNECTIONS = 16
+POOL_MAXSIZE = 8
+
+# Concurrent downloads in a batch
+DEFAULT_FETCH_WORKERS = 8
+
+
+class DownloadTooLarge(Exception):
+    """The response body is larger than the allowed download size"""
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """Process-wide pooled session, so repeated downloads from a host reuse connections"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def limited_chunks(response, max_bytes=MAX_DOWNLOAD_BYTES, chunk_size=CHUNK_SIZE):
+    """Yield body chunks, raising DownloadTooLarge once more than `max_bytes` arrive"""
+    declared = response.headers.get("Content-Length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise DownloadTooLarge(f"{int(declared) / (1024 * 1024):.1f} MB exceeds the "
+                               f"{max_bytes / (1024 * 1024):.1f} MB download limit")
+
+    received = 0
+    for chunk in response.iter_content(chunk_size):
+        received += len(chunk)
+        if received > max_bytes:
+            raise DownloadTooLarge(f"Download exceeds the {max_bytes / (1024 * 1024):.1f} MB limit")
+        yield chunk
+
+
+def download_to_store(url, filename, store=None, validators=None,
+                      timeout=DEFAULT_TIMEOUT, max_bytes=MAX_DOWNLOAD_BYTES):
+    """
+    Download an image straight into the blob store, one chunk at a time.
+
+    Parameters:
+        url (str): Image URL
+        filename (str): Name used for the stored blob's extension
+        store (BlobStore): Blob store to use (defaults to the process-wide one)
+        validators (dict): Optional 'etag' / 'last_modified' of a cached copy;
+                           sent as a conditional GET
+        timeout (tuple): (connect, read) timeouts in seconds
+        max_bytes (int): Abort bodies larger than this
+
+    Returns:
+        dict: {'digest', 'path', 'size', 'etag', 'last_modified', 'not_modified'};
+              on a 304 only 'not_modified' is True and nothing is downloaded
+    """
+    store = store or get_blob_store()
+
+    headers = {}
+    if validators:
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+
+    with get_http_session().get(url, stream=True, timeout=timeout, headers=headers) as response:
+        if response.status_code == 304 and headers:
+            return {'not_modified': True}
+        response.raise_for_status()
+
+        # A partial body is discarded by the store if the limit aborts the stream
+        content_hash, file_path, _, size = store.put_chunks(limited_chunks(response, max_bytes), filename)
+        return {
+            'digest': content_hash,
+            'path': file_path,
+            'size': size,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'not_modified': False
+        }
+
+
+def fetch_urls(urls, fetch=None, max_workers=DEFAULT_FETCH_WORKERS):
+    """
+    Run `fetch(url)` for many URLs concurrently.
+
+    Parameters:
+        urls (list): URLs to download (duplicates are fetched once)
+        fetch (callable): Per-URL download; defaults to ingest.fetch_url_cached
+        max_workers (int): Concurrent downloads
+
+    Yields:
+        tuple: (url, result or None, error message or None) in completion order
+    """
+    if fetch is None:
+        from src.utils.ingest import fetch_url_cached
+        fetch = fetch_url_cached
+
+    unique_urls = list(dict.fromkeys(url.strip() for url in urls if url.strip()))
+    if not unique_urls:
+        return
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(unique_urls)),
+                            thread_name_prefix="fetch") as executor:
+        futures = {executor.submit(fetch, url): url for url in unique_urls}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                yield url, future.result(), None
+            except Exception as e:
+                yield url, None, str(e)
+
+
+def parse_url_list(text):
+    """URLs from pasted text: one per line (or separated by whitespace/commas)"""
+    tokens = text.replace(",", " ").split()
+    return list(dict.fromkeys(t for t in tokens if t.startswith(("http://", "https://"))))